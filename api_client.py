@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class PipelineApiError(RuntimeError):
+    """
+    Erro devolvido pela API do pipeline (ver api_server)
+    """
+
+
+def get_api_url():
+    """
+    Endereço da API do pipeline (PIPELINE_API_URL), ou None para executar o pipeline no
+    próprio processo
+    """
+    url = os.getenv("PIPELINE_API_URL")
+    return url.rstrip("/") if url else None
+
+
+def get_api_client():
+    """
+    Retorna o cliente HTTP da API compartilhado pelo processo. A conexão é mantida aberta
+    entre as perguntas; o timeout de leitura vale por pedaço do stream, não pela resposta.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    base_url=get_api_url(),
+                    timeout=httpx.Timeout(float(os.getenv("PIPELINE_API_TIMEOUT", "180")), connect=5.0),
+                )
+    return _client
+
+
+def _raise_for_error(response):
+    if response.status_code >= 400:
+        response.read()
+        try:
+            message = response.json().get("error")
+        except ValueError:
+            message = None
+        response.close()
+        raise PipelineApiError(message or f"API respondeu {response.status_code}")
+
+
+def ask(question):
+    """
+    Envia a pergunta e espera a resposta completa
+
+    Returns:
+        Dicionário com intent, sql, answer e timings
+    """
+    response = get_api_client().post("/v1/ask", json={"question": question})
+    _raise_for_error(response)
+    return response.json()
+
+
+def _tokens(response, lines):
+    try:
+        for line in lines:
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "token":
+                yield event["text"]
+            elif event["event"] == "error":
+                raise PipelineApiError(event["message"])
+    finally:
+        response.close()
+
+
+def ask_stream(question):
+    """
+    Envia a pergunta e devolve a resposta à medida que é gerada. Se o consumidor parar
+    antes do fim, a conexão é fechada e o servidor interrompe a geração.
+
+    Returns:
+        Tupla (intenção, consulta SQL ou None, iterável com os pedaços da resposta), no
+        mesmo formato de pipeline.answer_question
+    """
+    client = get_api_client()
+    request = client.build_request("POST", "/v1/ask", json={"question": question, "stream": True})
+    response = client.send(request, stream=True)
+    _raise_for_error(response)
+    lines = response.iter_lines()
+    try:
+        plan = json.loads(next(line for line in lines if line))
+    except BaseException:
+        response.close()
+        raise
+    if plan["event"] == "error":
+        response.close()
+        raise PipelineApiError(plan["message"])
+    return plan["intent"], plan["sql"], _tokens(response, lines)
+
+
+def close_api_client():
+    """
+    Fecha as conexões com a API. Usar apenas no encerramento do processo.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
@@ -0,0 +1,365 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+from dotenv import load_dotenv
+from tornado.iostream import StreamClosedError
+
+import async_pipeline
+from database import check_db_health, get_engine, get_pool_status
+from intent_classifier import get_intent_stats
+from llm_client import get_async_http_client, get_llm_client, get_llm_stats
+from schema_catalog import get_prompt_stats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+NDJSON = "application/x-ndjson"
+
+
+def _int_env(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _float_env(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def get_api_settings():
+    """
+    Lê as configurações do servidor HTTP a partir do .env
+
+    Returns:
+        Dicionário com endereço, porta, workers, limites e tempo de encerramento
+    """
+    return {
+        "host": os.getenv("API_HOST", "0.0.0.0"),
+        "port": _int_env("API_PORT", 8000),
+        # 0 usa um worker por CPU
+        "workers": _int_env("API_WORKERS", 1),
+        # Perguntas simultâneas por worker; acima disso a API responde 503 para o
+        # balanceador tentar outra instância
+        "max_inflight": _int_env("API_MAX_INFLIGHT", 64),
+        "max_question_chars": _int_env("API_MAX_QUESTION_CHARS", 2000),
+        "max_body_size": _int_env("API_MAX_BODY_SIZE", 64 * 1024),
+        "shutdown_timeout": _float_env("API_SHUTDOWN_TIMEOUT", 30.0),
+    }
+
+
+class ServerState:
+    """
+    Estado de um worker: perguntas em andamento e se está encerrando
+    """
+
+    def __init__(self, max_inflight):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.draining = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def acquire(self):
+        if self.draining or self.inflight >= self.max_inflight:
+            return False
+        self.inflight += 1
+        self.idle.clear()
+        return True
+
+    def release(self):
+        self.inflight -= 1
+        if self.inflight == 0:
+            self.idle.set()
+
+
+class ApiError(tornado.web.HTTPError):
+    """
+    Erro devolvido ao cliente como {"error": mensagem}
+    """
+
+    def __init__(self, status_code, message, headers=None):
+        super().__init__(status_code)
+        self.message = message
+        self.headers = headers or {}
+
+
+class BaseHandler(tornado.web.RequestHandler):
+
+    def initialize(self, state, settings):
+        self.state = state
+        self.api_settings = settings
+
+    def write_json(self, payload, status=200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(payload, ensure_ascii=False))
+
+    def write_error(self, status_code, **kwargs):
+        error = kwargs["exc_info"][1] if "exc_info" in kwargs else None
+        for name, value in getattr(error, "headers", {}).items():
+            self.set_header(name, value)
+        self.write_json({"error": getattr(error, "message", self._reason)}, status_code)
+
+
+class AskHandler(BaseHandler):
+    """
+    POST /v1/ask com {"question": "...", "stream": false}
+
+    Sem stream, responde {"intent", "sql", "answer", "timings"}. Com stream, responde
+    NDJSON: um evento "plan" com intenção e SQL, eventos "token" com os pedaços da
+    resposta e um evento final "done" com os tempos (ou "error").
+    """
+
+    def parse_body(self):
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise ApiError(400, "Corpo da requisição não é um JSON válido")
+        question = body.get("question") if isinstance(body, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise ApiError(400, "Campo 'question' é obrigatório")
+        if len(question) > self.api_settings["max_question_chars"]:
+            raise ApiError(413, "Pergunta muito longa")
+        return question.strip(), bool(body.get("stream", False))
+
+    async def post(self):
+        question, stream = self.parse_body()
+        if not self.state.acquire():
+            raise ApiError(503, "Servidor ocupado", {"Retry-After": "1"})
+        try:
+            await self.answer(question, stream)
+        finally:
+            self.state.release()
+
+    async def answer(self, question, stream):
+        started = time.perf_counter()
+        timings = async_pipeline.track_stage_timings()
+        llm = get_llm_client()
+        try:
+            intent, dynamic_query, chunks = await async_pipeline.aanswer_question(
+                question, llm, get_engine(), general_answer=async_pipeline.general_answer(question, llm)
+            )
+        except Exception as e:
+            logger.exception("Falha ao planejar a pergunta")
+            raise ApiError(500, f"Erro no processamento: {e}")
+        timings["plan_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        if not stream:
+            parts = []
+            try:
+                async for chunk in chunks:
+                    if "first_token_ms" not in timings:
+                        timings["first_token_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    parts.append(chunk)
+            except Exception as e:
+                logger.exception("Falha ao gerar a resposta")
+                raise ApiError(500, f"Erro no processamento: {e}")
+            timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self.write_json({"intent": intent, "sql": dynamic_query, "answer": "".join(parts), "timings": timings})
+            return
+
+        self.set_header("Content-Type", f"{NDJSON}; charset=utf-8")
+        self.set_header("Cache-Control", "no-cache")
+        try:
+            await self.send_event({"event": "plan", "intent": intent, "sql": dynamic_query})
+            try:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if "first_token_ms" not in timings:
+                        timings["first_token_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    await self.send_event({"event": "token", "text": chunk})
+            except StreamClosedError:
+                raise
+            except Exception as e:
+                logger.exception("Falha ao gerar a resposta")
+                await self.send_event({"event": "error", "message": f"Erro no processamento: {e}"})
+            else:
+                timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                await self.send_event({"event": "done", "timings": timings})
+            self.finish()
+        except StreamClosedError:
+            # O cliente desconectou: fecha o stream para interromper a chamada ao LLM
+            await chunks.aclose()
+
+    async def send_event(self, payload):
+        self.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        await self.flush()
+
+
+class HealthHandler(BaseHandler):
+    """
+    GET /health: o processo está vivo
+    """
+
+    def get(self):
+        self.write_json({"status": "ok", "pid": os.getpid()})
+
+
+class ReadyHandler(BaseHandler):
+    """
+    GET /ready: o worker aceita perguntas, o banco responde e o cliente do LLM está
+    configurado. Retorna 503 durante o encerramento para o balanceador parar de enviar
+    requisições.
+    """
+
+    async def get(self):
+        loop = asyncio.get_running_loop()
+        checks = {
+            "database": await loop.run_in_executor(None, check_db_health),
+            "llm": bool(os.getenv("API_KEY")),
+            "accepting": not self.state.draining,
+        }
+        ready = all(checks.values())
+        self.write_json({"ready": ready, "checks": checks, "inflight": self.state.inflight}, 200 if ready else 503)
+
+
+class StatsHandler(BaseHandler):
+    """
+    GET /v1/stats: métricas do worker que atendeu a requisição
+    """
+
+    def get(self):
+        try:
+            pool = get_pool_status()
+        except Exception:
+            # Sem banco as demais métricas continuam disponíveis
+            logger.warning("Falha ao ler o pool de conexões", exc_info=True)
+            pool = None
+        self.write_json({
+            "pid": os.getpid(),
+            "inflight": self.state.inflight,
+            "intents": get_intent_stats(),
+            "llm": get_llm_stats(),
+            "prompts": get_prompt_stats(),
+            "pool": pool,
+        })
+
+
+def make_app(state, settings):
+    arguments = {"state": state, "settings": settings}
+    return tornado.web.Application([
+        (r"/v1/ask", AskHandler, arguments),
+        (r"/v1/stats", StatsHandler, arguments),
+        (r"/health", HealthHandler, arguments),
+        (r"/ready", ReadyHandler, arguments),
+    ])
+
+
+async def serve(sockets, settings):
+    """
+    Executa um worker nos sockets já abertos até receber SIGTERM ou SIGINT. No
+    encerramento, deixa de aceitar perguntas, espera as em andamento (até
+    shutdown_timeout) e fecha as conexões do LLM.
+    """
+    loop = asyncio.get_running_loop()
+    # As chamadas ao LLM rodam no loop do servidor, sem trocar de thread
+    async_pipeline.use_loop(loop)
+
+    state = ServerState(settings["max_inflight"])
+    server = tornado.httpserver.HTTPServer(make_app(state, settings), max_body_size=settings["max_body_size"])
+    server.add_sockets(sockets)
+
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    logger.info("Worker %s atendendo", os.getpid())
+    await stop.wait()
+
+    state.draining = True
+    server.stop()
+    try:
+        await asyncio.wait_for(state.idle.wait(), settings["shutdown_timeout"])
+    except asyncio.TimeoutError:
+        logger.warning("Encerrando com %s perguntas em andamento", state.inflight)
+    await server.close_all_connections()
+    await get_async_http_client().aclose()
+
+
+def _start_worker(sockets, settings):
+    pid = os.fork()
+    if pid != 0:
+        return pid
+    # O worker não herda os sinais do supervisor; serve() instala os seus
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    status = 0
+    try:
+        asyncio.run(serve(sockets, settings))
+    except BaseException:
+        logger.exception("Falha no worker %s", os.getpid())
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def supervise(sockets, settings, workers):
+    """
+    Cria os workers depois de abrir o socket, de modo que todos aceitam conexões na mesma
+    porta. Um worker que morre de forma inesperada é substituído; SIGTERM/SIGINT são
+    repassados a todos, que encerram de forma ordenada.
+    """
+    children = {_start_worker(sockets, settings) for _ in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping and (not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0):
+            logger.warning("Worker %s terminou inesperadamente (status %s); iniciando outro", pid, status)
+            children.add(_start_worker(sockets, settings))
+
+
+def main(host=None, port=None, workers=None):
+    """
+    Abre a porta e inicia os workers. Cada worker é um processo com seu próprio event loop
+    e seus próprios pools de conexões com o banco e com o LLM, por isso nada que abra
+    conexões ou threads pode ser criado antes do fork.
+    """
+    settings = get_api_settings()
+    host = settings["host"] if host is None else host
+    port = settings["port"] if port is None else port
+    workers = settings["workers"] if workers is None else workers
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    sockets = tornado.netutil.bind_sockets(port, host)
+    if workers == 1:
+        asyncio.run(serve(sockets, settings))
+    else:
+        supervise(sockets, settings, workers)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+
+    parser = argparse.ArgumentParser(description="API HTTP do pipeline de perguntas")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int, help="Quantidade de processos (0 = um por CPU)")
+    args = parser.parse_args()
+
+    main(args.host, args.port, args.workers)
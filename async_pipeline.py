@@ -0,0 +1,320 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from data_version import get_data_version
+from database import get_pool_settings
+from intent_classifier import (
+    classify_intent_locally, get_confidence_threshold, record_llm_fallback, record_local_hit,
+)
+from llm_client import for_stage, get_async_http_client
+from pipeline import (
+    GENERAL_PROMPT, INTENT_PROMPT, _speculative_sql_intent, build_processing_prompt, build_query_prompt, fetch_dynamic_results,
+    finish_generated_query, get_cached_query, parse_intent,
+)
+
+# Passos bloqueantes (banco, catálogo) rodam neste pool, do tamanho do pool de conexões:
+# mais threads só ficariam esperando conexão
+_pool_settings = get_pool_settings()
+_db_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ASYNC_DB_WORKERS", _pool_settings["pool_size"] + _pool_settings["max_overflow"])),
+    thread_name_prefix="async-db"
+)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+# Tempos por etapa da pergunta em andamento (ver track_stage_timings)
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+def get_loop():
+    """
+    Retorna o event loop do processo, que roda numa thread própria. Todas as chamadas
+    assíncronas ao LLM passam por ele, porque as conexões do cliente HTTP assíncrono
+    pertencem ao loop que as abriu.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-pipeline", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def use_loop(loop):
+    """
+    Adota um event loop já em execução (ex.: o do servidor HTTP) como loop do processo,
+    para as chamadas ao LLM rodarem nele sem trocar de thread. Deve ser chamada antes de
+    qualquer uso de get_loop.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is not None and _loop is not loop:
+            raise RuntimeError("O loop do pipeline já foi iniciado")
+        _loop = loop
+
+
+def submit(coroutine):
+    """
+    Agenda a corrotina no loop do processo a partir de qualquer thread
+
+    Returns:
+        concurrent.futures.Future com o resultado
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop())
+
+
+def run(coroutine, timeout=None):
+    """
+    Executa a corrotina no loop do processo e espera o resultado (ex.: no Streamlit)
+    """
+    return submit(coroutine).result(timeout)
+
+
+async def run_in_pipeline_loop(coroutine):
+    """
+    Aguarda, a partir de outro event loop, uma corrotina executada no loop do processo
+    """
+    if asyncio.get_running_loop() is get_loop():
+        return await coroutine
+    return await asyncio.wrap_future(submit(coroutine))
+
+
+def iterate(async_iterable):
+    """
+    Consome um iterador assíncrono no loop do processo e devolve seus itens de forma
+    síncrona, à medida que chegam. Se o consumidor parar antes do fim, o iterador é fechado.
+    """
+    iterator = async_iterable.__aiter__()
+    try:
+        while True:
+            try:
+                yield run(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        close = getattr(iterator, "aclose", None)
+        if close is not None:
+            submit(close())
+
+
+def track_stage_timings():
+    """
+    Passa a medir o tempo de cada etapa (classify, sql, execute, answer) das perguntas
+    respondidas no contexto atual, inclusive nas tarefas que elas criarem. Deve ser
+    chamada na tarefa que atende a pergunta.
+
+    Returns:
+        Dicionário preenchido com '<etapa>_ms' à medida que as etapas terminam
+    """
+    timings = {}
+    _stage_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def _stage(name):
+    """
+    Soma a duração da etapa aos tempos do contexto; etapas canceladas ou com erro
+    (ex.: o ramo especulativo perdedor) não contam
+    """
+    started = time.perf_counter()
+    yield
+    timings = _stage_timings.get()
+    if timings is not None:
+        key = f"{name}_ms"
+        timings[key] = round(timings.get(key, 0.0) + (time.perf_counter() - started) * 1000, 1)
+
+
+async def _offload(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, function, *args)
+
+
+async def aclassify_intent_with_llm(prompt, llm):
+    with _stage("classify"):
+        intent_result = await (INTENT_PROMPT | for_stage(llm, "classify")).ainvoke({"input": prompt})
+    return parse_intent(intent_result.content)
+
+
+async def aclassify_user_intent(prompt, llm):
+    local_intent, confidence = classify_intent_locally(prompt)
+    if confidence >= get_confidence_threshold():
+        record_local_hit()
+        return local_intent
+
+    llm_intent = await aclassify_intent_with_llm(prompt, llm)
+    record_llm_fallback(local_intent, llm_intent)
+    return llm_intent
+
+
+async def agenerate_dynamic_query(intent, prompt, llm, table_name="table_agg_inad_consolidado", data_version=None,
+                                  conn=None):
+    with _stage("sql"):
+        cache_key, cached_query = get_cached_query(intent, prompt, table_name, data_version)
+        if cached_query is not None:
+            return cached_query
+
+        # O catálogo pode precisar ler o information_schema na primeira chamada da versão
+        query_prompt = await _offload(build_query_prompt, intent, prompt, table_name, data_version, conn)
+        sql_result = await (query_prompt | for_stage(llm, "sql")).ainvoke({"input": prompt})
+        return finish_generated_query(sql_result.content, cache_key, data_version)
+
+
+async def abuild_processing_chain(intent, dynamic_query, llm, conn, data_version=None):
+    with _stage("execute"):
+        dynamic_results = await _offload(fetch_dynamic_results, dynamic_query, conn, data_version)
+    return build_processing_prompt(intent, dynamic_results) | for_stage(llm, "answer")
+
+
+async def aprocess_question(prompt, intent, dynamic_query, llm, conn, data_version=None):
+    processing_chain = await abuild_processing_chain(intent, dynamic_query, llm, conn, data_version)
+    response = await processing_chain.ainvoke({"input": prompt})
+    return response.content
+
+
+async def astream_question(prompt, intent, dynamic_query, llm, conn, data_version=None):
+    """
+    Igual a aprocess_question, mas devolve os tokens da resposta à medida que o LLM os gera
+    """
+    processing_chain = await abuild_processing_chain(intent, dynamic_query, llm, conn, data_version)
+    with _stage("answer"):
+        async for chunk in processing_chain.astream({"input": prompt}):
+            yield chunk.content
+
+
+def general_answer(prompt, llm):
+    """
+    Resposta GERAL sem histórico, no formato esperado por aanswer_question: cada pergunta
+    é independente, então pode ser atendida por qualquer processo (API, lote)
+    """
+    async def chunks():
+        with _stage("answer"):
+            async for chunk in (GENERAL_PROMPT | for_stage(llm, "answer")).astream({"input": prompt}):
+                yield chunk.content
+
+    return chunks
+
+
+async def _cancel(*tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _discard_stream(task):
+    """
+    Cancela a resposta especulativa; se ela já tinha começado, fecha o stream aberto
+    """
+    await _cancel(task)
+    if task.done() and not task.cancelled() and task.exception() is None:
+        _, iterator = task.result()
+        close = getattr(iterator, "aclose", None)
+        if close is not None:
+            await close()
+
+
+async def _replay(first_chunks, chunks):
+    for chunk in first_chunks:
+        yield chunk
+    async for chunk in chunks:
+        yield chunk
+
+
+async def _start_stream(chunks):
+    """
+    Começa a consumir o stream e guarda o primeiro pedaço, para a resposta GERAL
+    especulativa avançar enquanto a classificação termina
+    """
+    iterator = chunks.__aiter__()
+    try:
+        return [await iterator.__anext__()], iterator
+    except StopAsyncIteration:
+        return [], iterator
+
+
+async def aanswer_question(prompt, llm, conn, general_answer, speculative=None):
+    """
+    Versão assíncrona de pipeline.answer_question. Não ocupa threads enquanto espera o
+    LLM, então um processo atende dezenas de perguntas ao mesmo tempo; o ramo especulativo
+    perdedor é cancelado de fato, interrompendo a requisição HTTP.
+
+    Params:
+        prompt: Pergunta do usuário
+        llm: Cliente do LLM (ver llm_client.get_llm_client)
+        conn: Engine do banco de dados
+        general_answer: Função sem argumentos que devolve um iterador assíncrono com os
+            pedaços de texto da resposta GERAL (ver general_answer); sem efeitos
+            colaterais, pois pode ser descartada
+        speculative: Ativa a execução especulativa (padrão: PIPELINE_SPECULATIVE)
+    Returns:
+        Tupla (intenção, consulta SQL ou None, iterador assíncrono com os pedaços da resposta)
+    """
+    if speculative is None:
+        speculative = os.getenv("PIPELINE_SPECULATIVE", "true").lower() in ("1", "true", "yes", "sim")
+
+    data_version = await _offload(get_data_version, conn)
+    local_intent, confidence = classify_intent_locally(prompt)
+
+    if confidence >= get_confidence_threshold():
+        record_local_hit()
+        intent = local_intent
+    elif not speculative:
+        intent = await aclassify_intent_with_llm(prompt, llm)
+        record_llm_fallback(local_intent, intent)
+    else:
+        intent_task = asyncio.create_task(aclassify_intent_with_llm(prompt, llm))
+        sql_intent = _speculative_sql_intent(prompt, local_intent)
+        sql_task = asyncio.create_task(
+            agenerate_dynamic_query(sql_intent, prompt, llm, data_version=data_version, conn=conn)
+        )
+        general_task = asyncio.create_task(_start_stream(general_answer()))
+
+        try:
+            intent = await intent_task
+        except BaseException:
+            await _cancel(sql_task, general_task)
+            raise
+        record_llm_fallback(local_intent, intent)
+
+        if intent == "GERAL":
+            await _cancel(sql_task)
+            first_chunks, chunks = await general_task
+            return intent, None, _replay(first_chunks, chunks)
+
+        await _discard_stream(general_task)
+        if intent == sql_intent:
+            dynamic_query = await sql_task
+        else:
+            await _cancel(sql_task)
+            dynamic_query = await agenerate_dynamic_query(intent, prompt, llm, data_version=data_version, conn=conn)
+        return intent, dynamic_query, astream_question(prompt, intent, dynamic_query, llm, conn, data_version)
+
+    if intent == "GERAL":
+        return intent, None, general_answer()
+
+    dynamic_query = await agenerate_dynamic_query(intent, prompt, llm, data_version=data_version, conn=conn)
+    return intent, dynamic_query, astream_question(prompt, intent, dynamic_query, llm, conn, data_version)
+
+
+async def _close_async_client():
+    await get_async_http_client().aclose()
+
+
+def shutdown():
+    """
+    Fecha o cliente HTTP assíncrono e para o loop do processo. Usar apenas no encerramento.
+    """
+    global _loop
+    with _loop_lock:
+        loop, _loop = _loop, None
+    if loop is not None:
+        asyncio.run_coroutine_threadsafe(_close_async_client(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+    _db_executor.shutdown(wait=False)
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+import async_pipeline
+from database import get_engine
+from llm_client import get_async_http_client, get_llm_client
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _int_env(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def read_questions(path, field="question", id_field="id"):
+    """
+    Lê as perguntas de um arquivo JSONL. Cada linha é um objeto com a pergunta em field
+    (e opcionalmente um identificador em id_field) ou apenas a pergunta como string JSON.
+    Sem identificador, a linha vira 'linha-<n>'. Identificadores repetidos são ignorados.
+
+    Returns:
+        Lista de tuplas (id, pergunta)
+    """
+    questions = []
+    seen = set()
+    with open(path, encoding="utf-8") as source:
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Linha {number} de {path} não é um JSON válido")
+            if isinstance(record, str):
+                question_id, question = f"linha-{number}", record
+            else:
+                question_id, question = record.get(id_field), record.get(field)
+                # 0 e "" são identificadores válidos; só a ausência vira 'linha-<n>'
+                question_id = f"linha-{number}" if question_id is None else str(question_id)
+            if not isinstance(question, str) or not question.strip():
+                raise ValueError(f"Linha {number} de {path} não tem o campo '{field}'")
+            if question_id in seen:
+                logger.warning("Identificador repetido ignorado: %s", question_id)
+                continue
+            seen.add(question_id)
+            questions.append((question_id, question.strip()))
+    return questions
+
+
+def load_checkpoint(path):
+    """
+    Lê as respostas já gravadas na saída, que serve de checkpoint. Uma última linha
+    incompleta (execução interrompida no meio da escrita) é descartada do arquivo.
+
+    Returns:
+        Dicionário {id: pergunta} das perguntas respondidas sem erro
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb+") as output:
+        content = output.read()
+        end = content.rfind(b"\n") + 1
+        if end < len(content):
+            output.truncate(end)
+    done = {}
+    for line in content[:end].decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("error") is None:
+            done[record["id"]] = record["question"]
+        else:
+            done.pop(record["id"], None)
+    return done
+
+
+async def answer_one(question_id, question, llm, conn):
+    """
+    Responde uma pergunta pelo pipeline assíncrono
+
+    Returns:
+        Registro da saída com intenção, SQL, resposta, tempos por etapa ou erro
+    """
+    started = time.perf_counter()
+    timings = async_pipeline.track_stage_timings()
+    record = {"id": question_id, "question": question, "intent": None, "sql": None, "answer": None}
+    try:
+        intent, dynamic_query, chunks = await async_pipeline.aanswer_question(
+            question, llm, conn, general_answer=async_pipeline.general_answer(question, llm)
+        )
+        record.update(intent=intent, sql=dynamic_query)
+        timings["plan_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        record["answer"] = "".join([chunk async for chunk in chunks])
+        record["error"] = None
+    except Exception as e:
+        logger.warning("Falha na pergunta %s: %s", question_id, e)
+        record["error"] = f"{type(e).__name__}: {e}"
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    record["timings"] = timings
+    record["finished_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    return record
+
+
+async def run_batch(questions, output_path, concurrency):
+    """
+    Responde as perguntas com no máximo concurrency ao mesmo tempo, gravando cada
+    resposta na saída assim que termina, na ordem de conclusão. Perguntas já respondidas
+    na saída (mesmo id e mesma pergunta) são puladas; as que falharam são repetidas, e a
+    última linha de cada id é a que vale.
+
+    Returns:
+        Dicionário com totais de perguntas respondidas, puladas e com erro
+    """
+    # As chamadas ao LLM rodam neste loop, sem trocar de thread
+    async_pipeline.use_loop(asyncio.get_running_loop())
+
+    done = load_checkpoint(output_path)
+    pending = [(qid, question) for qid, question in questions if done.get(qid) != question]
+    summary = {"total": len(questions), "skipped": len(questions) - len(pending), "answered": 0, "failed": 0}
+    logger.info("%s perguntas, %s já respondidas", summary["total"], summary["skipped"])
+    if not pending:
+        return summary
+
+    llm = get_llm_client()
+    conn = get_engine()
+    queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as output:
+
+        async def worker():
+            while not queue.empty():
+                question_id, question = queue.get_nowait()
+                record = await answer_one(question_id, question, llm, conn)
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                summary["failed" if record["error"] else "answered"] += 1
+                finished = summary["answered"] + summary["failed"]
+                logger.info("[%s/%s] %s %s (%.0f ms)", finished, len(pending), question_id,
+                            record["intent"] or "ERRO", record["timings"]["total_ms"])
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(concurrency, len(pending)))))
+        finally:
+            await get_async_http_client().aclose()
+
+    summary["elapsed_s"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    parser = argparse.ArgumentParser(description="Responde em lote as perguntas de um arquivo JSONL")
+    parser.add_argument("input", help="JSONL com as perguntas")
+    parser.add_argument("output", help="JSONL com as respostas; também serve de checkpoint para retomar")
+    parser.add_argument("--concurrency", type=int, default=_int_env("BATCH_CONCURRENCY", 8),
+                        help="Perguntas respondidas ao mesmo tempo (padrão: BATCH_CONCURRENCY ou 8)")
+    parser.add_argument("--field", default="question", help="Campo com a pergunta (padrão: question)")
+    parser.add_argument("--id-field", default="id", help="Campo com o identificador (padrão: id)")
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency deve ser pelo menos 1")
+
+    result = asyncio.run(run_batch(read_questions(args.input, args.field, args.id_field), args.output,
+                                   args.concurrency))
+    print(json.dumps(result, ensure_ascii=False))
@@ -1,21 +1,19 @@
 import streamlit as st
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.chat_history import InMemoryChatMessageHistory
-import httpx
 import pandas as pd
 from PIL import Image
-import time
-import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
-from insights import generate_advanced_insights
-from urllib.parse import quote_plus
+from insights import find_period, period_labels, shift_period
+from insights_store import get_insights_store
+from llm_client import for_stage, get_llm_client
+from database import get_engine, check_db_health
+from stream_render import render_stream
  
 load_dotenv()
 
-api_key = os.getenv("API_KEY")
 st.set_page_config(page_title="Análise de Inadimplência", page_icon="")
 
 if "app_initialized" not in st.session_state:
@@ -23,41 +21,18 @@ if "app_initialized" not in st.session_state:
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
-def get_llm_client():
-    return ChatOpenAI(
-        api_key=api_key,
-        base_url="https://api.deepseek.com",
-        model="deepseek-chat",
-        http_client=httpx.Client(verify=False)
-    )
-
 def connect_to_db():
     try:
-        # Dados de conexão
-        host = os.getenv("SERVER")
-        database = os.getenv("DATABASE")
-        username = os.getenv("USERNAME")
-        password = os.getenv("PASSWORD")
-        port = os.getenv("PORT")
-
-        # Validar os valores
-        if not all([host, database, username, password, port]):
-            raise ValueError("Uma ou mais variáveis de ambiente não estão definidas no .env")
-
-        # Codificar a senha para lidar com caracteres especiais
-        encoded_password = quote_plus(password)
-
-        # String de conexão com senha codificada
-        connection_string = f"postgresql://{username}:{encoded_password}@{host}:{port}/{database}"
-
-        # Criar engine do SQLAlchemy
-        engine = create_engine(connection_string)
+        # Engine compartilhado pelo processo, com pool de conexões
+        engine = get_engine()
 
         # Testar a conexão
-        with engine.connect() as connection:
+        if check_db_health(engine):
             print("Conexão com o banco de dados estabelecida com sucesso!")
-        
-        return engine
+            return engine
+
+        print("Erro ao conectar ao banco de dados: health check falhou")
+        return None
 
     except Exception as e:
         print(f"Erro ao conectar ao banco de dados: {e}")
@@ -81,7 +56,7 @@ def classify_user_intent(prompt, llm):
         ("human", "{input}")
     ])
     
-    intent_chain = intent_prompt | llm
+    intent_chain = intent_prompt | for_stage(llm, "classify")
     intent_result = intent_chain.invoke({"input": prompt})
     
     # Extrair apenas o número da classificação
@@ -129,7 +104,7 @@ def generate_dynamic_query(intent, prompt, llm):
         ("human", "{input}")
     ])
     
-    query_chain = query_prompt | llm
+    query_chain = query_prompt | for_stage(llm, "sql")
     sql_result = query_chain.invoke({"input": prompt})
     
     # Limpar a resposta para garantir que seja apenas SQL
@@ -142,7 +117,8 @@ def generate_dynamic_query(intent, prompt, llm):
 
 def process_question_with_insights(prompt, intent, dynamic_query, df, insights, llm):
     """
-    Processa a pergunta usando insights estáticos e dados dinâmicos da consulta
+    Processa a pergunta usando insights estáticos e dados dinâmicos da consulta,
+    devolvendo os pedaços da resposta à medida que o LLM os gera
     """
     # Executar a consulta dinâmica
     try:
@@ -176,10 +152,8 @@ def process_question_with_insights(prompt, intent, dynamic_query, df, insights,
         ("human", "{input}")
     ])
     
-    processing_chain = processing_prompt | llm
-    response = processing_chain.invoke({"input": prompt})
-    
-    return response.content
+    processing_chain = processing_prompt | for_stage(llm, "answer")
+    return (chunk.content for chunk in processing_chain.stream({"input": prompt}))
 
 def main():
     st.title("Chatbot Inadimplinha")
@@ -193,35 +167,29 @@ def main():
     # Inicializar o modelo LLM
     llm = get_llm_client()
     
-    # Carregar os dados do banco e gerar insights apenas uma vez
-    if "insights" not in st.session_state or "df" not in st.session_state:
-        try:
-            # Carregar os dados
-            table = "table_agg_inad_consolidado"
-            query = f"SELECT * FROM {table}"
-            df = pd.read_sql(query, conn)
-            st.session_state.df = df
-            
-            # Gerar insights
-            st.session_state.insights = generate_advanced_insights(df)
-            
-            print(f"Total de linhas carregadas do banco: {len(df)}")
-            print(f"Primeiras linhas do DataFrame:\n{df.head()}")
-        except Exception as e:
-            st.error(f"Erro ao carregar dados ou gerar insights: {str(e)}")
-            conn.dispose()
-            st.stop()
+    # Insights compartilhados entre as sessões e atualizados em segundo plano quando os
+    # dados mudam; a sessão usa a versão pronta mais recente
+    try:
+        store = get_insights_store(conn)
+        snapshot = store.get()
+    except Exception as e:
+        st.error(f"Erro ao carregar dados ou gerar insights: {str(e)}")
+        st.stop()
+    st.session_state.df = snapshot["data"]
+    st.session_state.insights = snapshot["insights"]
+    st.session_state.data_version = snapshot["version"]
+    st.session_state.period = snapshot["period"]
     
     # Criar a cadeia de execução padrão para casos simples
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", (
             "Você é um especialista em análise de inadimplência no Brasil. "
-            "Responda a pergunta do usuário com base nos dados reais de dezembro de 2024 da tabela 'table_agg_inad_consolidado', "
+            "Responda a pergunta do usuário com base nos dados reais de {periodo} da tabela 'table_agg_inad_consolidado', "
             "usando os insights detalhados abaixo como fonte principal. "
             "Os insights foram gerados a partir dos dados reais do banco e contêm valores totais e análises segmentadas. "
             "Extraia a resposta diretamente dos insights quando possível, sem inventar valores. "
             "Se a pergunta não for respondida pelos insights ou se os insights indicarem que não há dados, "
-            "informe que os dados de dezembro de 2024 não estão disponíveis e sugira verificar a fonte. "
+            "informe que os dados de {periodo} não estão disponíveis e sugira verificar a fonte. "
             "Formate os valores em reais (R$) com duas casas decimais e separadores de milhar. "
             "Inclua informações adicionais relevantes sobre inadimplência quando apropriado.\n\n"
             "Insights gerados:\n{insights}"
@@ -276,36 +244,39 @@ def main():
                     # Gerar consulta dinâmica baseada na intenção
                     dynamic_query = generate_dynamic_query(intent, prompt, llm)
                     print(f"Consulta dinâmica gerada: {dynamic_query}")
+
+                    # Perguntas sobre outro mês usam os agregados mensais em cache,
+                    # comparados com o mês anterior
+                    period = find_period(prompt) or st.session_state.period
+                    insights = st.session_state.insights
+                    if period != st.session_state.period:
+                        insights = store.get_period(period, [shift_period(period, -1)])
                     
                     # Processar a pergunta com insights e resultados dinâmicos
                     if intent != "GERAL":
-                        response_content = process_question_with_insights(
+                        response_stream = process_question_with_insights(
                             prompt, 
                             intent, 
                             dynamic_query, 
                             st.session_state.df, 
-                            st.session_state.insights,
+                            insights,
                             llm
                         )
                     else:
                         # Para perguntas gerais, usar o fluxo padrão
-                        response = conversation.invoke(
-                            {"input": prompt, "insights": st.session_state.insights},
-                            config={"configurable": {"session_id": "default"}}
+                        response_stream = (
+                            chunk.content for chunk in conversation.stream(
+                                {"input": prompt, "insights": insights, "periodo": period_labels(period)["text"]},
+                                config={"configurable": {"session_id": "default"}}
+                            )
                         )
-                        response_content = response.content
-                    
-                    # Simulando streaming para melhor UX
-                    full_response = ""
-                    for i in range(len(response_content)):
-                        full_response = response_content[:i+1]
-                        message_placeholder.markdown(full_response + "▌")
-                        time.sleep(0.01)
-                    message_placeholder.markdown(full_response)
-                    
-                    # Adicionar à exibição do histórico
-                    st.session_state.chat_history.append({"role": "assistant", "content": full_response})
-                    st.session_state.chat_history_store.add_ai_message(full_response)
+
+                # Exibir os tokens à medida que o LLM os gera
+                full_response = render_stream(response_stream, message_placeholder)
+
+                # Adicionar à exibição do histórico
+                st.session_state.chat_history.append({"role": "assistant", "content": full_response})
+                st.session_state.chat_history_store.add_ai_message(full_response)
                 
             except Exception as e:
                 error_message = f"Erro no processamento: {str(e)}"
@@ -334,7 +305,6 @@ def main():
             st.session_state.app_initialized = False
             st.rerun()
 
-    conn.dispose()  # Fechar o engine ao final da execução
 
 if __name__ == "__main__":
     main()
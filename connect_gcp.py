@@ -1,6 +1,10 @@
 import pandas as pd
 import psycopg2
 from dotenv import load_dotenv
+from data_version import get_data_version
+from database import get_engine
+from snapshot import use_snapshot
+from table_schema import load_compact_table
 import os
 load_dotenv()
 def connect_to_postgres():
@@ -31,12 +35,21 @@ def connect_to_postgres():
 def fetch_data_from_postgres(conn):
     try:
         # Consulta SQL para buscar os dados
-        query = "SELECT * FROM projecao_consolidado"   
-        print("Executando consulta SQL...")
+        table = "projecao_consolidado"
+        # A versão dos dados é consultada pelo engine do SQLAlchemy: com a conexão psycopg2
+        # a consulta falharia e o snapshot nunca seria considerado atualizado
+        data_version = get_data_version(get_engine())
+        if use_snapshot(conn, table, data_version):
+            print("Lendo snapshot local...")
+        else:
+            print("Executando consulta SQL...")
         
-        # Lendo os dados diretamente para um DataFrame do pandas
-        df = pd.read_sql_query(query, conn)
+        # Lendo os dados do snapshot Parquet, ou diretamente do banco se não houver snapshot atualizado,
+        # com dimensões categóricas e medidas inteiras compactas
+        df = load_compact_table(conn, table, data_version=data_version)
+        memory = df.attrs["memory"]
         print("Dados carregados com sucesso!")
+        print(f"Memória: {memory['before'] / 1024 ** 2:.1f} MB -> {memory['after'] / 1024 ** 2:.1f} MB")
         return df
 
     except Exception as e:
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+import time
+
+from sqlalchemy import bindparam, text
+
+TRACKED_TABLES = ("table_agg_inad_consolidado", "projecao_consolidado")
+
+# Contadores de modificação mantidos pelo próprio Postgres: consultar o catálogo
+# é barato e não exige varrer as tabelas. O relid muda quando a tabela é recriada,
+# caso em que os contadores recomeçam do zero. n_live_tup fica de fora: é uma
+# estimativa reescrita por ANALYZE e autovacuum sem que os dados mudem.
+_VERSION_QUERY = text("""
+    SELECT relname, relid, n_tup_ins, n_tup_upd, n_tup_del
+    FROM pg_stat_user_tables
+    WHERE relname IN :tables
+    ORDER BY relname
+""").bindparams(bindparam("tables", expanding=True))
+
+_lock = threading.Lock()
+_state = {"version": None, "checked_at": 0.0}
+_subscribers = []
+
+
+def get_probe_interval():
+    return float(os.getenv("DATA_VERSION_INTERVAL", "60"))
+
+
+def probe_data_version(engine, tables=TRACKED_TABLES):
+    """
+    Consulta os contadores de modificação das tabelas e devolve um identificador curto
+    que muda sempre que alguma linha é inserida, alterada ou removida
+
+    Params:
+        engine: Engine do SQLAlchemy
+        tables: Tabelas monitoradas
+    Returns:
+        String com a versão dos dados
+    """
+    with engine.connect() as connection:
+        rows = connection.execute(_VERSION_QUERY, {"tables": list(tables)}).fetchall()
+    fingerprint = "|".join(",".join(str(value) for value in row) for row in rows)
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12]
+
+
+def subscribe(callback):
+    """
+    Registra uma função chamada com (versão_antiga, versão_nova) quando os dados mudam
+    """
+    with _lock:
+        _subscribers.append(callback)
+
+
+def get_data_version(engine, max_age=None, force=False):
+    """
+    Retorna a versão atual dos dados. O banco é consultado no máximo uma vez a cada
+    max_age segundos por processo; nas demais chamadas a última versão é reaproveitada.
+    Se a consulta falhar, a última versão conhecida é mantida.
+
+    Params:
+        engine: Engine do SQLAlchemy
+        max_age: Intervalo mínimo entre consultas (padrão: DATA_VERSION_INTERVAL)
+        force: Ignora o intervalo e consulta o banco imediatamente
+    Returns:
+        String com a versão dos dados ("desconhecida" se nunca foi possível consultar)
+    """
+    if max_age is None:
+        max_age = get_probe_interval()
+
+    with _lock:
+        now = time.monotonic()
+        if not force and _state["version"] is not None and now - _state["checked_at"] < max_age:
+            return _state["version"]
+        # Marca a verificação antes de consultar para que sessões concorrentes não repitam a consulta
+        _state["checked_at"] = now
+        previous = _state["version"]
+
+    try:
+        version = probe_data_version(engine)
+    except Exception as e:
+        # print(f"Erro ao consultar versão dos dados: {e}")
+        return previous or "desconhecida"
+
+    with _lock:
+        _state["version"] = version
+        callbacks = list(_subscribers) if previous is not None and previous != version else []
+
+    for callback in callbacks:
+        callback(previous, version)
+    return version
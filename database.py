@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from urllib.parse import quote_plus
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+load_dotenv()
+
+_engine = None
+_engine_lock = threading.Lock()
+_last_health_check = {"timestamp": 0.0, "healthy": False}
+
+
+def _int_env(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _bool_env(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "sim")
+
+
+def get_pool_settings():
+    """
+    Lê as configurações do pool de conexões a partir do .env
+
+    Returns:
+        Dicionário com os parâmetros de pool aceitos pelo create_engine
+    """
+    return {
+        "pool_size": _int_env("DB_POOL_SIZE", 5),
+        "max_overflow": _int_env("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _int_env("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _int_env("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": _bool_env("DB_POOL_PRE_PING", True),
+    }
+
+
+def get_connection_string():
+    host = os.getenv("SERVER")
+    database = os.getenv("DATABASE")
+    username = os.getenv("USERNAME")
+    password = os.getenv("PASSWORD")
+    port = os.getenv("PORT")
+
+    if not all([host, database, username, password, port]):
+        raise ValueError("Uma ou mais variáveis de ambiente não estão definidas no .env")
+
+    encoded_password = quote_plus(password)
+    return f"postgresql://{username}:{encoded_password}@{host}:{port}/{database}"
+
+
+def get_engine():
+    """
+    Retorna o engine do SQLAlchemy compartilhado por todas as sessões do processo.
+    O engine é criado uma única vez e mantém um pool de conexões aquecidas.
+
+    Returns:
+        Engine do SQLAlchemy
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(get_connection_string(), **get_pool_settings())
+    return _engine
+
+
+def check_db_health(engine=None, max_age=None):
+    """
+    Verifica se o banco responde a uma consulta trivial usando uma conexão do pool.
+    Um resultado positivo é reaproveitado por max_age segundos para não custar
+    uma consulta extra a cada mensagem.
+
+    Params:
+        engine: Engine a verificar (padrão: engine compartilhado)
+        max_age: Validade em segundos do último resultado (padrão: DB_HEALTH_CHECK_INTERVAL)
+    Returns:
+        True se o banco respondeu, False caso contrário
+    """
+    if max_age is None:
+        max_age = _int_env("DB_HEALTH_CHECK_INTERVAL", 30)
+    now = time.monotonic()
+    if _last_health_check["healthy"] and now - _last_health_check["timestamp"] < max_age:
+        return True
+
+    try:
+        engine = engine or get_engine()
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        healthy = True
+    except Exception as e:
+        # print(f"Falha no health check do banco de dados: {e}")
+        healthy = False
+
+    _last_health_check["timestamp"] = now
+    _last_health_check["healthy"] = healthy
+    return healthy
+
+
+def get_pool_status(engine=None):
+    """
+    Retorna um resumo do estado do pool (conexões em uso, livres e overflow)
+    """
+    engine = engine or get_engine()
+    return engine.pool.status()
+
+
+def dispose_engine():
+    """
+    Fecha todas as conexões do pool. Usar apenas no encerramento do processo.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
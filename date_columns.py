@@ -0,0 +1,117 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Colunas de data armazenadas como texto e a coluna DATE gerada a partir de cada uma
+DATE_COLUMNS = {
+    "projecao_consolidado": {"source": "ano_mes", "column": "data_projecao"},
+}
+
+# Formato em que as datas são armazenadas e equivalente do strptime
+STORED_DATE_FORMAT = "DD/MM/YYYY"
+STORED_STRPTIME_FORMAT = "%d/%m/%Y"
+# Valores antigos no formato ano-mês ainda são aceitos
+FALLBACK_STRPTIME_FORMAT = "%Y-%m"
+
+PARSE_FUNCTION = "parse_data_texto"
+
+
+def apply_date_columns(engine):
+    """
+    Cria em cada tabela de DATE_COLUMNS uma coluna DATE gerada e indexada a partir da
+    coluna de texto. A conversão é STORED, então acontece uma vez por linha na escrita, e
+    filtros por intervalo de datas passam a usar o índice em vez de TO_DATE a cada linha.
+    Valores que não são datas válidas ficam NULL. Pode ser executada mais de uma vez.
+    """
+    with engine.begin() as connection:
+        # TO_DATE não é IMMUTABLE e não pode ser usada diretamente na coluna gerada
+        connection.execute(text(f"""
+            CREATE OR REPLACE FUNCTION {PARSE_FUNCTION}(valor TEXT) RETURNS DATE
+            LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+            BEGIN
+                IF valor ~ '^\\d{{1,2}}/\\d{{1,2}}/\\d{{4}}$' THEN
+                    RETURN TO_DATE(valor, '{STORED_DATE_FORMAT}');
+                ELSIF valor ~ '^\\d{{4}}-\\d{{1,2}}$' THEN
+                    RETURN TO_DATE(valor, 'YYYY-MM');
+                END IF;
+                RETURN NULL;
+            EXCEPTION WHEN OTHERS THEN
+                RETURN NULL;
+            END
+            $$
+        """))
+        for table, spec in DATE_COLUMNS.items():
+            connection.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {spec['column']} DATE "
+                f"GENERATED ALWAYS AS ({PARSE_FUNCTION}({spec['source']})) STORED"
+            ))
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {table}_{spec['column']}_idx ON {table} ({spec['column']})"
+            ))
+
+
+def date_parse_duckdb(column):
+    """
+    Expressão do DuckDB equivalente à coluna gerada, usada no snapshot local
+    """
+    return (
+        f"COALESCE(CAST(try_strptime({column}, '{STORED_STRPTIME_FORMAT}') AS DATE), "
+        f"CAST(try_strptime({column}, '{FALLBACK_STRPTIME_FORMAT}') AS DATE))"
+    )
+
+
+def parse_dates(values):
+    """
+    Converte uma série de datas em texto para datetime64, interpretando cada valor distinto
+    uma única vez. Valores inválidos viram NaT.
+
+    Params:
+        values: Série com datas em 'DD/MM/AAAA' (ou 'AAAA-MM'), possivelmente categórica
+    Returns:
+        Série datetime64 com o mesmo índice
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        uniques = pd.Series(values.cat.categories)
+        codes = values.cat.codes.to_numpy()
+    else:
+        codes, uniques = pd.factorize(values)
+        uniques = pd.Series(uniques)
+    text_values = uniques.astype(str)
+    parsed = pd.to_datetime(text_values, format=STORED_STRPTIME_FORMAT, errors="coerce")
+    missing = parsed.isna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(text_values[missing], format=FALLBACK_STRPTIME_FORMAT, errors="coerce")
+    # Código -1 (valor ausente) aponta para o NaT acrescentado ao final
+    dates = np.append(parsed.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))
+    return pd.Series(dates[codes], index=values.index)
+
+
+def with_date_columns(df, table):
+    """
+    Acrescenta ao DataFrame a coluna de data da tabela, se ainda não veio do banco
+
+    Returns:
+        DataFrame com a coluna DATE como datetime64
+    """
+    spec = DATE_COLUMNS.get(table)
+    if spec is None or spec["source"] not in df.columns:
+        return df
+    if spec["column"] in df.columns:
+        if not pd.api.types.is_datetime64_any_dtype(df[spec["column"]]):
+            return df.assign(**{spec["column"]: pd.to_datetime(df[spec["column"]], errors="coerce")})
+        return df
+    return df.assign(**{spec["column"]: parse_dates(df[spec["source"]])})
+
+
+if __name__ == "__main__":
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Colunas de data tipadas")
+    parser.add_argument("command", choices=["apply"])
+    args = parser.parse_args()
+
+    apply_date_columns(get_engine())
+    print("Colunas de data geradas e indexadas.")
@@ -1,321 +1,581 @@
+import re
+
 import pandas as pd
 import numpy as np
+from regions import UF_TO_REGION
+
+# Colunas de table_agg_inad_consolidado usadas por generate_advanced_insights
+INSIGHTS_COLUMNS = [
+    'data_base', 'uf', 'cliente', 'ocupacao', 'cnae_secao', 'porte', 'modalidade',
+    'soma_a_vencer_ate_90_dias', 'soma_numero_de_operacoes', 'soma_carteira_ativa',
+    'soma_carteira_inadimplida_arrastada', 'soma_ativo_problematico'
+]
+
+INAD = 'soma_carteira_inadimplida_arrastada'
+ATIVA = 'soma_carteira_ativa'
+OPERACOES = 'soma_numero_de_operacoes'
+PROBLEMATICO = 'soma_ativo_problematico'
+A_VENCER_90 = 'soma_a_vencer_ate_90_dias'
+PROJECAO_90 = 'projecao_inadimplencia_90d'
+REESTRUTURACAO = 'indicador_reestruturacao'
+
+# Agrupamentos calculados sobre os dados do mês: chaves e colunas somadas. Seções que
+# usam as mesmas chaves compartilham uma única passada; como cada coluna é somada de
+# forma independente, os totais são idênticos aos de agrupamentos separados.
+GROUPINGS = {
+    'regiao': (['regiao'], [INAD, ATIVA, OPERACOES]),
+    'uf_cliente': (['uf', 'tipo_cliente'], [INAD, ATIVA]),
+    'cnae': (['cnae_secao'], [INAD, ATIVA, OPERACOES]),
+    'cliente': (['tipo_cliente'], [INAD, ATIVA, OPERACOES, PROBLEMATICO, A_VENCER_90, PROJECAO_90]),
+    'cliente_porte': (['tipo_cliente', 'porte'], [INAD, ATIVA, OPERACOES, PROBLEMATICO, A_VENCER_90,
+                                                  PROJECAO_90, REESTRUTURACAO]),
+    'cliente_modalidade': (['tipo_cliente', 'modalidade'], [INAD, ATIVA, OPERACOES]),
+    'modalidade': (['modalidade'], [INAD, ATIVA, OPERACOES]),
+    'cliente_ocupacao': (['tipo_cliente', 'ocupacao'], [INAD, ATIVA, OPERACOES]),
+}
+
 
-def generate_advanced_insights(df):
+DEFAULT_PERIOD = '2024-12'
+
+MONTH_NAMES = [
+    'janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho',
+    'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro'
+]
+
+
+def parse_period(period):
     """
-    Gera insights detalhados sobre inadimplência a partir de dados consolidados de dezembro de 2024
-    
-    Params:
-        df: DataFrame com dados consolidados de inadimplência
-    
+    Converte 'AAAA-MM' em (ano, mês)
+    """
+    year, month = (int(part) for part in str(period).split('-'))
+    if not 1 <= month <= 12:
+        raise ValueError(f"Período inválido: {period}")
+    return year, month
+
+
+def shift_period(period, months):
+    """
+    Desloca o período 'AAAA-MM' em alguns meses (negativo para o passado)
+    """
+    year, month = parse_period(period)
+    index = year * 12 + month - 1 + months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def period_labels(period):
+    """
+    Rótulos usados no texto, ex.: 'DEZEMBRO 2024', 'DEZ/2024' e 'dezembro de 2024'
+    """
+    year, month = parse_period(period)
+    name = MONTH_NAMES[month - 1]
+    return {
+        'title': f"{name.upper()} {year}",
+        'short': f"{name[:3].upper()}/{year}",
+        'text': f"{name} de {year}",
+    }
+
+
+def partition_period(value):
+    """
+    Período 'AAAA-MM' de um valor de data_base ('DD/MM/AAAA'), ou None se não for uma data válida
+    """
+    date = pd.to_datetime(value, format='%d/%m/%Y', errors='coerce')
+    return None if pd.isna(date) else f"{date.year:04d}-{date.month:02d}"
+
+
+_PERIOD_PATTERNS = [
+    re.compile(r'\b(' + '|'.join(MONTH_NAMES) + r')(?:\s+de)?\s+(\d{4})\b', re.IGNORECASE),
+    re.compile(r'\b(0?[1-9]|1[0-2])/(\d{4})\b'),
+    re.compile(r'\b(\d{4})-(0[1-9]|1[0-2])\b'),
+]
+
+
+def find_period(text):
+    """
+    Procura um mês de referência na pergunta, ex.: 'novembro de 2024', '11/2024' ou '2024-11'
+
     Returns:
-        String com insights formatados
+        Período no formato 'AAAA-MM', ou None se a pergunta não cita um mês
     """
-    # Filtrar apenas dados de dezembro de 2024
-    df['data_base'] = pd.to_datetime(df['data_base'], format='%d/%m/%Y', errors='coerce')
-    df = df[(df['data_base'].dt.month == 12) & (df['data_base'].dt.year == 2024)].copy()
-    
-    if df.empty:
-        return "Nenhum dado disponível para dezembro de 2024."
-
-    # Preparar dados - mapear regiões
-    df['regiao'] = df['uf'].map({
-        'AC': 'Norte', 'AM': 'Norte', 'AP': 'Norte', 'PA': 'Norte', 'RO': 'Norte', 'RR': 'Norte', 'TO': 'Norte',
-        'AL': 'Nordeste', 'BA': 'Nordeste', 'CE': 'Nordeste', 'MA': 'Nordeste', 'PB': 'Nordeste', 
-        'PE': 'Nordeste', 'PI': 'Nordeste', 'RN': 'Nordeste', 'SE': 'Nordeste',
-        'GO': 'Centro-Oeste', 'MT': 'Centro-Oeste', 'MS': 'Centro-Oeste', 'DF': 'Centro-Oeste',
-        'SP': 'Sudeste', 'RJ': 'Sudeste', 'MG': 'Sudeste', 'ES': 'Sudeste',
-        'PR': 'Sul', 'RS': 'Sul', 'SC': 'Sul'
-    })
-    
-    # Calcular taxa de inadimplência
-    df['taxa_inadimplencia'] = (df['soma_carteira_inadimplida_arrastada'] / df['soma_carteira_ativa'] * 100).fillna(0)
-    
-    # Calcular índice de ativo problemático
-    df['indice_ativo_problematico'] = (df['soma_ativo_problematico'] / df['soma_carteira_ativa'] * 100).fillna(0)
-    
+    match = _PERIOD_PATTERNS[0].search(text)
+    if match:
+        return f"{match.group(2)}-{MONTH_NAMES.index(match.group(1).lower()) + 1:02d}"
+    match = _PERIOD_PATTERNS[1].search(text)
+    if match:
+        return f"{match.group(2)}-{int(match.group(1)):02d}"
+    match = _PERIOD_PATTERNS[2].search(text)
+    if match:
+        return f"{match.group(1)}-{match.group(2)}"
+    return None
+
+
+def _as_category(series, mapper=None):
+    """
+    Converte a série em categórica com as categorias em ordem crescente, a mesma ordem em
+    que o groupby apresenta as chaves. Com mapper, aplica a função ou dicionário apenas aos
+    valores distintos. Agrupar pelos códigos evita refatorar as strings a cada groupby.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Já categórica (ver table_schema): só reordena as categorias, sem tocar nas linhas
+        categories = series.cat.categories
+        order = np.argsort(categories.to_numpy(dtype=object), kind='stable')
+        positions = np.empty(len(order), dtype=np.int64)
+        positions[order] = np.arange(len(order))
+        codes = series.cat.codes.to_numpy()
+        codes = np.where(codes >= 0, np.append(positions, -1)[codes], -1)
+        uniques = categories[order]
+    else:
+        codes, uniques = pd.factorize(series, sort=True)
+    if mapper is not None:
+        mapped_codes, uniques = pd.factorize(pd.Series(uniques, dtype=object).map(mapper), sort=True)
+        # Código -1 (valor ausente ou sem mapeamento) continua ausente
+        codes = np.where(codes >= 0, np.append(mapped_codes, -1)[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=series.index)
+
+
+def _client_type(value):
+    return 'PF' if value.strip().upper() == 'PF' else 'PJ'
+
+
+def _summarize(df, keys, columns):
+    return df.groupby(keys, observed=True)[columns].sum().reset_index()
+
+
+def _top(frame, column, n=None):
+    ordered = frame.sort_values(column, ascending=False)
+    return ordered if n is None else ordered.head(n)
+
+
+def _format_rows(frame, template):
+    return [template.format(**row) for row in frame.to_dict('records')]
+
+
+def _month_mask(values, period):
+    year, month = parse_period(period)
+    dates = pd.to_datetime(values, format='%d/%m/%Y', errors='coerce')
+    return (dates.dt.month == month) & (dates.dt.year == year)
+
+
+def select_month_partitions(partitions, period=DEFAULT_PERIOD):
+    """
+    Filtra os valores de data_base (partições do snapshot) que pertencem ao período 'AAAA-MM'
+    """
+    partitions = list(partitions)
+    mask = _month_mask(pd.Series(partitions, dtype=object), period)
+    return [partition for partition, selected in zip(partitions, mask) if selected]
+
+
+def _prepare_month(df, period):
+    """
+    Novo DataFrame com as linhas do período e as colunas derivadas; o DataFrame recebido
+    não é modificado
+    """
+    df = df.loc[_month_mask(df['data_base'], period), [column for column in INSIGHTS_COLUMNS if column != 'data_base']]
+
+    # Chaves de agrupamento categóricas; região e tipo de cliente são calculados uma vez
+    # por valor distinto
+    df['regiao'] = _as_category(df['uf'], UF_TO_REGION)
+    df['tipo_cliente'] = _as_category(df['cliente'], _client_type)
+    for column in ['uf', 'cnae_secao', 'porte', 'modalidade', 'ocupacao']:
+        df[column] = _as_category(df[column])
+
     # Calcular projeção de inadimplência em 90 dias
-    df['projecao_inadimplencia_90d'] = np.where(
-        df['soma_carteira_ativa'] > 0,
-        df['soma_a_vencer_ate_90_dias'] * (df['soma_carteira_inadimplida_arrastada'] / df['soma_carteira_ativa']),
+    df[PROJECAO_90] = np.where(
+        df[ATIVA] > 0,
+        df[A_VENCER_90] * (df[INAD] / df[ATIVA]),
         0
     )
-    
+
     # Calcular indicador de reestruturação
-    df['indicador_reestruturacao'] = df['soma_ativo_problematico'] - df['soma_carteira_inadimplida_arrastada']
-    
-    # Determinar tipo de cliente com base na coluna 'cliente'
-    df['tipo_cliente'] = df['cliente'].apply(lambda x: 'PF' if x.strip().upper() == 'PF' else 'PJ')
-    
-    # Preparar insights detalhados para dezembro de 2024
-    insights = "# ANÁLISE ESTRATÉGICA DE INADIMPLÊNCIA BANCÁRIA - DEZEMBRO 2024\n\n"
-    
-    # 1. VISÃO GERAL
-    insights += "## 1. VISÃO GERAL DO CENÁRIO DE INADIMPLÊNCIA (DEZ/2024)\n\n"
-    
-    total_inadimplencia = df['soma_carteira_inadimplida_arrastada'].sum()
-    total_ativo_problematico = df['soma_ativo_problematico'].sum()
-    total_carteira = df['soma_carteira_ativa'].sum()
+    # Em float64 para não transbordar quando as medidas vêm em tipos inteiros compactos
+    df[REESTRUTURACAO] = df[PROBLEMATICO].astype('float64') - df[INAD]
+    return df
+
+
+def _aggregate(df):
+    return {
+        'rows': len(df),
+        'totals': {column: df[column].sum() for column in [INAD, PROBLEMATICO, ATIVA, OPERACOES]},
+        'groups': {name: _summarize(df, keys, columns) for name, (keys, columns) in GROUPINGS.items()},
+    }
+
+
+def compute_insight_aggregates(df, period=DEFAULT_PERIOD):
+    """
+    Calcula os totais e agrupamentos de um mês usados nos insights
+
+    Params:
+        df: DataFrame com dados consolidados de inadimplência (não é modificado)
+        period: Mês de referência no formato 'AAAA-MM'
+
+    Returns:
+        Dicionário com 'rows', 'totals' e 'groups' (ver GROUPINGS), ou None se não há
+        dados do mês
+    """
+    df = _prepare_month(df, period)
+    if df.empty:
+        return None
+    return _aggregate(df)
+
+
+def stream_insight_aggregates(chunks, period=DEFAULT_PERIOD):
+    """
+    Calcula os mesmos agregados de compute_insight_aggregates consumindo a tabela em blocos
+    (ver snapshot.iter_table_chunks). Cada bloco é resumido e somado aos resumos anteriores,
+    então a memória depende do tamanho do bloco e do número de grupos, não da tabela.
+    As somas parciais são combinadas em float64 e podem diferir das do cálculo em memória
+    apenas no arredondamento.
+
+    Params:
+        chunks: Iterável de DataFrames com as colunas de INSIGHTS_COLUMNS
+        period: Mês de referência no formato 'AAAA-MM'
+
+    Returns:
+        Dicionário com 'rows', 'totals' e 'groups', ou None se não há dados do mês
+    """
+    result = None
+    for chunk in chunks:
+        month = _prepare_month(chunk, period)
+        if month.empty:
+            continue
+        partial = _aggregate(month)
+        del month
+        if result is None:
+            result = partial
+            continue
+        result = {
+            'rows': result['rows'] + partial['rows'],
+            'totals': {column: result['totals'][column] + value for column, value in partial['totals'].items()},
+            'groups': {
+                # As categorias de cada bloco são diferentes; as chaves voltam a texto ao concatenar
+                name: pd.concat([result['groups'][name], partial['groups'][name]], ignore_index=True)
+                .groupby(GROUPINGS[name][0], observed=True)[GROUPINGS[name][1]].sum().reset_index()
+                for name in GROUPINGS
+            },
+        }
+    return result
+
+
+def format_advanced_insights(aggregates, period=DEFAULT_PERIOD, comparisons=None):
+    """
+    Monta o texto dos insights a partir do resultado de compute_insight_aggregates,
+    sem modificá-lo
+
+    Params:
+        aggregates: Agregados do período de referência
+        period: Período de referência no formato 'AAAA-MM'
+        comparisons: Dicionário opcional {período: agregados} de períodos de comparação,
+            ex.: mês anterior e mesmo mês do ano anterior; cada um gera uma seção de variações
+
+    Returns:
+        String com insights formatados
+    """
+    labels = period_labels(period)
+    if aggregates is None:
+        return f"Nenhum dado disponível para {labels['text']}."
+
+    summaries = {name: frame.copy() for name, frame in aggregates['groups'].items()}
+    totals = aggregates['totals']
+
+    total_inadimplencia = totals[INAD]
+    total_ativo_problematico = totals[PROBLEMATICO]
+    total_carteira = totals[ATIVA]
     taxa_global = (total_inadimplencia / total_carteira * 100) if total_carteira > 0 else 0
-    
-    insights += f"- **Carteira Total**: R$ {total_carteira:,.2f}\n"
-    insights += f"- **Total Inadimplido**: R$ {total_inadimplencia:,.2f} ({taxa_global:.2f}% da carteira total)\n"
-    insights += f"- **Ativos Problemáticos**: R$ {total_ativo_problematico:,.2f}\n"
-    insights += f"- **Total de Operações**: {df['soma_numero_de_operacoes'].sum():,.0f}\n"
-    
-    # 2. ANÁLISE REGIONAL
-    insights += "\n## 2. PANORAMA REGIONAL DE INADIMPLÊNCIA (DEZ/2024)\n\n"
-    
-    region_summary = df.groupby('regiao').agg({
-        'soma_carteira_inadimplida_arrastada': 'sum',
-        'soma_carteira_ativa': 'sum',
-        'soma_numero_de_operacoes': 'sum'
-    }).reset_index()
-    
-    region_summary['percentual_inadimplencia'] = region_summary['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100
-    region_summary['taxa_inadimplencia'] = region_summary['soma_carteira_inadimplida_arrastada'] / region_summary['soma_carteira_ativa'] * 100
-    
-    for _, row in region_summary.sort_values('soma_carteira_inadimplida_arrastada', ascending=False).iterrows():
-        insights += f"### {row['regiao']}:\n"
-        insights += f"- **Inadimplência**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
-        insights += f"({row['percentual_inadimplencia']:.2f}% do total inadimplido)\n"
-        insights += f"- **Taxa de Inadimplência**: {row['taxa_inadimplencia']:.2f}%\n"
-        insights += f"- **Número de Operações**: {row['soma_numero_de_operacoes']:,.0f}\n\n"
-    
-    # 3. ANÁLISE POR ESTADO E TIPO DE CLIENTE
-    insights += "\n## 3. ESTADOS COM MAIOR ÍNDICE DE INADIMPLÊNCIA POR TIPO DE CLIENTE (DEZ/2024)\n\n"
 
-    state_client_summary = df.groupby(['uf', 'tipo_cliente']).agg({
-        'soma_carteira_inadimplida_arrastada': 'sum',
-        'soma_carteira_ativa': 'sum'
-    }).reset_index()
+    region_summary = summaries['regiao']
+    region_summary['percentual_inadimplencia'] = region_summary[INAD] / total_inadimplencia * 100
+    region_summary['taxa_inadimplencia'] = region_summary[INAD] / region_summary[ATIVA] * 100
+
+    state_client_summary = summaries['uf_cliente']
+    state_client_summary['taxa_inadimplencia'] = (state_client_summary[INAD] / state_client_summary[ATIVA] * 100).fillna(0)
+
+    cnae_summary = summaries['cnae']
+    cnae_summary['percentual_total'] = cnae_summary[INAD] / total_inadimplencia * 100
+    cnae_summary['taxa_inadimplencia'] = cnae_summary[INAD] / cnae_summary[ATIVA] * 100
+
+    client_type_summary = summaries['cliente']
+    client_type_summary['taxa_inadimplencia'] = (client_type_summary[INAD] / client_type_summary[ATIVA] * 100).fillna(0)
+    client_type_summary['media_por_operacao'] = (client_type_summary[INAD] / client_type_summary[OPERACOES]).fillna(0)
+    client_type_summary['percentual_inadimplencia'] = (client_type_summary[INAD] / total_inadimplencia * 100).fillna(0)
+    client_type_summary['risco_90d_percentual'] = (client_type_summary[PROJECAO_90] / client_type_summary[A_VENCER_90] * 100).fillna(0)
+
+    # Porte, projeção e reestruturação usam o mesmo agrupamento por tipo de cliente e porte
+    segment_summary = summaries['cliente_porte']
+    segment_summary['taxa_inadimplencia'] = (segment_summary[INAD] / segment_summary[ATIVA] * 100).fillna(0)
+    segment_summary['indice_problematico'] = (segment_summary[PROBLEMATICO] / segment_summary[ATIVA] * 100).fillna(0)
+    segment_summary['risco_percentual'] = segment_summary[PROJECAO_90] / segment_summary[A_VENCER_90] * 100
+    segment_summary['aumento_previsto'] = segment_summary[PROJECAO_90] / segment_summary[INAD] * 100
+    segment_summary['percentual_reestruturacao'] = segment_summary[REESTRUTURACAO] / segment_summary[PROBLEMATICO] * 100
+
+    modality_summary_client = summaries['cliente_modalidade']
+    modality_summary_client['taxa_inadimplencia'] = (modality_summary_client[INAD] / modality_summary_client[ATIVA] * 100).fillna(0)
+    modality_summary_client['percentual_inadimplencia'] = (modality_summary_client[INAD] / total_inadimplencia * 100).fillna(0)
+
+    modality_summary = summaries['modalidade']
+    modality_summary['taxa_inadimplencia'] = modality_summary[INAD] / modality_summary[ATIVA] * 100
+    modality_summary['percentual_total'] = modality_summary[INAD] / total_inadimplencia * 100
+    modality_by_rate = _top(modality_summary, 'taxa_inadimplencia')
 
-    state_client_summary['taxa_inadimplencia'] = (
-        state_client_summary['soma_carteira_inadimplida_arrastada'] / state_client_summary['soma_carteira_ativa'] * 100
-    ).fillna(0)
+    # As linhas de PF, na mesma ordem, de um agrupamento feito só sobre PF
+    occupation_summary = summaries['cliente_ocupacao']
+    occupation_summary = occupation_summary[occupation_summary['tipo_cliente'] == 'PF'].copy()
+    occupation_summary['taxa_inadimplencia'] = occupation_summary[INAD] / occupation_summary[ATIVA] * 100
+    occupation_summary['media_por_operacao'] = occupation_summary[INAD] / occupation_summary[OPERACOES]
 
-    insights += "### Top Estados por Tipo de Cliente:\n"
+    # Preparar insights detalhados do período
+    insights = [f"# ANÁLISE ESTRATÉGICA DE INADIMPLÊNCIA BANCÁRIA - {labels['title']}\n\n"]
+
+    # 1. VISÃO GERAL
+    insights.append(f"## 1. VISÃO GERAL DO CENÁRIO DE INADIMPLÊNCIA ({labels['short']})\n\n")
+    insights.append(f"- **Carteira Total**: R$ {total_carteira:,.2f}\n")
+    insights.append(f"- **Total Inadimplido**: R$ {total_inadimplencia:,.2f} ({taxa_global:.2f}% da carteira total)\n")
+    insights.append(f"- **Ativos Problemáticos**: R$ {total_ativo_problematico:,.2f}\n")
+    insights.append(f"- **Total de Operações**: {totals[OPERACOES]:,.0f}\n")
+
+    # 2. ANÁLISE REGIONAL
+    insights.append(f"\n## 2. PANORAMA REGIONAL DE INADIMPLÊNCIA ({labels['short']})\n\n")
+    insights += _format_rows(
+        _top(region_summary, INAD),
+        "### {regiao}:\n"
+        "- **Inadimplência**: R$ {soma_carteira_inadimplida_arrastada:,.2f} "
+        "({percentual_inadimplencia:.2f}% do total inadimplido)\n"
+        "- **Taxa de Inadimplência**: {taxa_inadimplencia:.2f}%\n"
+        "- **Número de Operações**: {soma_numero_de_operacoes:,.0f}\n\n"
+    )
+
+    # 3. ANÁLISE POR ESTADO E TIPO DE CLIENTE
+    insights.append(f"\n## 3. ESTADOS COM MAIOR ÍNDICE DE INADIMPLÊNCIA POR TIPO DE CLIENTE ({labels['short']})\n\n")
+    insights.append("### Top Estados por Tipo de Cliente:\n")
     for tipo_cliente in ['PF', 'PJ']:
-        insights += f"\n#### {tipo_cliente}:\n"
-        top_states = state_client_summary[state_client_summary['tipo_cliente'] == tipo_cliente] \
-            .sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(5)
-        for _, row in top_states.iterrows():
-            insights += f"- **{row['uf']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
-            insights += f"(Taxa: {row['taxa_inadimplencia']:.2f}%)\n"
+        insights.append(f"\n#### {tipo_cliente}:\n")
+        insights += _format_rows(
+            _top(state_client_summary[state_client_summary['tipo_cliente'] == tipo_cliente], INAD, 5),
+            "- **{uf}**: R$ {soma_carteira_inadimplida_arrastada:,.2f} (Taxa: {taxa_inadimplencia:.2f}%)\n"
+        )
 
     # 4. ANÁLISE SETORIAL (CNAE)
-    insights += "\n## 4. SETORES ECONÔMICOS E INADIMPLÊNCIA (DEZ/2024)\n\n"
-    
-    cnae_summary = df.groupby('cnae_secao').agg({
-        'soma_carteira_inadimplida_arrastada': 'sum',
-        'soma_carteira_ativa': 'sum',
-        'soma_numero_de_operacoes': 'sum'
-    }).reset_index()
-    
-    cnae_summary['percentual_total'] = cnae_summary['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100
-    cnae_summary['taxa_inadimplencia'] = cnae_summary['soma_carteira_inadimplida_arrastada'] / cnae_summary['soma_carteira_ativa'] * 100
-    
-    insights += "### Setores com Maior Volume de Inadimplência:\n"
-    for _, row in cnae_summary.sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(5).iterrows():
-        insights += f"- **{row['cnae_secao']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
-        insights += f"({row['percentual_total']:.2f}% do total, Taxa: {row['taxa_inadimplencia']:.2f}%)\n"
-    
-    insights += "\n### Setores com Maior Taxa de Inadimplência:\n"
-    for _, row in cnae_summary[cnae_summary['soma_carteira_ativa'] > 1000000].sort_values('taxa_inadimplencia', ascending=False).head(5).iterrows():
-        insights += f"- **{row['cnae_secao']}**: {row['taxa_inadimplencia']:.2f}% "
-        insights += f"(R$ {row['soma_carteira_inadimplida_arrastada']:,.2f})\n"
-    
-    # 5. COMPARATIVO PESSOA FÍSICA VS PESSOA JURÍDICA (DEZ/2024)
-    insights += "\n## 5. COMPARATIVO PESSOA FÍSICA VS PESSOA JURÍDICA (DEZ/2024)\n\n"
-    
-    client_type_summary = df.groupby('tipo_cliente').agg({
-        'soma_carteira_inadimplida_arrastada': 'sum',
-        'soma_carteira_ativa': 'sum',
-        'soma_numero_de_operacoes': 'sum',
-        'soma_ativo_problematico': 'sum',
-        'soma_a_vencer_ate_90_dias': 'sum',
-        'projecao_inadimplencia_90d': 'sum'
-    }).reset_index()
-    
-    client_type_summary['taxa_inadimplencia'] = (client_type_summary['soma_carteira_inadimplida_arrastada'] / client_type_summary['soma_carteira_ativa'] * 100).fillna(0)
-    client_type_summary['media_por_operacao'] = (client_type_summary['soma_carteira_inadimplida_arrastada'] / client_type_summary['soma_numero_de_operacoes']).fillna(0)
-    client_type_summary['percentual_inadimplencia'] = (client_type_summary['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100).fillna(0)
-    client_type_summary['risco_90d_percentual'] = (client_type_summary['projecao_inadimplencia_90d'] / client_type_summary['soma_a_vencer_ate_90_dias'] * 100).fillna(0)
-    
-    insights += "### Visão Geral PF vs PJ:\n"
-    for _, row in client_type_summary.iterrows():
-        insights += f"#### {row['tipo_cliente']}:\n"
-        insights += f"- **Inadimplência Total**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} ({row['percentual_inadimplencia']:.2f}% do total)\n"
-        insights += f"- **Taxa de Inadimplência**: {row['taxa_inadimplencia']:.2f}%\n"
-        insights += f"- **Ativos Problemáticos**: R$ {row['soma_ativo_problematico']:,.2f}\n"
-        insights += f"- **Número de Operações**: {row['soma_numero_de_operacoes']:,.0f}\n"
-        insights += f"- **Média por Operação**: R$ {row['media_por_operacao']:,.2f}\n"
-        insights += f"- **Projeção Inadimplência 90 Dias**: R$ {row['projecao_inadimplencia_90d']:,.2f} (Risco: {row['risco_90d_percentual']:.2f}%)\n\n"
-    
+    insights.append(f"\n## 4. SETORES ECONÔMICOS E INADIMPLÊNCIA ({labels['short']})\n\n")
+    insights.append("### Setores com Maior Volume de Inadimplência:\n")
+    insights += _format_rows(
+        _top(cnae_summary, INAD, 5),
+        "- **{cnae_secao}**: R$ {soma_carteira_inadimplida_arrastada:,.2f} "
+        "({percentual_total:.2f}% do total, Taxa: {taxa_inadimplencia:.2f}%)\n"
+    )
+    insights.append("\n### Setores com Maior Taxa de Inadimplência:\n")
+    insights += _format_rows(
+        _top(cnae_summary[cnae_summary[ATIVA] > 1000000], 'taxa_inadimplencia', 5),
+        "- **{cnae_secao}**: {taxa_inadimplencia:.2f}% (R$ {soma_carteira_inadimplida_arrastada:,.2f})\n"
+    )
+
+    # 5. COMPARATIVO PESSOA FÍSICA VS PESSOA JURÍDICA
+    insights.append(f"\n## 5. COMPARATIVO PESSOA FÍSICA VS PESSOA JURÍDICA ({labels['short']})\n\n")
+    insights.append("### Visão Geral PF vs PJ:\n")
+    insights += _format_rows(
+        client_type_summary,
+        "#### {tipo_cliente}:\n"
+        "- **Inadimplência Total**: R$ {soma_carteira_inadimplida_arrastada:,.2f} ({percentual_inadimplencia:.2f}% do total)\n"
+        "- **Taxa de Inadimplência**: {taxa_inadimplencia:.2f}%\n"
+        "- **Ativos Problemáticos**: R$ {soma_ativo_problematico:,.2f}\n"
+        "- **Número de Operações**: {soma_numero_de_operacoes:,.0f}\n"
+        "- **Média por Operação**: R$ {media_por_operacao:,.2f}\n"
+        "- **Projeção Inadimplência 90 Dias**: R$ {projecao_inadimplencia_90d:,.2f} (Risco: {risco_90d_percentual:.2f}%)\n\n"
+    )
+
     # 5.1 Distribuição por Porte
-    insights += "### Distribuição por Porte:\n"
-    size_summary = df.groupby(['tipo_cliente', 'porte']).agg({
-        'soma_carteira_inadimplida_arrastada': 'sum',
-        'soma_carteira_ativa': 'sum',
-        'soma_ativo_problematico': 'sum',
-        'soma_numero_de_operacoes': 'sum'
-    }).reset_index()
-    
-    size_summary['taxa_inadimplencia'] = (size_summary['soma_carteira_inadimplida_arrastada'] / size_summary['soma_carteira_ativa'] * 100).fillna(0)
-    size_summary['indice_problematico'] = (size_summary['soma_ativo_problematico'] / size_summary['soma_carteira_ativa'] * 100).fillna(0)
-    
+    insights.append("### Distribuição por Porte:\n")
     for tipo in ['PF', 'PJ']:
-        insights += f"#### {tipo}:\n"
-        for _, row in size_summary[size_summary['tipo_cliente'] == tipo].sort_values('soma_carteira_inadimplida_arrastada', ascending=False).iterrows():
-            insights += f"- **{row['porte']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
-            insights += f"(Taxa: {row['taxa_inadimplencia']:.2f}%, Índice Problemático: {row['indice_problematico']:.2f}%)\n"
-        insights += "\n"
-    
+        insights.append(f"#### {tipo}:\n")
+        insights += _format_rows(
+            _top(segment_summary[segment_summary['tipo_cliente'] == tipo], INAD),
+            "- **{porte}**: R$ {soma_carteira_inadimplida_arrastada:,.2f} "
+            "(Taxa: {taxa_inadimplencia:.2f}%, Índice Problemático: {indice_problematico:.2f}%)\n"
+        )
+        insights.append("\n")
+
     # 5.2 Modalidades de Crédito por Tipo de Cliente
-    insights += "### Modalidades de Crédito com Maior Inadimplência:\n"
-    modality_summary_client = df.groupby(['tipo_cliente', 'modalidade']).agg({
-        'soma_carteira_inadimplida_arrastada': 'sum',
-        'soma_carteira_ativa': 'sum',
-        'soma_numero_de_operacoes': 'sum'
-    }).reset_index()
-    
-    modality_summary_client['taxa_inadimplencia'] = (modality_summary_client['soma_carteira_inadimplida_arrastada'] / modality_summary_client['soma_carteira_ativa'] * 100).fillna(0)
-    modality_summary_client['percentual_inadimplencia'] = (modality_summary_client['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100).fillna(0)
-    
+    insights.append("### Modalidades de Crédito com Maior Inadimplência:\n")
     for tipo in ['PF', 'PJ']:
-        insights += f"#### {tipo}:\n"
-        insights += f"- **Top Modalidades por Volume de Inadimplência**:\n"
-        for _, row in modality_summary_client[modality_summary_client['tipo_cliente'] == tipo].sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(3).iterrows():
-            insights += f"  - **{row['modalidade']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
-            insights += f"({row['percentual_inadimplencia']:.2f}% do total, Taxa: {row['taxa_inadimplencia']:.2f}%)\n"
-        insights += f"- **Top Modalidades por Taxa de Inadimplência**:\n"
-        for _, row in modality_summary_client[(modality_summary_client['tipo_cliente'] == tipo) & (modality_summary_client['soma_carteira_ativa'] > 1000000)].sort_values('taxa_inadimplencia', ascending=False).head(3).iterrows():
-            insights += f"  - **{row['modalidade']}**: {row['taxa_inadimplencia']:.2f}% "
-            insights += f"(R$ {row['soma_carteira_inadimplida_arrastada']:,.2f})\n"
-        insights += "\n"
-    
+        client_modalities = modality_summary_client[modality_summary_client['tipo_cliente'] == tipo]
+        insights.append(f"#### {tipo}:\n")
+        insights.append("- **Top Modalidades por Volume de Inadimplência**:\n")
+        insights += _format_rows(
+            _top(client_modalities, INAD, 3),
+            "  - **{modalidade}**: R$ {soma_carteira_inadimplida_arrastada:,.2f} "
+            "({percentual_inadimplencia:.2f}% do total, Taxa: {taxa_inadimplencia:.2f}%)\n"
+        )
+        insights.append("- **Top Modalidades por Taxa de Inadimplência**:\n")
+        insights += _format_rows(
+            _top(client_modalities[client_modalities[ATIVA] > 1000000], 'taxa_inadimplencia', 3),
+            "  - **{modalidade}**: {taxa_inadimplencia:.2f}% (R$ {soma_carteira_inadimplida_arrastada:,.2f})\n"
+        )
+        insights.append("\n")
+
     # 6. ANÁLISE POR MODALIDADE GERAL
-    insights += "\n## 6. MODALIDADES DE CRÉDITO E INADIMPLÊNCIA (DEZ/2024)\n\n"
-    
-    modality_summary = df.groupby('modalidade').agg({
-        'soma_carteira_inadimplida_arrastada': 'sum',
-        'soma_carteira_ativa': 'sum',
-        'soma_numero_de_operacoes': 'sum'
-    }).reset_index()
-    
-    modality_summary['taxa_inadimplencia'] = modality_summary['soma_carteira_inadimplida_arrastada'] / modality_summary['soma_carteira_ativa'] * 100
-    modality_summary['percentual_total'] = modality_summary['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100
-    
-    insights += "### Top Modalidades por Volume de Inadimplência:\n"
-    for _, row in modality_summary.sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(6).iterrows():
-        insights += f"- **{row['modalidade']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
-        insights += f"({row['percentual_total']:.2f}% do total, Taxa: {row['taxa_inadimplencia']:.2f}%)\n"
-    
-    insights += "\n### Top Modalidades por Taxa de Inadimplência:\n"
-    for _, row in modality_summary[modality_summary['soma_carteira_ativa'] > 1000000].sort_values('taxa_inadimplencia', ascending=False).head(5).iterrows():
-        insights += f"- **{row['modalidade']}**: {row['taxa_inadimplencia']:.2f}% "
-        insights += f"(R$ {row['soma_carteira_inadimplida_arrastada']:,.2f})\n"
-    
+    insights.append(f"\n## 6. MODALIDADES DE CRÉDITO E INADIMPLÊNCIA ({labels['short']})\n\n")
+    insights.append("### Top Modalidades por Volume de Inadimplência:\n")
+    insights += _format_rows(
+        _top(modality_summary, INAD, 6),
+        "- **{modalidade}**: R$ {soma_carteira_inadimplida_arrastada:,.2f} "
+        "({percentual_total:.2f}% do total, Taxa: {taxa_inadimplencia:.2f}%)\n"
+    )
+    insights.append("\n### Top Modalidades por Taxa de Inadimplência:\n")
+    insights += _format_rows(
+        _top(modality_summary[modality_summary[ATIVA] > 1000000], 'taxa_inadimplencia', 5),
+        "- **{modalidade}**: {taxa_inadimplencia:.2f}% (R$ {soma_carteira_inadimplida_arrastada:,.2f})\n"
+    )
+
     # 7. ANÁLISE POR OCUPAÇÃO (PF)
-    insights += "\n## 7. INADIMPLÊNCIA POR OCUPAÇÃO - PESSOA FÍSICA (DEZ/2024)\n\n"
-    
-    occupation_summary = df[df['tipo_cliente'] == 'PF'].groupby('ocupacao').agg({
-        'soma_carteira_inadimplida_arrastada': 'sum',
-        'soma_carteira_ativa': 'sum',
-        'soma_numero_de_operacoes': 'sum'
-    }).reset_index()
-    
-    occupation_summary['taxa_inadimplencia'] = occupation_summary['soma_carteira_inadimplida_arrastada'] / occupation_summary['soma_carteira_ativa'] * 100
-    occupation_summary['media_por_operacao'] = occupation_summary['soma_carteira_inadimplida_arrastada'] / occupation_summary['soma_numero_de_operacoes']
-    
-    insights += "### Ocupações com Maior Volume de Inadimplência:\n"
-    for _, row in occupation_summary.sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(5).iterrows():
-        insights += f"- **{row['ocupacao']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
-        insights += f"(Taxa: {row['taxa_inadimplencia']:.2f}%, Média: R$ {row['media_por_operacao']:,.2f})\n"
-    
-    insights += "\n### Ocupações com Maior Taxa de Inadimplência:\n"
-    valid_occupations = occupation_summary[occupation_summary['soma_carteira_ativa'] > 500000]
-    for _, row in valid_occupations.sort_values('taxa_inadimplencia', ascending=False).head(5).iterrows():
-        insights += f"- **{row['ocupacao']}**: {row['taxa_inadimplencia']:.2f}% "
-        insights += f"(Volume: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f})\n"
-    
+    insights.append(f"\n## 7. INADIMPLÊNCIA POR OCUPAÇÃO - PESSOA FÍSICA ({labels['short']})\n\n")
+    insights.append("### Ocupações com Maior Volume de Inadimplência:\n")
+    insights += _format_rows(
+        _top(occupation_summary, INAD, 5),
+        "- **{ocupacao}**: R$ {soma_carteira_inadimplida_arrastada:,.2f} "
+        "(Taxa: {taxa_inadimplencia:.2f}%, Média: R$ {media_por_operacao:,.2f})\n"
+    )
+    insights.append("\n### Ocupações com Maior Taxa de Inadimplência:\n")
+    insights += _format_rows(
+        _top(occupation_summary[occupation_summary[ATIVA] > 500000], 'taxa_inadimplencia', 5),
+        "- **{ocupacao}**: {taxa_inadimplencia:.2f}% (Volume: R$ {soma_carteira_inadimplida_arrastada:,.2f})\n"
+    )
+
     # 8. PROJEÇÕES E RISCO FUTURO
-    insights += "\n## 8. PROJEÇÃO DE INADIMPLÊNCIA EM 90 DIAS (DEZ/2024)\n\n"
-    
-    projection_summary = df.groupby(['tipo_cliente', 'porte']).agg({
-        'projecao_inadimplencia_90d': 'sum',
-        'soma_a_vencer_ate_90_dias': 'sum',
-        'soma_carteira_inadimplida_arrastada': 'sum'
-    }).reset_index()
-    
-    projection_summary['risco_percentual'] = projection_summary['projecao_inadimplencia_90d'] / projection_summary['soma_a_vencer_ate_90_dias'] * 100
-    projection_summary['aumento_previsto'] = projection_summary['projecao_inadimplencia_90d'] / projection_summary['soma_carteira_inadimplida_arrastada'] * 100
-    
-    insights += "### Projeção por Tipo e Porte de Cliente:\n"
-    for _, row in projection_summary.sort_values('projecao_inadimplencia_90d', ascending=False).head(8).iterrows():
-        insights += f"- **{row['tipo_cliente']} - {row['porte']}**: R$ {row['projecao_inadimplencia_90d']:,.2f} "
-        insights += f"(Risco: {row['risco_percentual']:.2f}%, Aumento Previsto: {row['aumento_previsto']:.2f}%)\n"
-    
+    insights.append(f"\n## 8. PROJEÇÃO DE INADIMPLÊNCIA EM 90 DIAS ({labels['short']})\n\n")
+    insights.append("### Projeção por Tipo e Porte de Cliente:\n")
+    insights += _format_rows(
+        _top(segment_summary, PROJECAO_90, 8),
+        "- **{tipo_cliente} - {porte}**: R$ {projecao_inadimplencia_90d:,.2f} "
+        "(Risco: {risco_percentual:.2f}%, Aumento Previsto: {aumento_previsto:.2f}%)\n"
+    )
+
     # 9. REESTRUTURAÇÃO DE DÍVIDAS
-    insights += "\n## 9. ANÁLISE DE REESTRUTURAÇÃO DE DÍVIDAS (DEZ/2024)\n\n"
-    
-    restructuring_summary = df.groupby(['tipo_cliente', 'porte']).agg({
-        'indicador_reestruturacao': 'sum',
-        'soma_ativo_problematico': 'sum',
-        'soma_carteira_inadimplida_arrastada': 'sum'
-    }).reset_index()
-    
-    restructuring_summary['percentual_reestruturacao'] = restructuring_summary['indicador_reestruturacao'] / restructuring_summary['soma_ativo_problematico'] * 100
-    
-    insights += "### Indicadores de Reestruturação por Segmento:\n"
-    for _, row in restructuring_summary.sort_values('indicador_reestruturacao', ascending=False).head(6).iterrows():
-        if row['soma_ativo_problematico'] > 0:
-            insights += f"- **{row['tipo_cliente']} - {row['porte']}**: R$ {row['indicador_reestruturacao']:,.2f} "
-            insights += f"({row['percentual_reestruturacao']:.2f}% dos ativos problemáticos)\n"
-    
+    insights.append(f"\n## 9. ANÁLISE DE REESTRUTURAÇÃO DE DÍVIDAS ({labels['short']})\n\n")
+    insights.append("### Indicadores de Reestruturação por Segmento:\n")
+    top_restructuring = _top(segment_summary, REESTRUTURACAO, 6)
+    insights += _format_rows(
+        top_restructuring[top_restructuring[PROBLEMATICO] > 0],
+        "- **{tipo_cliente} - {porte}**: R$ {indicador_reestruturacao:,.2f} "
+        "({percentual_reestruturacao:.2f}% dos ativos problemáticos)\n"
+    )
+
     # 10. RECOMENDAÇÕES ESTRATÉGICAS
-    insights += "\n## 10. RECOMENDAÇÕES ESTRATÉGICAS (DEZ/2024)\n\n"
-    
-    insights += "### Ações Recomendadas por Segmento de Risco:\n"
-    
-    top_cnae_risk = cnae_summary.sort_values('taxa_inadimplencia', ascending=False).head(3)
-    insights += "#### Setores Econômicos de Alto Risco:\n"
-    for _, row in top_cnae_risk.iterrows():
-        insights += f"- **{row['cnae_secao']}**: Implementar monitoramento especial e revisar políticas de crédito\n"
-    
-    top_region_risk = region_summary.sort_values('taxa_inadimplencia', ascending=False).head(2)
-    insights += "\n#### Regiões Críticas:\n"
-    for _, row in top_region_risk.iterrows():
-        insights += f"- **{row['regiao']}**: Considerar condições macroeconômicas regionais e ajustar estratégias de cobrança\n"
-    
-    top_modality_risk = modality_summary.sort_values('taxa_inadimplencia', ascending=False).head(3)
-    insights += "\n#### Modalidades de Alto Risco:\n"
-    for _, row in top_modality_risk.iterrows():
-        insights += f"- **{row['modalidade']}**: Revisar critérios de aprovação e limites de crédito\n"
-    
+    insights.append(f"\n## 10. RECOMENDAÇÕES ESTRATÉGICAS ({labels['short']})\n\n")
+    insights.append("### Ações Recomendadas por Segmento de Risco:\n")
+    insights.append("#### Setores Econômicos de Alto Risco:\n")
+    insights += _format_rows(
+        _top(cnae_summary, 'taxa_inadimplencia', 3),
+        "- **{cnae_secao}**: Implementar monitoramento especial e revisar políticas de crédito\n"
+    )
+    insights.append("\n#### Regiões Críticas:\n")
+    insights += _format_rows(
+        _top(region_summary, 'taxa_inadimplencia', 2),
+        "- **{regiao}**: Considerar condições macroeconômicas regionais e ajustar estratégias de cobrança\n"
+    )
+    insights.append("\n#### Modalidades de Alto Risco:\n")
+    insights += _format_rows(
+        modality_by_rate.head(3),
+        "- **{modalidade}**: Revisar critérios de aprovação e limites de crédito\n"
+    )
+
+    # Variações em relação aos períodos de comparação
+    for comparison_period, comparison in (comparisons or {}).items():
+        insights += _format_comparison(aggregates, comparison, period, comparison_period)
+
     # Conclusão
-    insights += "\n## CONCLUSÃO EXECUTIVA (DEZ/2024)\n\n"
-    insights += f"- A taxa global de inadimplência em dezembro de 2024 está em **{taxa_global:.2f}%** da carteira total\n"
-    insights += "- Aproximadamente **{:.2f}%** do volume inadimplido está concentrado na região {}\n".format(
-        region_summary.iloc[0]['percentual_inadimplencia'], 
+    insights.append(f"\n## CONCLUSÃO EXECUTIVA ({labels['short']})\n\n")
+    insights.append(f"- A taxa global de inadimplência em {labels['text']} está em **{taxa_global:.2f}%** da carteira total\n")
+    insights.append("- Aproximadamente **{:.2f}%** do volume inadimplido está concentrado na região {}\n".format(
+        region_summary.iloc[0]['percentual_inadimplencia'],
         region_summary.iloc[0]['regiao']
-    )
-    insights += "- O setor **{}** apresenta a maior concentração de inadimplência ({:.2f}%)\n".format(
+    ))
+    insights.append("- O setor **{}** apresenta a maior concentração de inadimplência ({:.2f}%)\n".format(
         cnae_summary.iloc[0]['cnae_secao'],
         cnae_summary.iloc[0]['percentual_total']
-    )
-    insights += "- A modalidade **{}** apresenta a maior taxa de inadimplência ({:.2f}%)\n".format(
-        modality_summary.sort_values('taxa_inadimplencia', ascending=False).iloc[0]['modalidade'],
-        modality_summary.sort_values('taxa_inadimplencia', ascending=False).iloc[0]['taxa_inadimplencia']
-    )
-    insights += "- Projeção de inadimplência para os próximos 90 dias indica potencial aumento de até **{:.2f}%**\n".format(
-        projection_summary['aumento_previsto'].mean()
-    )
+    ))
+    insights.append("- A modalidade **{}** apresenta a maior taxa de inadimplência ({:.2f}%)\n".format(
+        modality_by_rate.iloc[0]['modalidade'],
+        modality_by_rate.iloc[0]['taxa_inadimplencia']
+    ))
+    insights.append("- Projeção de inadimplência para os próximos 90 dias indica potencial aumento de até **{:.2f}%**\n".format(
+        segment_summary['aumento_previsto'].mean()
+    ))
+
+    insights.append("\n### Próximos Passos Recomendados:\n")
+    insights.append("1. Revisar políticas de crédito para os setores e modalidades de maior risco\n")
+    insights.append("2. Monitorar de perto as regiões com altas taxas de inadimplência\n")
+    insights.append("3. Avaliar estratégias de reestruturação para os segmentos com ativos problemáticos elevados\n")
+    insights.append("4. Implementar alertas precoces baseados nas projeções de 90 dias\n")
+
+    return "".join(insights)
+
+
+def _change(current, previous, money=True):
+    delta = current - previous
+    value = f"R$ {delta:+,.2f}" if money else f"{delta:+,.0f}"
+    if not previous:
+        return value
+    return f"{value}, {delta / previous * 100:+.2f}%"
+
 
-    insights += "\n### Próximos Passos Recomendados:\n"
-    insights += "1. Revisar políticas de crédito para os setores e modalidades de maior risco\n"
-    insights += "2. Monitorar de perto as regiões com altas taxas de inadimplência\n"
-    insights += "3. Avaliar estratégias de reestruturação para os segmentos com ativos problemáticos elevados\n"
-    insights += "4. Implementar alertas precoces baseados nas projeções de 90 dias\n"
-    
-    return insights
\ No newline at end of file
+def _comparison_kind(period, comparison_period):
+    year, month = parse_period(period)
+    other_year, other_month = parse_period(comparison_period)
+    distance = (year - other_year) * 12 + month - other_month
+    return {1: "MÊS ANTERIOR", 12: "MESMO MÊS DO ANO ANTERIOR"}.get(distance, "PERÍODO DE COMPARAÇÃO")
+
+
+def _volumes_and_rates(frame, key):
+    frame = frame.set_index(key)
+    return frame[INAD], (frame[INAD] / frame[ATIVA] * 100).fillna(0)
+
+
+def _format_comparison(aggregates, comparison, period, comparison_period):
+    """
+    Seção com as variações dos totais, das regiões e dos tipos de cliente entre o período
+    de referência e um período de comparação
+    """
+    labels = period_labels(comparison_period)
+    lines = [f"\n## VARIAÇÃO EM RELAÇÃO A {labels['short']} ({_comparison_kind(period, comparison_period)})\n\n"]
+    if comparison is None:
+        lines.append(f"- Não há dados de {labels['text']} para comparação.\n")
+        return lines
+
+    totals, previous = aggregates['totals'], comparison['totals']
+    rate = (totals[INAD] / totals[ATIVA] * 100) if totals[ATIVA] > 0 else 0
+    previous_rate = (previous[INAD] / previous[ATIVA] * 100) if previous[ATIVA] > 0 else 0
+    lines.append(f"- **Carteira Total**: R$ {totals[ATIVA]:,.2f} ({_change(totals[ATIVA], previous[ATIVA])})\n")
+    lines.append(f"- **Total Inadimplido**: R$ {totals[INAD]:,.2f} ({_change(totals[INAD], previous[INAD])})\n")
+    lines.append(f"- **Taxa Global de Inadimplência**: {rate:.2f}% ({rate - previous_rate:+.2f} p.p.)\n")
+    lines.append(f"- **Ativos Problemáticos**: R$ {totals[PROBLEMATICO]:,.2f} "
+                 f"({_change(totals[PROBLEMATICO], previous[PROBLEMATICO])})\n")
+    lines.append(f"- **Total de Operações**: {totals[OPERACOES]:,.0f} "
+                 f"({_change(totals[OPERACOES], previous[OPERACOES], money=False)})\n")
+
+    for title, name, key in [("Região", 'regiao', 'regiao'), ("Tipo de Cliente", 'cliente', 'tipo_cliente')]:
+        lines.append(f"\n### Variação por {title}:\n")
+        volume, rates = _volumes_and_rates(aggregates['groups'][name], key)
+        previous_volume, previous_rates = _volumes_and_rates(comparison['groups'][name], key)
+        for value in volume.sort_values(ascending=False).index:
+            lines.append(
+                f"- **{value}**: R$ {volume[value]:,.2f} ({_change(volume[value], previous_volume.get(value, 0))}), "
+                f"Taxa: {rates[value]:.2f}% ({rates[value] - previous_rates.get(value, 0):+.2f} p.p.)\n"
+            )
+    return lines
+
+
+def generate_advanced_insights(df, period=DEFAULT_PERIOD, comparison_periods=()):
+    """
+    Gera insights detalhados sobre inadimplência a partir de dados consolidados de um mês
+
+    Params:
+        df: DataFrame com dados consolidados de inadimplência
+        period: Mês de referência no formato 'AAAA-MM' (padrão: dezembro de 2024)
+        comparison_periods: Meses de comparação, ex.: [shift_period(period, -1), shift_period(period, -12)]
+
+    Returns:
+        String com insights formatados
+    """
+    comparisons = {
+        comparison_period: compute_insight_aggregates(df, comparison_period)
+        for comparison_period in comparison_periods
+    }
+    return format_advanced_insights(compute_insight_aggregates(df, period), period, comparisons)
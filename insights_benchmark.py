@@ -0,0 +1,421 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from insights import generate_advanced_insights
+from regions import UF_TO_REGION
+
+PORTES = ['PF - Até 1 salário mínimo', 'PF - Mais de 20 salários mínimos', 'PJ - Micro', 'PJ - Pequeno',
+          'PJ - Médio', 'PJ - Grande', 'Indisponível']
+MODALIDADES = ['PF - Cartão de crédito', 'PF - Empréstimo com consignação em folha', 'PF - Habitacional',
+               'PF - Veículos', 'PJ - Capital de giro', 'PJ - Comércio exterior', 'PJ - Financiamento de infraestrutura/desenvolvimento/projeto e outros créditos',
+               'PJ - Operações com recebíveis', 'PJ - Outros créditos', 'PF - Rural e agroindustrial']
+OCUPACOES = ['PF - Aposentado/pensionista', 'PF - Autônomo', 'PF - Empregado de empresa privada',
+             'PF - Empresário', 'PF - Servidor ou empregado público', 'PF - Outros', '-']
+CNAE_SECOES = ['PJ - Agricultura, pecuária, produção florestal, pesca e aqüicultura', 'PJ - Comércio',
+               'PJ - Construção', 'PJ - Indústrias de transformação', 'PJ - Serviços industriais de utilidade pública',
+               'PJ - Transporte, armazenagem e correio', 'PJ - Administração pública, defesa e seguridade social', '-']
+DATAS = ['31/12/2024', '30/11/2024', '31/10/2024', '31/12/2023', 'data inválida']
+
+
+def make_synthetic_data(rows, seed=0):
+    """
+    Gera um DataFrame com o formato de table_agg_inad_consolidado para benchmarks.
+    Inclui meses fora de dezembro de 2024, datas inválidas, UFs desconhecidas, clientes com
+    espaços e caixa variados e carteiras zeradas.
+    """
+    rng = np.random.default_rng(seed)
+
+    def choice(values, p=None):
+        return np.array(values, dtype=object)[rng.choice(len(values), size=rows, p=p)]
+
+    carteira = np.round(rng.lognormal(12, 2.5, rows), 2)
+    carteira[rng.random(rows) < 0.02] = 0.0
+    return pd.DataFrame({
+        'data_base': choice(DATAS, p=[0.8, 0.08, 0.06, 0.05, 0.01]),
+        'uf': choice(list(UF_TO_REGION) + ['XX']),
+        'cliente': choice(['PF', 'PJ', ' pf ', 'Pj']),
+        'ocupacao': choice(OCUPACOES),
+        'cnae_secao': choice(CNAE_SECOES),
+        'porte': choice(PORTES),
+        'modalidade': choice(MODALIDADES),
+        'soma_a_vencer_ate_90_dias': np.round(carteira * rng.random(rows) * 0.3, 2),
+        'soma_numero_de_operacoes': rng.integers(1, 50_000, rows),
+        'soma_carteira_ativa': carteira,
+        'soma_carteira_inadimplida_arrastada': np.round(carteira * rng.random(rows) * 0.1, 2),
+        'soma_ativo_problematico': np.round(carteira * rng.random(rows) * 0.15, 2),
+    })
+
+
+def make_synthetic_projection(rows, seed=0):
+    """
+    Gera um DataFrame com o formato de projecao_consolidado para benchmarks: 36 meses de
+    projeção em 'DD/MM/AAAA', dados reais e de previsão e algumas datas inválidas.
+    """
+    rng = np.random.default_rng(seed)
+
+    def choice(values, p=None):
+        return np.array(values, dtype=object)[rng.choice(len(values), size=rows, p=p)]
+
+    meses = list(pd.date_range('2025-01-01', periods=36, freq='MS').strftime('%d/%m/%Y'))
+    return pd.DataFrame({
+        'ano_mes': choice(meses + ['data inválida'], p=[0.99 / 36] * 36 + [0.01]),
+        'uf': choice(list(UF_TO_REGION)),
+        'cliente': choice(['PF', 'PJ']),
+        'porte': choice(PORTES),
+        'modalidade': choice(MODALIDADES),
+        'tipo': choice(['PREVISAO', 'REAL'], p=[0.7, 0.3]),
+        'soma_ativo_problematico': np.round(rng.lognormal(10, 2, rows), 2),
+        'soma_carteira_inadimplida_arrastada': np.round(rng.lognormal(10, 2, rows), 2),
+    })
+
+
+def legacy_generate_advanced_insights(df):
+    """
+    Implementação anterior de generate_advanced_insights, mantida como referência de saída
+    e de tempo para o benchmark
+    """
+    # Filtrar apenas dados de dezembro de 2024
+    df['data_base'] = pd.to_datetime(df['data_base'], format='%d/%m/%Y', errors='coerce')
+    df = df[(df['data_base'].dt.month == 12) & (df['data_base'].dt.year == 2024)].copy()
+    
+    if df.empty:
+        return "Nenhum dado disponível para dezembro de 2024."
+
+    # Preparar dados - mapear regiões
+    df['regiao'] = df['uf'].map(UF_TO_REGION)
+    
+    # Calcular taxa de inadimplência
+    df['taxa_inadimplencia'] = (df['soma_carteira_inadimplida_arrastada'] / df['soma_carteira_ativa'] * 100).fillna(0)
+    
+    # Calcular índice de ativo problemático
+    df['indice_ativo_problematico'] = (df['soma_ativo_problematico'] / df['soma_carteira_ativa'] * 100).fillna(0)
+    
+    # Calcular projeção de inadimplência em 90 dias
+    df['projecao_inadimplencia_90d'] = np.where(
+        df['soma_carteira_ativa'] > 0,
+        df['soma_a_vencer_ate_90_dias'] * (df['soma_carteira_inadimplida_arrastada'] / df['soma_carteira_ativa']),
+        0
+    )
+    
+    # Calcular indicador de reestruturação
+    df['indicador_reestruturacao'] = df['soma_ativo_problematico'] - df['soma_carteira_inadimplida_arrastada']
+    
+    # Determinar tipo de cliente com base na coluna 'cliente'
+    df['tipo_cliente'] = df['cliente'].apply(lambda x: 'PF' if x.strip().upper() == 'PF' else 'PJ')
+    
+    # Preparar insights detalhados para dezembro de 2024
+    insights = "# ANÁLISE ESTRATÉGICA DE INADIMPLÊNCIA BANCÁRIA - DEZEMBRO 2024\n\n"
+    
+    # 1. VISÃO GERAL
+    insights += "## 1. VISÃO GERAL DO CENÁRIO DE INADIMPLÊNCIA (DEZ/2024)\n\n"
+    
+    total_inadimplencia = df['soma_carteira_inadimplida_arrastada'].sum()
+    total_ativo_problematico = df['soma_ativo_problematico'].sum()
+    total_carteira = df['soma_carteira_ativa'].sum()
+    taxa_global = (total_inadimplencia / total_carteira * 100) if total_carteira > 0 else 0
+    
+    insights += f"- **Carteira Total**: R$ {total_carteira:,.2f}\n"
+    insights += f"- **Total Inadimplido**: R$ {total_inadimplencia:,.2f} ({taxa_global:.2f}% da carteira total)\n"
+    insights += f"- **Ativos Problemáticos**: R$ {total_ativo_problematico:,.2f}\n"
+    insights += f"- **Total de Operações**: {df['soma_numero_de_operacoes'].sum():,.0f}\n"
+    
+    # 2. ANÁLISE REGIONAL
+    insights += "\n## 2. PANORAMA REGIONAL DE INADIMPLÊNCIA (DEZ/2024)\n\n"
+    
+    region_summary = df.groupby('regiao').agg({
+        'soma_carteira_inadimplida_arrastada': 'sum',
+        'soma_carteira_ativa': 'sum',
+        'soma_numero_de_operacoes': 'sum'
+    }).reset_index()
+    
+    region_summary['percentual_inadimplencia'] = region_summary['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100
+    region_summary['taxa_inadimplencia'] = region_summary['soma_carteira_inadimplida_arrastada'] / region_summary['soma_carteira_ativa'] * 100
+    
+    for _, row in region_summary.sort_values('soma_carteira_inadimplida_arrastada', ascending=False).iterrows():
+        insights += f"### {row['regiao']}:\n"
+        insights += f"- **Inadimplência**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
+        insights += f"({row['percentual_inadimplencia']:.2f}% do total inadimplido)\n"
+        insights += f"- **Taxa de Inadimplência**: {row['taxa_inadimplencia']:.2f}%\n"
+        insights += f"- **Número de Operações**: {row['soma_numero_de_operacoes']:,.0f}\n\n"
+    
+    # 3. ANÁLISE POR ESTADO E TIPO DE CLIENTE
+    insights += "\n## 3. ESTADOS COM MAIOR ÍNDICE DE INADIMPLÊNCIA POR TIPO DE CLIENTE (DEZ/2024)\n\n"
+
+    state_client_summary = df.groupby(['uf', 'tipo_cliente']).agg({
+        'soma_carteira_inadimplida_arrastada': 'sum',
+        'soma_carteira_ativa': 'sum'
+    }).reset_index()
+
+    state_client_summary['taxa_inadimplencia'] = (
+        state_client_summary['soma_carteira_inadimplida_arrastada'] / state_client_summary['soma_carteira_ativa'] * 100
+    ).fillna(0)
+
+    insights += "### Top Estados por Tipo de Cliente:\n"
+    for tipo_cliente in ['PF', 'PJ']:
+        insights += f"\n#### {tipo_cliente}:\n"
+        top_states = state_client_summary[state_client_summary['tipo_cliente'] == tipo_cliente] \
+            .sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(5)
+        for _, row in top_states.iterrows():
+            insights += f"- **{row['uf']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
+            insights += f"(Taxa: {row['taxa_inadimplencia']:.2f}%)\n"
+
+    # 4. ANÁLISE SETORIAL (CNAE)
+    insights += "\n## 4. SETORES ECONÔMICOS E INADIMPLÊNCIA (DEZ/2024)\n\n"
+    
+    cnae_summary = df.groupby('cnae_secao').agg({
+        'soma_carteira_inadimplida_arrastada': 'sum',
+        'soma_carteira_ativa': 'sum',
+        'soma_numero_de_operacoes': 'sum'
+    }).reset_index()
+    
+    cnae_summary['percentual_total'] = cnae_summary['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100
+    cnae_summary['taxa_inadimplencia'] = cnae_summary['soma_carteira_inadimplida_arrastada'] / cnae_summary['soma_carteira_ativa'] * 100
+    
+    insights += "### Setores com Maior Volume de Inadimplência:\n"
+    for _, row in cnae_summary.sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(5).iterrows():
+        insights += f"- **{row['cnae_secao']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
+        insights += f"({row['percentual_total']:.2f}% do total, Taxa: {row['taxa_inadimplencia']:.2f}%)\n"
+    
+    insights += "\n### Setores com Maior Taxa de Inadimplência:\n"
+    for _, row in cnae_summary[cnae_summary['soma_carteira_ativa'] > 1000000].sort_values('taxa_inadimplencia', ascending=False).head(5).iterrows():
+        insights += f"- **{row['cnae_secao']}**: {row['taxa_inadimplencia']:.2f}% "
+        insights += f"(R$ {row['soma_carteira_inadimplida_arrastada']:,.2f})\n"
+    
+    # 5. COMPARATIVO PESSOA FÍSICA VS PESSOA JURÍDICA (DEZ/2024)
+    insights += "\n## 5. COMPARATIVO PESSOA FÍSICA VS PESSOA JURÍDICA (DEZ/2024)\n\n"
+    
+    client_type_summary = df.groupby('tipo_cliente').agg({
+        'soma_carteira_inadimplida_arrastada': 'sum',
+        'soma_carteira_ativa': 'sum',
+        'soma_numero_de_operacoes': 'sum',
+        'soma_ativo_problematico': 'sum',
+        'soma_a_vencer_ate_90_dias': 'sum',
+        'projecao_inadimplencia_90d': 'sum'
+    }).reset_index()
+    
+    client_type_summary['taxa_inadimplencia'] = (client_type_summary['soma_carteira_inadimplida_arrastada'] / client_type_summary['soma_carteira_ativa'] * 100).fillna(0)
+    client_type_summary['media_por_operacao'] = (client_type_summary['soma_carteira_inadimplida_arrastada'] / client_type_summary['soma_numero_de_operacoes']).fillna(0)
+    client_type_summary['percentual_inadimplencia'] = (client_type_summary['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100).fillna(0)
+    client_type_summary['risco_90d_percentual'] = (client_type_summary['projecao_inadimplencia_90d'] / client_type_summary['soma_a_vencer_ate_90_dias'] * 100).fillna(0)
+    
+    insights += "### Visão Geral PF vs PJ:\n"
+    for _, row in client_type_summary.iterrows():
+        insights += f"#### {row['tipo_cliente']}:\n"
+        insights += f"- **Inadimplência Total**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} ({row['percentual_inadimplencia']:.2f}% do total)\n"
+        insights += f"- **Taxa de Inadimplência**: {row['taxa_inadimplencia']:.2f}%\n"
+        insights += f"- **Ativos Problemáticos**: R$ {row['soma_ativo_problematico']:,.2f}\n"
+        insights += f"- **Número de Operações**: {row['soma_numero_de_operacoes']:,.0f}\n"
+        insights += f"- **Média por Operação**: R$ {row['media_por_operacao']:,.2f}\n"
+        insights += f"- **Projeção Inadimplência 90 Dias**: R$ {row['projecao_inadimplencia_90d']:,.2f} (Risco: {row['risco_90d_percentual']:.2f}%)\n\n"
+    
+    # 5.1 Distribuição por Porte
+    insights += "### Distribuição por Porte:\n"
+    size_summary = df.groupby(['tipo_cliente', 'porte']).agg({
+        'soma_carteira_inadimplida_arrastada': 'sum',
+        'soma_carteira_ativa': 'sum',
+        'soma_ativo_problematico': 'sum',
+        'soma_numero_de_operacoes': 'sum'
+    }).reset_index()
+    
+    size_summary['taxa_inadimplencia'] = (size_summary['soma_carteira_inadimplida_arrastada'] / size_summary['soma_carteira_ativa'] * 100).fillna(0)
+    size_summary['indice_problematico'] = (size_summary['soma_ativo_problematico'] / size_summary['soma_carteira_ativa'] * 100).fillna(0)
+    
+    for tipo in ['PF', 'PJ']:
+        insights += f"#### {tipo}:\n"
+        for _, row in size_summary[size_summary['tipo_cliente'] == tipo].sort_values('soma_carteira_inadimplida_arrastada', ascending=False).iterrows():
+            insights += f"- **{row['porte']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
+            insights += f"(Taxa: {row['taxa_inadimplencia']:.2f}%, Índice Problemático: {row['indice_problematico']:.2f}%)\n"
+        insights += "\n"
+    
+    # 5.2 Modalidades de Crédito por Tipo de Cliente
+    insights += "### Modalidades de Crédito com Maior Inadimplência:\n"
+    modality_summary_client = df.groupby(['tipo_cliente', 'modalidade']).agg({
+        'soma_carteira_inadimplida_arrastada': 'sum',
+        'soma_carteira_ativa': 'sum',
+        'soma_numero_de_operacoes': 'sum'
+    }).reset_index()
+    
+    modality_summary_client['taxa_inadimplencia'] = (modality_summary_client['soma_carteira_inadimplida_arrastada'] / modality_summary_client['soma_carteira_ativa'] * 100).fillna(0)
+    modality_summary_client['percentual_inadimplencia'] = (modality_summary_client['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100).fillna(0)
+    
+    for tipo in ['PF', 'PJ']:
+        insights += f"#### {tipo}:\n"
+        insights += f"- **Top Modalidades por Volume de Inadimplência**:\n"
+        for _, row in modality_summary_client[modality_summary_client['tipo_cliente'] == tipo].sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(3).iterrows():
+            insights += f"  - **{row['modalidade']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
+            insights += f"({row['percentual_inadimplencia']:.2f}% do total, Taxa: {row['taxa_inadimplencia']:.2f}%)\n"
+        insights += f"- **Top Modalidades por Taxa de Inadimplência**:\n"
+        for _, row in modality_summary_client[(modality_summary_client['tipo_cliente'] == tipo) & (modality_summary_client['soma_carteira_ativa'] > 1000000)].sort_values('taxa_inadimplencia', ascending=False).head(3).iterrows():
+            insights += f"  - **{row['modalidade']}**: {row['taxa_inadimplencia']:.2f}% "
+            insights += f"(R$ {row['soma_carteira_inadimplida_arrastada']:,.2f})\n"
+        insights += "\n"
+    
+    # 6. ANÁLISE POR MODALIDADE GERAL
+    insights += "\n## 6. MODALIDADES DE CRÉDITO E INADIMPLÊNCIA (DEZ/2024)\n\n"
+    
+    modality_summary = df.groupby('modalidade').agg({
+        'soma_carteira_inadimplida_arrastada': 'sum',
+        'soma_carteira_ativa': 'sum',
+        'soma_numero_de_operacoes': 'sum'
+    }).reset_index()
+    
+    modality_summary['taxa_inadimplencia'] = modality_summary['soma_carteira_inadimplida_arrastada'] / modality_summary['soma_carteira_ativa'] * 100
+    modality_summary['percentual_total'] = modality_summary['soma_carteira_inadimplida_arrastada'] / total_inadimplencia * 100
+    
+    insights += "### Top Modalidades por Volume de Inadimplência:\n"
+    for _, row in modality_summary.sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(6).iterrows():
+        insights += f"- **{row['modalidade']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
+        insights += f"({row['percentual_total']:.2f}% do total, Taxa: {row['taxa_inadimplencia']:.2f}%)\n"
+    
+    insights += "\n### Top Modalidades por Taxa de Inadimplência:\n"
+    for _, row in modality_summary[modality_summary['soma_carteira_ativa'] > 1000000].sort_values('taxa_inadimplencia', ascending=False).head(5).iterrows():
+        insights += f"- **{row['modalidade']}**: {row['taxa_inadimplencia']:.2f}% "
+        insights += f"(R$ {row['soma_carteira_inadimplida_arrastada']:,.2f})\n"
+    
+    # 7. ANÁLISE POR OCUPAÇÃO (PF)
+    insights += "\n## 7. INADIMPLÊNCIA POR OCUPAÇÃO - PESSOA FÍSICA (DEZ/2024)\n\n"
+    
+    occupation_summary = df[df['tipo_cliente'] == 'PF'].groupby('ocupacao').agg({
+        'soma_carteira_inadimplida_arrastada': 'sum',
+        'soma_carteira_ativa': 'sum',
+        'soma_numero_de_operacoes': 'sum'
+    }).reset_index()
+    
+    occupation_summary['taxa_inadimplencia'] = occupation_summary['soma_carteira_inadimplida_arrastada'] / occupation_summary['soma_carteira_ativa'] * 100
+    occupation_summary['media_por_operacao'] = occupation_summary['soma_carteira_inadimplida_arrastada'] / occupation_summary['soma_numero_de_operacoes']
+    
+    insights += "### Ocupações com Maior Volume de Inadimplência:\n"
+    for _, row in occupation_summary.sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(5).iterrows():
+        insights += f"- **{row['ocupacao']}**: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f} "
+        insights += f"(Taxa: {row['taxa_inadimplencia']:.2f}%, Média: R$ {row['media_por_operacao']:,.2f})\n"
+    
+    insights += "\n### Ocupações com Maior Taxa de Inadimplência:\n"
+    valid_occupations = occupation_summary[occupation_summary['soma_carteira_ativa'] > 500000]
+    for _, row in valid_occupations.sort_values('taxa_inadimplencia', ascending=False).head(5).iterrows():
+        insights += f"- **{row['ocupacao']}**: {row['taxa_inadimplencia']:.2f}% "
+        insights += f"(Volume: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f})\n"
+    
+    # 8. PROJEÇÕES E RISCO FUTURO
+    insights += "\n## 8. PROJEÇÃO DE INADIMPLÊNCIA EM 90 DIAS (DEZ/2024)\n\n"
+    
+    projection_summary = df.groupby(['tipo_cliente', 'porte']).agg({
+        'projecao_inadimplencia_90d': 'sum',
+        'soma_a_vencer_ate_90_dias': 'sum',
+        'soma_carteira_inadimplida_arrastada': 'sum'
+    }).reset_index()
+    
+    projection_summary['risco_percentual'] = projection_summary['projecao_inadimplencia_90d'] / projection_summary['soma_a_vencer_ate_90_dias'] * 100
+    projection_summary['aumento_previsto'] = projection_summary['projecao_inadimplencia_90d'] / projection_summary['soma_carteira_inadimplida_arrastada'] * 100
+    
+    insights += "### Projeção por Tipo e Porte de Cliente:\n"
+    for _, row in projection_summary.sort_values('projecao_inadimplencia_90d', ascending=False).head(8).iterrows():
+        insights += f"- **{row['tipo_cliente']} - {row['porte']}**: R$ {row['projecao_inadimplencia_90d']:,.2f} "
+        insights += f"(Risco: {row['risco_percentual']:.2f}%, Aumento Previsto: {row['aumento_previsto']:.2f}%)\n"
+    
+    # 9. REESTRUTURAÇÃO DE DÍVIDAS
+    insights += "\n## 9. ANÁLISE DE REESTRUTURAÇÃO DE DÍVIDAS (DEZ/2024)\n\n"
+    
+    restructuring_summary = df.groupby(['tipo_cliente', 'porte']).agg({
+        'indicador_reestruturacao': 'sum',
+        'soma_ativo_problematico': 'sum',
+        'soma_carteira_inadimplida_arrastada': 'sum'
+    }).reset_index()
+    
+    restructuring_summary['percentual_reestruturacao'] = restructuring_summary['indicador_reestruturacao'] / restructuring_summary['soma_ativo_problematico'] * 100
+    
+    insights += "### Indicadores de Reestruturação por Segmento:\n"
+    for _, row in restructuring_summary.sort_values('indicador_reestruturacao', ascending=False).head(6).iterrows():
+        if row['soma_ativo_problematico'] > 0:
+            insights += f"- **{row['tipo_cliente']} - {row['porte']}**: R$ {row['indicador_reestruturacao']:,.2f} "
+            insights += f"({row['percentual_reestruturacao']:.2f}% dos ativos problemáticos)\n"
+    
+    # 10. RECOMENDAÇÕES ESTRATÉGICAS
+    insights += "\n## 10. RECOMENDAÇÕES ESTRATÉGICAS (DEZ/2024)\n\n"
+    
+    insights += "### Ações Recomendadas por Segmento de Risco:\n"
+    
+    top_cnae_risk = cnae_summary.sort_values('taxa_inadimplencia', ascending=False).head(3)
+    insights += "#### Setores Econômicos de Alto Risco:\n"
+    for _, row in top_cnae_risk.iterrows():
+        insights += f"- **{row['cnae_secao']}**: Implementar monitoramento especial e revisar políticas de crédito\n"
+    
+    top_region_risk = region_summary.sort_values('taxa_inadimplencia', ascending=False).head(2)
+    insights += "\n#### Regiões Críticas:\n"
+    for _, row in top_region_risk.iterrows():
+        insights += f"- **{row['regiao']}**: Considerar condições macroeconômicas regionais e ajustar estratégias de cobrança\n"
+    
+    top_modality_risk = modality_summary.sort_values('taxa_inadimplencia', ascending=False).head(3)
+    insights += "\n#### Modalidades de Alto Risco:\n"
+    for _, row in top_modality_risk.iterrows():
+        insights += f"- **{row['modalidade']}**: Revisar critérios de aprovação e limites de crédito\n"
+    
+    # Conclusão
+    insights += "\n## CONCLUSÃO EXECUTIVA (DEZ/2024)\n\n"
+    insights += f"- A taxa global de inadimplência em dezembro de 2024 está em **{taxa_global:.2f}%** da carteira total\n"
+    insights += "- Aproximadamente **{:.2f}%** do volume inadimplido está concentrado na região {}\n".format(
+        region_summary.iloc[0]['percentual_inadimplencia'], 
+        region_summary.iloc[0]['regiao']
+    )
+    insights += "- O setor **{}** apresenta a maior concentração de inadimplência ({:.2f}%)\n".format(
+        cnae_summary.iloc[0]['cnae_secao'],
+        cnae_summary.iloc[0]['percentual_total']
+    )
+    insights += "- A modalidade **{}** apresenta a maior taxa de inadimplência ({:.2f}%)\n".format(
+        modality_summary.sort_values('taxa_inadimplencia', ascending=False).iloc[0]['modalidade'],
+        modality_summary.sort_values('taxa_inadimplencia', ascending=False).iloc[0]['taxa_inadimplencia']
+    )
+    insights += "- Projeção de inadimplência para os próximos 90 dias indica potencial aumento de até **{:.2f}%**\n".format(
+        projection_summary['aumento_previsto'].mean()
+    )
+
+    insights += "\n### Próximos Passos Recomendados:\n"
+    insights += "1. Revisar políticas de crédito para os setores e modalidades de maior risco\n"
+    insights += "2. Monitorar de perto as regiões com altas taxas de inadimplência\n"
+    insights += "3. Avaliar estratégias de reestruturação para os segmentos com ativos problemáticos elevados\n"
+    insights += "4. Implementar alertas precoces baseados nas projeções de 90 dias\n"
+    
+    return insights
+
+def _timed(function, df):
+    # A implementação anterior converte data_base no próprio DataFrame recebido
+    df = df.copy()
+    start = time.perf_counter()
+    output = function(df)
+    return output, time.perf_counter() - start
+
+
+def benchmark(sizes, seed=0):
+    """
+    Compara o tempo da implementação atual com a anterior e confere se o texto gerado é idêntico
+
+    Returns:
+        Lista de dicionários com os tempos em segundos por tamanho
+    """
+    results = []
+    for rows in sizes:
+        df = make_synthetic_data(rows, seed)
+        current, current_seconds = _timed(generate_advanced_insights, df)
+        legacy, legacy_seconds = _timed(legacy_generate_advanced_insights, df)
+        del df
+        results.append({
+            "rows": rows,
+            "legacy_s": legacy_seconds,
+            "current_s": current_seconds,
+            "identical": current.encode("utf-8") == legacy.encode("utf-8"),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de generate_advanced_insights")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for result in benchmark(args.rows, args.seed):
+        speedup = result["legacy_s"] / result["current_s"] if result["current_s"] else 0
+        print(f"- {result['rows']:,} linhas: anterior {result['legacy_s']:.2f} s, atual {result['current_s']:.2f} s "
+              f"({speedup:.1f}x), saída idêntica: {'sim' if result['identical'] else 'NÃO'}")
@@ -1,27 +1,174 @@
+import threading
+import weakref
+from functools import cached_property
+
 import pandas as pd
 
+from date_columns import DATE_COLUMNS, with_date_columns
+
+MEASURES = ['soma_ativo_problematico', 'soma_carteira_inadimplida_arrastada']
+CUBE_LEVELS = ['cliente', 'uf', 'porte', 'ano_mes']
+DATE_COLUMN = DATE_COLUMNS['projecao_consolidado']['column']
+
+# Cubos já construídos, por id do DataFrame de origem (ver _cube)
+_cubes = {}
+_cubes_lock = threading.Lock()
+
+
+def _chronological(labels, dates):
+    """
+    Converte ano_mes em categórica com as categorias em ordem cronológica: o texto
+    'DD/MM/AAAA' não ordena por data, então os agrupamentos seguem a data tipada
+    """
+    labels = labels.astype('category')
+    first_dates = dates.groupby(labels, observed=True).first()
+    order = pd.DataFrame({'label': first_dates.index.astype(object), 'date': first_dates.to_numpy()})
+    order = order.sort_values(['date', 'label'], na_position='last')['label']
+    return labels.cat.set_categories(list(order))
+
+
+class ProjectionCube:
+    """
+    Somas da tabela de projeção calculadas uma única vez, na primeira consulta que as usa.
+    O cubo principal tem um MultiIndex ordenado em (cliente, uf, porte, ano_mes), e cada
+    dimensão consultada pelas funções projection_by_* tem seu próprio agregado ordenado por
+    (dimensão, ano_mes), de modo que cada consulta é uma busca binária no índice em vez de
+    uma varredura da tabela. Os agregados são calculados diretamente sobre as linhas
+    originais, na mesma ordem, e por isso as somas são idênticas às do filtro seguido de
+    groupby. As datas vêm da coluna data_projecao (ver date_columns), convertida uma única vez.
+    """
+
+    def __init__(self, df_projecao):
+        df_projecao = with_date_columns(df_projecao, 'projecao_consolidado')
+        self._frame = df_projecao.assign(
+            ano_mes=_chronological(df_projecao['ano_mes'], df_projecao[DATE_COLUMN])
+        )
+        self._by_year = None
+        self._rollups = {}
+        self._values = {}
+
+    @cached_property
+    def cube(self):
+        return self._rollup(self._frame, CUBE_LEVELS)
+
+    def rollup(self, dimension):
+        """
+        Somas por (dimensão, ano_mes) de 'uf' ou 'porte'
+        """
+        if dimension not in self._rollups:
+            self._rollups[dimension] = self._rollup(self._frame, [dimension, 'ano_mes'])
+        return self._rollups[dimension]
+
+    def dimension_values(self, dimension):
+        """
+        Valores presentes na dimensão ('cliente', 'uf' ou 'porte'), mesmo que sem ano_mes válido
+        """
+        if dimension not in self._values:
+            self._values[dimension] = set(self._frame[dimension].dropna().unique())
+        return self._values[dimension]
+
+    @cached_property
+    def forecast(self):
+        previsao = self._frame[self._frame['tipo'].str.upper() == 'PREVISAO']
+        return None if previsao.empty else {
+            'ano_porte': self._rollup(previsao, ['ano_mes', 'porte']).reset_index(),
+            'uf_modalidade': self._rollup(previsao, ['uf', 'modalidade']).reset_index(),
+            'cliente': self._rollup(previsao, ['cliente']).reset_index(),
+            'totals': previsao[MEASURES].sum(),
+        }
+
+    @staticmethod
+    def _rollup(df, keys):
+        return df.groupby(keys, observed=True)[MEASURES].sum().sort_index()
+
+    def by_year(self):
+        """
+        Somas por (cliente, ano), calculadas na primeira consulta por tipo de cliente
+        """
+        if self._by_year is None:
+            data = self._frame[['cliente', DATE_COLUMN] + MEASURES].dropna(subset=[DATE_COLUMN])
+            data = data.assign(ano=data[DATE_COLUMN].dt.year)
+            self._by_year = self._rollup(data, ['cliente', 'ano'])
+        return self._by_year
+
+    def series(self, dimension, value):
+        """
+        Somas por ano_mes de um valor da dimensão ('uf' ou 'porte')
+
+        Returns:
+            DataFrame com ano_mes e as medidas, ou None se o valor não existe
+        """
+        if value not in self.dimension_values(dimension):
+            return None
+        rollup = self.rollup(dimension)
+        if value not in rollup.index.get_level_values(0):
+            return pd.DataFrame(columns=['ano_mes'] + MEASURES)
+        return rollup.loc[value].reset_index()
+
+    def slice(self, cliente=None, uf=None, porte=None, ano_mes=None):
+        """
+        Somas por ano_mes de uma fatia do cubo; dimensões omitidas somam todos os valores.
+        Cada dimensão aceita um valor ou uma lista de valores.
+
+        Returns:
+            DataFrame com ano_mes e as medidas
+        """
+        key = tuple(
+            slice(None) if value is None else value if isinstance(value, list) else [value]
+            for value in (cliente, uf, porte, ano_mes)
+        )
+        selected = self.cube.loc[key, :]
+        return selected.groupby(level='ano_mes', observed=True).sum().reset_index()
+
+
+def _forget_cube(key, reference):
+    with _cubes_lock:
+        if key in _cubes and _cubes[key][0] is reference:
+            del _cubes[key]
+
+
+def _cube(df_projecao, dimension=None, value=None):
+    """
+    Cubo do DataFrame, reaproveitado enquanto o frame existir (o frame não deve ser
+    modificado depois da primeira chamada). Uma consulta de um único valor (dimension e
+    value) sobre um frame ainda sem cubo usa um cubo só das linhas desse valor, que custa
+    menos que o cubo da tabela inteira e dá as mesmas somas.
+    """
+    if isinstance(df_projecao, ProjectionCube):
+        return df_projecao
+    key = id(df_projecao)
+    with _cubes_lock:
+        entry = _cubes.get(key)
+    if entry is not None and entry[0]() is df_projecao:
+        return entry[1]
+    if dimension is not None:
+        return ProjectionCube(df_projecao[df_projecao[dimension] == value])
+    cube = ProjectionCube(df_projecao)
+    reference = weakref.ref(df_projecao, lambda reference, key=key: _forget_cube(key, reference))
+    with _cubes_lock:
+        _cubes[key] = (reference, cube)
+    return cube
+
+
 def generate_projection_insights(df_projecao):
     """
     Gera insights detalhados sobre projeção da inadimplência a partir de dados consolidados.
     Params:
-        df_projecao: DataFrame com insights de projeção
+        df_projecao: DataFrame com insights de projeção ou ProjectionCube
     Returns:
         String com insights formatados
     """
-    # Filtrar apenas dados de previsão
-    df_projecao = df_projecao[df_projecao['tipo'].str.upper() == 'PREVISAO']
-    
-    if df_projecao.empty:
+    # Agregados dos dados de previsão, calculados uma vez no cubo
+    forecast = _cube(df_projecao).forecast
+
+    if forecast is None:
         return "Nenhum dado disponível para projeções de inadimplência."
 
     insights = "\n## PROJEÇÕES DE INADIMPLÊNCIA\n\n"
 
     # 1. Projeção por Ano e Porte
     insights += "### Projeção por Ano e Porte:\n"
-    projecao_agrupada = df_projecao.groupby(['ano_mes', 'porte']).agg({
-        'soma_ativo_problematico': 'sum',
-        'soma_carteira_inadimplida_arrastada': 'sum'
-    }).reset_index()
+    projecao_agrupada = forecast['ano_porte']
 
     for _, row in projecao_agrupada.iterrows():
         insights += (
@@ -32,10 +179,7 @@ def generate_projection_insights(df_projecao):
 
     # 2. Projeção por Estado e Modalidade
     insights += "\n### Projeção por Estado e Modalidade:\n"
-    projecao_estado_modalidade = df_projecao.groupby(['uf', 'modalidade']).agg({
-        'soma_ativo_problematico': 'sum',
-        'soma_carteira_inadimplida_arrastada': 'sum'
-    }).reset_index()
+    projecao_estado_modalidade = forecast['uf_modalidade']
 
     for _, row in projecao_estado_modalidade.sort_values('soma_carteira_inadimplida_arrastada', ascending=False).head(10).iterrows():
         insights += (
@@ -46,10 +190,7 @@ def generate_projection_insights(df_projecao):
 
     # 3. Projeção por Tipo de Cliente
     insights += "\n### Projeção por Tipo de Cliente:\n"
-    projecao_cliente = df_projecao.groupby(['cliente']).agg({
-        'soma_ativo_problematico': 'sum',
-        'soma_carteira_inadimplida_arrastada': 'sum'
-    }).reset_index()
+    projecao_cliente = forecast['cliente']
 
     for _, row in projecao_cliente.iterrows():
         insights += (
@@ -60,8 +201,8 @@ def generate_projection_insights(df_projecao):
 
     # 4. Destaques de Projeção
     insights += "\n### Destaques de Projeção:\n"
-    total_ativo_problematico = df_projecao['soma_ativo_problematico'].sum()
-    total_inadimplencia = df_projecao['soma_carteira_inadimplida_arrastada'].sum()
+    total_ativo_problematico = forecast['totals']['soma_ativo_problematico']
+    total_inadimplencia = forecast['totals']['soma_carteira_inadimplida_arrastada']
 
     insights += f"- **Total Ativo Problemático Previsto**: R$ {total_ativo_problematico:,.2f}\n"
     insights += f"- **Total Inadimplência Prevista**: R$ {total_inadimplencia:,.2f}\n"
@@ -73,21 +214,22 @@ def projection_by_client(df_projecao, cliente, anos):
     """
     Gera projeção da dívida para um tipo específico de cliente (PF ou PJ) nos próximos anos.
     Params:
-        df_projecao: DataFrame com insights de projeção
+        df_projecao: DataFrame com insights de projeção ou ProjectionCube
         cliente: Tipo de cliente (ex: 'PF', 'PJ')
         anos: Número de anos para projeção
     Returns:
         String com projeção formatada
     """
-    df_filtered = df_projecao[df_projecao['cliente'] == cliente].copy()
-    if df_filtered.empty:
+    cube = _cube(df_projecao, 'cliente', cliente)
+    if cliente not in cube.dimension_values('cliente'):
+        return f"Nenhum dado disponível para o tipo de cliente '{cliente}'."
+
+    by_year = cube.by_year()
+    df_grouped = by_year.loc[cliente].reset_index() if cliente in by_year.index.get_level_values(0) \
+        else pd.DataFrame(columns=['ano'] + MEASURES)
+    # Cliente só com linhas sem data de projeção: não há ano para iniciar a projeção
+    if df_grouped.empty:
         return f"Nenhum dado disponível para o tipo de cliente '{cliente}'."
-    
-    df_filtered['ano'] = pd.to_datetime(df_filtered['ano_mes'], format='%Y-%m').dt.year
-    df_grouped = df_filtered.groupby('ano').agg({
-        'soma_ativo_problematico': 'sum',
-        'soma_carteira_inadimplida_arrastada': 'sum'
-    }).reset_index()
 
     insights = f"\n## PROJEÇÃO DE DÍVIDA PARA {cliente.upper()} NOS PRÓXIMOS {anos} ANOS\n\n"
     for ano in range(df_grouped['ano'].min(), df_grouped['ano'].min() + anos):
@@ -108,19 +250,14 @@ def projection_by_state(df_projecao, uf):
     """
     Gera projeção da dívida para um estado específico (UF).
     Params:
-        df_projecao: DataFrame com insights de projeção
+        df_projecao: DataFrame com insights de projeção ou ProjectionCube
         uf: Unidade Federativa (ex: 'SP', 'RJ')
     Returns:
         String com projeção formatada
     """
-    df_filtered = df_projecao[df_projecao['uf'] == uf].copy()
-    if df_filtered.empty:
+    df_grouped = _cube(df_projecao, 'uf', uf).series('uf', uf)
+    if df_grouped is None:
         return f"Nenhum dado disponível para o estado '{uf}'."
-    
-    df_grouped = df_filtered.groupby('ano_mes').agg({
-        'soma_ativo_problematico': 'sum',
-        'soma_carteira_inadimplida_arrastada': 'sum'
-    }).reset_index()
 
     insights = f"\n## PROJEÇÃO DE DÍVIDA PARA O ESTADO {uf.upper()}\n\n"
     for _, row in df_grouped.iterrows():
@@ -137,19 +274,14 @@ def projection_by_port(df_projecao, porte):
     """
     Gera projeção da dívida para um porte específico de cliente.
     Params:
-        df_projecao: DataFrame com insights de projeção
+        df_projecao: DataFrame com insights de projeção ou ProjectionCube
         porte: Porte do cliente (ex: 'Pequeno', 'Médio', 'Grande')
     Returns:
         String com projeção formatada
     """
-    df_filtered = df_projecao[df_projecao['porte'] == porte].copy()
-    if df_filtered.empty:
+    df_grouped = _cube(df_projecao, 'porte', porte).series('porte', porte)
+    if df_grouped is None:
         return f"Nenhum dado disponível para o porte '{porte}'."
-    
-    df_grouped = df_filtered.groupby('ano_mes').agg({
-        'soma_ativo_problematico': 'sum',
-        'soma_carteira_inadimplida_arrastada': 'sum'
-    }).reset_index()
 
     insights = f"\n## PROJEÇÃO DE DÍVIDA PARA CLIENTES DE PORTE {porte.upper()}\n\n"
     for _, row in df_grouped.iterrows():
@@ -159,4 +291,50 @@ def projection_by_port(df_projecao, porte):
             f"Inadimplência Arrastada: R$ {row['soma_carteira_inadimplida_arrastada']:,.2f}\n"
         )
 
-    return insights
\ No newline at end of file
+    return insights
+
+
+def _batch(df_projecao, dimension, values, projection):
+    cube = _cube(df_projecao)
+    values = sorted(cube.dimension_values(dimension)) if values is None else values
+    return {value: projection(cube, value) for value in values}
+
+
+def projections_by_client(df_projecao, anos, clientes=None):
+    """
+    Projeções de vários tipos de cliente a partir de um único cubo
+
+    Params:
+        df_projecao: DataFrame com insights de projeção ou ProjectionCube
+        anos: Número de anos para projeção
+        clientes: Tipos de cliente (padrão: todos os presentes nos dados)
+    Returns:
+        Dicionário {cliente: projeção formatada}
+    """
+    return _batch(df_projecao, 'cliente', clientes, lambda cube, cliente: projection_by_client(cube, cliente, anos))
+
+
+def projections_by_state(df_projecao, ufs=None):
+    """
+    Projeções de vários estados a partir de um único cubo, sem varrer os dados por estado
+
+    Params:
+        df_projecao: DataFrame com insights de projeção ou ProjectionCube
+        ufs: Unidades Federativas (padrão: todas as presentes nos dados)
+    Returns:
+        Dicionário {uf: projeção formatada}
+    """
+    return _batch(df_projecao, 'uf', ufs, projection_by_state)
+
+
+def projections_by_port(df_projecao, portes=None):
+    """
+    Projeções de vários portes a partir de um único cubo
+
+    Params:
+        df_projecao: DataFrame com insights de projeção ou ProjectionCube
+        portes: Portes de cliente (padrão: todos os presentes nos dados)
+    Returns:
+        Dicionário {porte: projeção formatada}
+    """
+    return _batch(df_projecao, 'porte', portes, projection_by_port)
@@ -0,0 +1,103 @@
+import pandas as pd
+from sqlalchemy import text
+
+from insights import (
+    A_VENCER_90, ATIVA, GROUPINGS, INAD, OPERACOES, PROBLEMATICO, PROJECAO_90, REESTRUTURACAO,
+)
+from regions import region_case_sql
+from snapshot import get_column_type
+
+INSIGHTS_TABLE = "table_agg_inad_consolidado"
+
+KEY_COLUMNS = ["regiao", "uf", "tipo_cliente", "cnae_secao", "porte", "modalidade", "ocupacao"]
+SUM_COLUMNS = [INAD, ATIVA, OPERACOES, PROBLEMATICO, A_VENCER_90, PROJECAO_90, REESTRUTURACAO]
+TOTAL_COLUMNS = [INAD, PROBLEMATICO, ATIVA, OPERACOES]
+
+
+def _grouping_id(keys):
+    """
+    Valor de GROUPING(KEY_COLUMNS) para um conjunto de chaves: o bit de cada coluna fora
+    do conjunto é 1, com a primeira coluna no bit mais significativo
+    """
+    return sum(1 << (len(KEY_COLUMNS) - 1 - i) for i, column in enumerate(KEY_COLUMNS) if column not in keys)
+
+
+def build_insights_query(table=INSIGHTS_TABLE, partition_type="text"):
+    """
+    Consulta única com GROUPING SETS que devolve, para cada agrupamento de GROUPINGS e para
+    o total geral, as mesmas somas calculadas por insights.compute_insight_aggregates,
+    restrita às partições (valores de data_base) do parâmetro :partitions. A lista é
+    convertida para partition_type, o tipo de data_base, e não a coluna para texto, para o
+    filtro usar o índice e a poda de partições.
+    """
+    grouping_sets = ", ".join(f"({', '.join(keys)})" for keys, _ in GROUPINGS.values())
+    sums = ",\n            ".join(
+        f"COALESCE(SUM({column}), 0)::double precision AS {column}" for column in SUM_COLUMNS
+    )
+    region = region_case_sql("uf").replace("\n", " ")
+    return f"""
+        WITH base AS (
+            SELECT
+                {region} AS regiao,
+                uf,
+                CASE
+                    WHEN cliente IS NULL THEN NULL
+                    WHEN UPPER(BTRIM(cliente, E' \\t\\n\\r\\f\\v')) = 'PF' THEN 'PF'
+                    ELSE 'PJ'
+                END AS tipo_cliente,
+                cnae_secao, porte, modalidade, ocupacao,
+                {INAD}, {ATIVA}, {OPERACOES}, {PROBLEMATICO}, {A_VENCER_90},
+                CASE
+                    WHEN {ATIVA} > 0
+                    THEN {A_VENCER_90}::double precision * ({INAD}::double precision / {ATIVA}::double precision)
+                    ELSE 0
+                END AS {PROJECAO_90},
+                {PROBLEMATICO}::double precision - {INAD}::double precision AS {REESTRUTURACAO}
+            FROM {table}
+            WHERE data_base = ANY(CAST(:partitions AS {partition_type}[]))
+        )
+        SELECT
+            GROUPING({', '.join(KEY_COLUMNS)}) AS grupo,
+            {', '.join(KEY_COLUMNS)},
+            COUNT(*) AS linhas,
+            {sums}
+        FROM base
+        GROUP BY GROUPING SETS ({grouping_sets}, ())
+    """
+
+
+def fetch_insight_aggregates(engine, partitions, table=INSIGHTS_TABLE):
+    """
+    Calcula no Postgres os agregados dos insights, transferindo apenas as linhas agregadas
+
+    Params:
+        engine: Engine do SQLAlchemy
+        partitions: Valores de data_base do período (ver insights.select_month_partitions)
+        table: Tabela consolidada
+    Returns:
+        Dicionário no formato de insights.compute_insight_aggregates, ou None se não há
+        dados do período
+    """
+    if not partitions:
+        return None
+    with engine.connect() as connection:
+        query = text(build_insights_query(table, get_column_type(connection, table, "data_base")))
+        rows = pd.read_sql(query, connection, params={"partitions": list(partitions)})
+
+    totals = rows[rows["grupo"] == _grouping_id([])]
+    if totals.empty or totals["linhas"].iloc[0] == 0:
+        return None
+    totals = totals.iloc[0]
+
+    groups = {}
+    for name, (keys, columns) in GROUPINGS.items():
+        frame = rows[rows["grupo"] == _grouping_id(keys)]
+        # O groupby do pandas descarta chaves nulas; a ordem é a das chaves crescentes
+        frame = frame.dropna(subset=keys)[keys + columns].sort_values(keys)
+        groups[name] = frame.reset_index(drop=True)
+
+    return {
+        "rows": int(totals["linhas"]),
+        "totals": {column: totals[column] for column in TOTAL_COLUMNS},
+        "groups": groups,
+    }
@@ -0,0 +1,307 @@
+import logging
+import os
+import threading
+import time
+
+from data_version import get_data_version, subscribe
+from insights import (
+    DEFAULT_PERIOD, INSIGHTS_COLUMNS, compute_insight_aggregates, format_advanced_insights, parse_period,
+    select_month_partitions, shift_period, stream_insight_aggregates,
+)
+from insights_sql import fetch_insight_aggregates
+from snapshot import SNAPSHOT_TABLES, fetch_partition_fingerprints, iter_table_chunks, load_manifest, use_snapshot
+from table_schema import load_compact_table
+
+logger = logging.getLogger(__name__)
+
+INSIGHTS_TABLE = "table_agg_inad_consolidado"
+
+# Deslocamento em meses de cada comparação aceita em INSIGHTS_COMPARE
+COMPARISON_OFFSETS = {"mom": -1, "yoy": -12}
+
+
+def get_refresh_interval():
+    return float(os.getenv("INSIGHTS_REFRESH_INTERVAL", os.getenv("DATA_VERSION_INTERVAL", "60")))
+
+
+def get_insights_backend():
+    return os.getenv("INSIGHTS_BACKEND", "postgres").lower()
+
+
+def get_chunk_size():
+    return int(os.getenv("INSIGHTS_CHUNK_SIZE", "200000"))
+
+
+def get_insights_period():
+    period = os.getenv("INSIGHTS_PERIOD", DEFAULT_PERIOD)
+    parse_period(period)
+    return period
+
+
+def get_comparison_periods(period):
+    """
+    Períodos de comparação configurados em INSIGHTS_COMPARE, ex.: 'mom,yoy' para o mês
+    anterior e o mesmo mês do ano anterior. Vazio por padrão.
+    """
+    names = [name.strip().lower() for name in os.getenv("INSIGHTS_COMPARE", "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in COMPARISON_OFFSETS]
+    if unknown:
+        raise ValueError(f"Comparação desconhecida em INSIGHTS_COMPARE: {', '.join(unknown)}")
+    return [shift_period(period, COMPARISON_OFFSETS[name]) for name in names]
+
+
+def fetch_fingerprints(engine, data_version):
+    """
+    Impressão digital de cada partição (data_base) da tabela: do manifesto quando o
+    snapshot está na versão corrente dos dados, ou calculada no banco caso contrário, para
+    que um mês novo ou alterado seja visto antes da próxima sincronização do snapshot
+
+    Returns:
+        Dicionário {partição: impressão digital}
+    """
+    if use_snapshot(engine, INSIGHTS_TABLE, data_version):
+        entries = load_manifest(INSIGHTS_TABLE)["partitions"]
+        return {partition: entry["fingerprint"] for partition, entry in entries.items()}
+    return fetch_partition_fingerprints(engine, INSIGHTS_TABLE, SNAPSHOT_TABLES[INSIGHTS_TABLE])
+
+
+def compute_month_aggregates(engine, partitions, period, df=None):
+    """
+    Agregados de um mês com o backend de INSIGHTS_BACKEND:
+
+    - postgres (padrão): uma consulta com GROUPING SETS no servidor, que transfere só as
+      linhas agregadas; se falhar, usa stream
+    - stream: lê as partições do mês em blocos de INSIGHTS_CHUNK_SIZE linhas
+    - memory: agrega o DataFrame df, já carregado com tipos compactos
+
+    Params:
+        engine: Engine do SQLAlchemy
+        partitions: Valores de data_base do mês
+        period: Mês no formato 'AAAA-MM'
+        df: Tabela carregada em memória (backend memory)
+    Returns:
+        Dicionário no formato de insights.compute_insight_aggregates, ou None se não há dados
+    """
+    if df is not None:
+        return compute_insight_aggregates(df, period)
+    if get_insights_backend() == "postgres":
+        try:
+            return fetch_insight_aggregates(engine, partitions, INSIGHTS_TABLE)
+        except Exception:
+            logger.exception("Falha ao agregar insights no Postgres, lendo a tabela em blocos")
+    chunks = iter_table_chunks(
+        engine, INSIGHTS_TABLE, columns=INSIGHTS_COLUMNS, partitions=partitions, chunksize=get_chunk_size()
+    )
+    return stream_insight_aggregates(chunks, period)
+
+
+class MonthlyAggregates:
+    """
+    Agregados dos insights por mês, guardados com as impressões digitais das partições
+    do mês. Um mês só é recalculado quando alguma de suas partições muda, de modo que a
+    carga de um novo mês de data_base não refaz os meses anteriores.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._months = {}
+
+    def get(self, engine, period, fingerprints, df=None):
+        """
+        Retorna os agregados do mês, calculando-os apenas se não estão em cache ou se as
+        partições do mês mudaram
+
+        Params:
+            engine: Engine do SQLAlchemy
+            period: Mês no formato 'AAAA-MM'
+            fingerprints: Dicionário {partição: impressão digital} (ver fetch_fingerprints)
+            df: Tabela carregada em memória (backend memory)
+        """
+        partitions = select_month_partitions(sorted(fingerprints), period)
+        key = tuple((partition, fingerprints[partition]) for partition in partitions)
+        with self._lock:
+            entry = self._months.get(period)
+        if entry is not None and entry["key"] == key:
+            return entry["aggregates"]
+        aggregates = compute_month_aggregates(engine, partitions, period, df) if partitions else None
+        with self._lock:
+            self._months[period] = {"key": key, "aggregates": aggregates}
+        logger.info("Agregados de %s calculados (%d partições)", period, len(partitions))
+        return aggregates
+
+    def periods(self):
+        with self._lock:
+            return sorted(self._months)
+
+
+def build_insights(engine, data_version, months=None, period=None, comparison_periods=None):
+    """
+    Calcula agregados e texto dos insights do período de referência (INSIGHTS_PERIOD) e
+    das comparações de INSIGHTS_COMPARE. Os agregados de cada mês vêm de months e só são
+    recalculados para os meses cujas partições mudaram. Com INSIGHTS_BACKEND=memory a
+    tabela inteira é carregada com tipos compactos e mantida em 'data'.
+
+    Returns:
+        Dicionário com version, period, comparison_periods, insights, aggregates,
+        fingerprints, data e built_at
+    """
+    months = MonthlyAggregates() if months is None else months
+    period = get_insights_period() if period is None else period
+    if comparison_periods is None:
+        comparison_periods = get_comparison_periods(period)
+    fingerprints = fetch_fingerprints(engine, data_version)
+    df = None
+    if get_insights_backend() == "memory":
+        df = load_compact_table(engine, INSIGHTS_TABLE, columns=INSIGHTS_COLUMNS, data_version=data_version)
+    aggregates = months.get(engine, period, fingerprints, df)
+    comparisons = {
+        comparison_period: months.get(engine, comparison_period, fingerprints, df)
+        for comparison_period in comparison_periods
+    }
+    return {
+        "version": data_version,
+        "period": period,
+        "comparison_periods": list(comparison_periods),
+        "insights": format_advanced_insights(aggregates, period, comparisons),
+        "aggregates": aggregates,
+        "fingerprints": fingerprints,
+        "data": df,
+        "built_at": time.time(),
+    }
+
+
+class InsightsStore:
+    """
+    Insights compartilhados por todas as sessões do processo. Uma thread em segundo plano
+    reconstrói o resultado quando a versão dos dados muda e o substitui de uma vez;
+    enquanto isso as sessões continuam recebendo a versão anterior. Só a primeira
+    construção do processo é aguardada.
+    """
+
+    def __init__(self, engine, interval=None, builder=build_insights):
+        self.engine = engine
+        self.interval = get_refresh_interval() if interval is None else interval
+        self._builder = builder
+        self.months = MonthlyAggregates()
+        self._lock = threading.Lock()
+        self._current = None
+        self._error = None
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="insights-refresher", daemon=True)
+                self._thread.start()
+        return self
+
+    def request_refresh(self):
+        """
+        Acorda a thread de atualização sem esperar o próximo intervalo
+        """
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """
+        Reconstrói os insights se a versão dos dados mudou. Em caso de erro a versão
+        anterior continua sendo servida.
+        """
+        version = get_data_version(self.engine)
+        current = self._current
+        if current is not None and current["version"] == version:
+            return False
+        try:
+            snapshot = self._builder(self.engine, version, self.months)
+        except Exception as e:
+            logger.exception("Erro ao reconstruir insights da versão %s", version)
+            with self._lock:
+                self._error = e
+            self._ready.set()
+            return False
+        with self._lock:
+            self._current = snapshot
+            self._error = None
+        self._ready.set()
+        logger.info("Insights da versão %s prontos", version)
+        return True
+
+    def get(self, timeout=None):
+        """
+        Retorna os insights mais recentes, possivelmente de uma versão anterior enquanto
+        a nova é construída. Bloqueia apenas se nenhuma construção terminou ainda.
+
+        Returns:
+            Dicionário produzido por build_insights
+        """
+        self.start()
+        current = self._current
+        if current is None:
+            if not self._ready.wait(timeout):
+                raise TimeoutError("Insights ainda não disponíveis")
+            with self._lock:
+                current, error = self._current, self._error
+            if current is None:
+                # Permite nova tentativa na próxima chamada
+                self._ready.clear()
+                self.request_refresh()
+                raise RuntimeError(f"Não foi possível gerar os insights: {error}")
+        elif current["version"] != get_data_version(self.engine):
+            self.request_refresh()
+        return current
+
+    def get_period(self, period, comparison_periods=(), timeout=None):
+        """
+        Insights de outro mês de referência, montados a partir dos agregados mensais em
+        cache. Só os meses ainda não calculados (ou alterados) são lidos do banco.
+
+        Params:
+            period: Mês no formato 'AAAA-MM'
+            comparison_periods: Meses de comparação
+        Returns:
+            String com os insights formatados
+        """
+        current = self.get(timeout)
+        if period == current["period"] and list(comparison_periods) == current["comparison_periods"]:
+            return current["insights"]
+        fingerprints, df = current["fingerprints"], current["data"]
+        aggregates = self.months.get(self.engine, period, fingerprints, df)
+        comparisons = {
+            comparison_period: self.months.get(self.engine, comparison_period, fingerprints, df)
+            for comparison_period in comparison_periods
+        }
+        return format_advanced_insights(aggregates, period, comparisons)
+
+    def status(self):
+        current = self._current
+        return {
+            "version": current["version"] if current else None,
+            "built_at": current["built_at"] if current else None,
+            "period": current["period"] if current else None,
+            "cached_periods": self.months.periods(),
+            "error": repr(self._error) if self._error else None,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_insights_store(engine):
+    """
+    Retorna o InsightsStore do processo, iniciando a thread de atualização na primeira chamada
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = InsightsStore(engine).start()
+                subscribe(lambda old, new: _store.request_refresh())
+    return _store
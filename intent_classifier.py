@@ -0,0 +1,176 @@
+import os
+import re
+import threading
+import unicodedata
+
+INTENTS = ["COMPARAÇÃO", "RANKING", "ESPECÍFICO", "TENDÊNCIA", "GERAL", "PROJEÇÃO"]
+
+# Padrões aplicados sobre a pergunta em minúsculas e sem acentos, com o peso de cada um
+INTENT_PATTERNS = {
+    "PROJEÇÃO": [
+        (r"\bproje[cç](ao|oes|ado|ada|ar)\b", 3.0),
+        (r"\bprevis(ao|oes|to|ta)\b", 3.0),
+        (r"\bprever\b", 2.5),
+        (r"\bproxim[oa]s?\s+(\d+\s+)?(anos?|meses|mes|dias|trimestres?|semestres?)\b", 2.5),
+        (r"\bfutur[oa]s?\b", 2.0),
+        (r"\b20(2[5-9]|3\d)\b", 1.0),
+    ],
+    "TENDÊNCIA": [
+        (r"\bevolu(iu|cao|ir|indo|i)\b", 3.0),
+        (r"\btendencias?\b", 3.0),
+        (r"\bao longo d[oa]s?\b", 2.5),
+        (r"\bhistoric[oa]\b", 2.0),
+        (r"\bmes a mes\b|\bano a ano\b", 2.5),
+        (r"\b(cresceu|caiu|aumentou|diminuiu|subiu)\b", 2.0),
+        (r"\b(crescimento|queda|variacao)\b", 1.5),
+        (r"\bdesde\b", 1.5),
+        (r"\bentre\s+(\d{2}/)?\d{4}\s+e\s+(\d{2}/)?\d{4}\b", 2.5),
+        (r"\bpor (mes|ano|periodo)\b", 1.5),
+    ],
+    "COMPARAÇÃO": [
+        (r"\bcompar(e|ar|acao|ando|ativo|ado)\b", 3.0),
+        (r"\bversus\b|\bvs\.?\b", 3.0),
+        # "Qual a diferença entre ativo problemático e carteira inadimplida?" é conceitual:
+        # só conta como comparação forte quando cita valores ou um período
+        (r"\bdiferenca\b", 1.0),
+        (r"\bdiferenca\b(?=.*\b(valor|valores|total|taxa|montante|saldo|percentual|(19|20)\d{2}|\d{2}/\d{4})\b)", 1.5),
+        (r"\bem relacao a\b", 1.5),
+        (r"\b(pf|pj)\s+(e|x|ou)\s+(pf|pj)\b", 2.0),
+        (r"\bentre\s+\w+\s+e\s+\w+\b", 1.0),
+    ],
+    "RANKING": [
+        (r"\btop\s*\d*\b", 3.0),
+        (r"\branking\b", 3.0),
+        (r"\b(maior|maiores|menor|menores)\b", 2.0),
+        (r"\b(pior|piores|melhor|melhores)\b", 2.0),
+        (r"\b(mais|menos)\s+(inadimplent|endividad|operac|alt|baix)\w*", 1.5),
+        (r"\bprincipa(l|is)\b", 1.5),
+        (r"\bqua(l|is)\s+(o|a|os|as)?\s*(estado|regiao|regioes|modalidade|setor|ocupacao|porte|tipo|uf|cliente)s?\b", 0.5),
+    ],
+    "ESPECÍFICO": [
+        (r"\bquanto\b", 2.0),
+        (r"\b(qual|quais)\s+(e\s+)?(o|a|os|as)\s+(valor|valores|total|taxa|montante|saldo)\b", 2.0),
+        (r"\b(valor|total|montante|saldo)\b", 1.0),
+        (r"\b(no|na|em)\s+(ac|al|ap|am|ba|ce|df|es|go|ma|mt|ms|mg|pa|pb|pr|pe|pi|rj|rn|rs|ro|rr|sc|sp|se|to)\b", 1.5),
+        (r"\b(sao paulo|rio de janeiro|minas gerais|bahia|parana|santa catarina|rio grande do sul|pernambuco|ceara|goias|distrito federal|amazonas)\b", 1.5),
+        (r"\b\d{2}/\d{4}\b", 1.0),
+    ],
+    "GERAL": [
+        (r"\bo que (e|sao|significa|significam)\b", 3.0),
+        (r"\b(explique|explica|explicar|defina|definicao|conceito)\b", 3.0),
+        (r"\bcomo funciona\b", 3.0),
+        (r"\bpor que\b|\bporque\b", 1.5),
+        (r"\b(dicas?|recomenda|sugest|ola|oi|bom dia|boa tarde|boa noite|obrigad)\w*\b", 2.0),
+        (r"\bcomo (posso|evitar|reduzir|sair)\b", 2.0),
+    ],
+}
+
+# Padrões aplicados sobre a pergunta em minúsculas, mantendo os acentos: sem o acento, o
+# estado do Pará se confunde com a preposição "para"
+ACCENTED_PATTERNS = {
+    "ESPECÍFICO": [
+        (r"\bpará\b|\b(estado do|no) para\b", 1.5),
+    ],
+}
+
+_COMPILED_PATTERNS = {
+    intent: [(re.compile(pattern), weight) for pattern, weight in patterns]
+    for intent, patterns in INTENT_PATTERNS.items()
+}
+
+_COMPILED_ACCENTED_PATTERNS = {
+    intent: [(re.compile(pattern), weight) for pattern, weight in patterns]
+    for intent, patterns in ACCENTED_PATTERNS.items()
+}
+
+_stats_lock = threading.Lock()
+_stats = {"local": 0, "fallback": 0, "compared": 0, "agreements": 0}
+
+
+def get_confidence_threshold():
+    return float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.7"))
+
+
+def normalize_question(question):
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def score_intents(question):
+    """
+    Pontua a pergunta em cada categoria de intenção usando os padrões locais
+
+    Params:
+        question: Pergunta do usuário
+    Returns:
+        Dicionário {intenção: pontuação}
+    """
+    text = normalize_question(question)
+    accented = re.sub(r"\s+", " ", unicodedata.normalize("NFC", question.lower())).strip()
+    scores = {
+        intent: sum(weight for pattern, weight in patterns if pattern.search(text))
+        for intent, patterns in _COMPILED_PATTERNS.items()
+    }
+    for intent, patterns in _COMPILED_ACCENTED_PATTERNS.items():
+        scores[intent] += sum(weight for pattern, weight in patterns if pattern.search(accented))
+    return scores
+
+
+def classify_intent_locally(question):
+    """
+    Classifica a intenção da pergunta sem chamar o LLM.
+    A confiança combina a força da melhor categoria e a margem sobre a segunda.
+
+    Params:
+        question: Pergunta do usuário
+    Returns:
+        Tupla (intenção, confiança entre 0 e 1)
+    """
+    scores = score_intents(question)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best_intent, best_score = ranked[0]
+    second_score = ranked[1][1]
+
+    if best_score == 0:
+        return "GERAL", 0.0
+
+    margin = best_score / (best_score + second_score)
+    strength = min(best_score / 3.0, 1.0)
+    return best_intent, round(margin * strength, 4)
+
+
+def record_local_hit():
+    with _stats_lock:
+        _stats["local"] += 1
+
+
+def record_llm_fallback(local_intent, llm_intent):
+    """
+    Registra uma classificação feita pelo LLM e se ela concorda com o palpite local
+    """
+    with _stats_lock:
+        _stats["fallback"] += 1
+        _stats["compared"] += 1
+        if local_intent == llm_intent:
+            _stats["agreements"] += 1
+
+
+def get_intent_stats():
+    """
+    Retorna a taxa de acerto local (perguntas resolvidas sem LLM) e a concordância
+    entre o classificador local e o LLM nas perguntas enviadas ao LLM
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["local"] + stats["fallback"]
+    stats["total"] = total
+    stats["hit_rate"] = stats["local"] / total if total else 0.0
+    stats["agreement_rate"] = stats["agreements"] / stats["compared"] if stats["compared"] else 0.0
+    return stats
+
+
+def reset_intent_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
@@ -0,0 +1,324 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LLM_BASE_URL = "https://api.deepseek.com"
+LLM_MODEL = "deepseek-chat"
+
+# Tempo máximo de leitura em segundos por etapa do pipeline (sobrescrito por LLM_TIMEOUT_<ETAPA>)
+STAGE_TIMEOUTS = {"classify": 15.0, "sql": 45.0, "answer": 120.0}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_client = None
+_async_client = None
+_llm = None
+_client_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "new_connections": 0, "retries": 0, "failures": 0, "retry_statuses": {}}
+
+
+def _float_env(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _int_env(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _bool_env(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "sim")
+
+
+def get_http_settings():
+    """
+    Lê as configurações do cliente HTTP do LLM a partir do .env
+
+    Returns:
+        Dicionário com pool, keep-alive, HTTP/2, verificação TLS e retentativas
+    """
+    http2 = _bool_env("LLM_HTTP2", False)
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("LLM_HTTP2 ativo, mas o pacote h2 não está instalado; usando HTTP/1.1")
+        http2 = False
+    return {
+        "max_connections": _int_env("LLM_MAX_CONNECTIONS", 20),
+        # O cliente assíncrono atende dezenas de perguntas simultâneas sem ocupar threads
+        "async_max_connections": _int_env("LLM_ASYNC_MAX_CONNECTIONS", 100),
+        "async_max_keepalive_connections": _int_env("LLM_ASYNC_MAX_KEEPALIVE", 50),
+        "max_keepalive_connections": _int_env("LLM_MAX_KEEPALIVE", 10),
+        "keepalive_expiry": _float_env("LLM_KEEPALIVE_EXPIRY", 120.0),
+        "connect_timeout": _float_env("LLM_CONNECT_TIMEOUT", 5.0),
+        "http2": http2,
+        "verify": _bool_env("LLM_VERIFY_SSL", False),
+        "max_retries": _int_env("LLM_MAX_RETRIES", 3),
+        "backoff_base": _float_env("LLM_BACKOFF_BASE", 0.5),
+        "backoff_max": _float_env("LLM_BACKOFF_MAX", 8.0),
+    }
+
+
+def get_stage_timeout(stage):
+    """
+    Timeout da etapa ('classify', 'sql' ou 'answer'): conexão curta e leitura pela etapa
+    """
+    read = _float_env(f"LLM_TIMEOUT_{stage.upper()}", STAGE_TIMEOUTS[stage])
+    return httpx.Timeout(read, connect=get_http_settings()["connect_timeout"])
+
+
+def _retry_delay(response, attempt, base, maximum):
+    """
+    Espera antes da próxima tentativa: Retry-After quando o servidor informa, senão
+    backoff exponencial com jitter completo
+    """
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), maximum)
+        except ValueError:
+            try:
+                return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0), maximum)
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _record_retry(status, delay):
+    with _stats_lock:
+        _stats["retries"] += 1
+        _stats["retry_statuses"][status] = _stats["retry_statuses"].get(status, 0) + 1
+    logger.warning("LLM respondeu %s, nova tentativa em %.2f s", status, delay)
+
+
+def _trace(event_name, info):
+    if event_name == "connection.connect_tcp.complete":
+        _count("new_connections")
+
+
+async def _async_trace(event_name, info):
+    _trace(event_name, info)
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """
+    Transporte HTTP com pool de conexões que repete as requisições com resposta 429/5xx
+    ou falha de conexão, e contabiliza conexões novas e reaproveitadas
+    """
+
+    def __init__(self, max_retries=3, backoff_base=0.5, backoff_max=8.0, **kwargs):
+        super().__init__(**kwargs)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def handle_request(self, request):
+        request.extensions = {**request.extensions, "trace": _trace}
+        attempt = 0
+        while True:
+            _count("requests")
+            response = None
+            try:
+                response = super().handle_request(request)
+            except RETRY_ERRORS:
+                if attempt >= self.max_retries:
+                    _count("failures")
+                    raise
+                status = "connection"
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                status = response.status_code
+            delay = _retry_delay(response, attempt, self.backoff_base, self.backoff_max)
+            if response is not None:
+                # Lê o corpo (curto) do erro para a conexão voltar ao pool em vez de ser fechada
+                response.read()
+                response.close()
+            _record_retry(status, delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncRetryTransport(httpx.AsyncHTTPTransport):
+    """
+    Versão assíncrona de RetryTransport: a espera entre tentativas não bloqueia o event loop
+    """
+
+    def __init__(self, max_retries=3, backoff_base=0.5, backoff_max=8.0, **kwargs):
+        super().__init__(**kwargs)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    async def handle_async_request(self, request):
+        request.extensions = {**request.extensions, "trace": _async_trace}
+        attempt = 0
+        while True:
+            _count("requests")
+            response = None
+            try:
+                response = await super().handle_async_request(request)
+            except RETRY_ERRORS:
+                if attempt >= self.max_retries:
+                    _count("failures")
+                    raise
+                status = "connection"
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                status = response.status_code
+            delay = _retry_delay(response, attempt, self.backoff_base, self.backoff_max)
+            if response is not None:
+                await response.aread()
+                await response.aclose()
+            _record_retry(status, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def get_http_client():
+    """
+    Retorna o cliente HTTP do LLM compartilhado pelo processo, com keep-alive, pool de
+    conexões e retentativas com backoff
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                settings = get_http_settings()
+                transport = RetryTransport(
+                    max_retries=settings["max_retries"],
+                    backoff_base=settings["backoff_base"],
+                    backoff_max=settings["backoff_max"],
+                    verify=settings["verify"],
+                    http2=settings["http2"],
+                    limits=httpx.Limits(
+                        max_connections=settings["max_connections"],
+                        max_keepalive_connections=settings["max_keepalive_connections"],
+                        keepalive_expiry=settings["keepalive_expiry"],
+                    ),
+                )
+                _client = httpx.Client(transport=transport, timeout=get_stage_timeout("answer"))
+    return _client
+
+
+def get_async_http_client():
+    """
+    Retorna o cliente HTTP assíncrono do LLM compartilhado pelo processo. As conexões
+    pertencem ao event loop que as abriu, por isso as chamadas assíncronas devem rodar
+    sempre no mesmo loop (ver async_pipeline).
+    """
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                settings = get_http_settings()
+                transport = AsyncRetryTransport(
+                    max_retries=settings["max_retries"],
+                    backoff_base=settings["backoff_base"],
+                    backoff_max=settings["backoff_max"],
+                    verify=settings["verify"],
+                    http2=settings["http2"],
+                    limits=httpx.Limits(
+                        max_connections=settings["async_max_connections"],
+                        max_keepalive_connections=settings["async_max_keepalive_connections"],
+                        keepalive_expiry=settings["keepalive_expiry"],
+                    ),
+                )
+                _async_client = httpx.AsyncClient(transport=transport, timeout=get_stage_timeout("answer"))
+    return _async_client
+
+
+def get_llm_client():
+    """
+    Retorna o ChatOpenAI compartilhado pelo processo, com os clientes HTTP síncrono e
+    assíncrono (invoke/ainvoke). As retentativas ficam nos transportes HTTP, por isso as
+    do SDK são desativadas; o timeout padrão é o da etapa 'answer'.
+
+    Returns:
+        ChatOpenAI
+    """
+    global _llm
+    if _llm is None:
+        http_client = get_http_client()
+        http_async_client = get_async_http_client()
+        with _client_lock:
+            if _llm is None:
+                _llm = ChatOpenAI(
+                    api_key=os.getenv("API_KEY"),
+                    base_url=LLM_BASE_URL,
+                    model=LLM_MODEL,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    timeout=get_stage_timeout("answer"),
+                    max_retries=0,
+                )
+    return _llm
+
+
+def for_stage(llm, stage):
+    """
+    Aplica ao LLM o timeout da etapa. Objetos sem bind (ex.: LLMs falsos de teste) são
+    devolvidos sem alteração.
+    """
+    bind = getattr(llm, "bind", None)
+    return llm if bind is None else bind(timeout=get_stage_timeout(stage))
+
+
+def get_llm_stats():
+    """
+    Retorna as requisições ao LLM, as conexões abertas e reaproveitadas e as retentativas
+    por status
+    """
+    with _stats_lock:
+        stats = dict(_stats, retry_statuses=dict(_stats["retry_statuses"]))
+    stats["reused_connections"] = max(stats["requests"] - stats["new_connections"], 0)
+    stats["reuse_rate"] = stats["reused_connections"] / stats["requests"] if stats["requests"] else 0.0
+    return stats
+
+
+def reset_llm_stats():
+    with _stats_lock:
+        for key in ("requests", "new_connections", "retries", "failures"):
+            _stats[key] = 0
+        _stats["retry_statuses"] = {}
+
+
+def close_llm_client():
+    """
+    Fecha as conexões do cliente HTTP síncrono e descarta o assíncrono, cujas conexões
+    são fechadas pelo loop dono (ver async_pipeline.shutdown). Usar apenas no encerramento
+    do processo.
+    """
+    global _client, _async_client, _llm
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _async_client = None
+        _llm = None
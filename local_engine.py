@@ -0,0 +1,244 @@
+import argparse
+import os
+import re
+import statistics
+import threading
+import time
+
+from date_columns import DATE_COLUMNS, date_parse_duckdb
+from regions import region_case_sql
+from rollups import BENCHMARK_QUERIES, execute_routed
+from snapshot import SNAPSHOT_TABLES, get_snapshot_dir, load_manifest, snapshot_matches
+from sql_guard import (
+    UnsafeQueryError, execute_guarded, get_statement_timeout_ms, guard_query, tokenize_sql, validate_read_only,
+)
+
+# Formatos de data do Postgres (TO_DATE/TO_CHAR) e equivalentes do strptime
+_DATE_FORMAT_TOKENS = [
+    ("YYYY", "%Y"), ("HH24", "%H"), ("MM", "%m"), ("DD", "%d"), ("MI", "%M"), ("SS", "%S"), ("YY", "%y"),
+]
+
+_lock = threading.Lock()
+_state = {"connection": None, "signature": None}
+
+
+class UnsupportedSqlError(ValueError):
+    """
+    Consulta que a camada de compatibilidade não sabe traduzir para o motor local
+    """
+
+
+class LocalQueryTimeout(TimeoutError):
+    """
+    Consulta interrompida no motor local por exceder SQL_STATEMENT_TIMEOUT_MS
+    """
+
+
+def get_sql_backend():
+    return os.getenv("SQL_BACKEND", "postgres").lower()
+
+
+def _strptime_format(pg_format):
+    result = pg_format
+    for pg_token, python_token in _DATE_FORMAT_TOKENS:
+        result = result.replace(pg_token, python_token)
+    if re.search(r"[A-Za-z]{2,}", result.replace("%", " ")):
+        raise UnsupportedSqlError(f"formato de data não suportado: {pg_format}")
+    return result
+
+
+def translate_sql(sql):
+    """
+    Traduz as construções do Postgres usadas nos prompts para o dialeto do DuckDB.
+    NOW(), INTERVAL 'N days', CASE WHEN, ILIKE e EXTRACT já são compatíveis.
+
+    - TO_DATE(x, 'DD/MM/YYYY') -> CAST(strptime(x, '%d/%m/%Y') AS DATE)
+    - ::numeric / ::decimal    -> ::DOUBLE (o DECIMAL padrão do DuckDB transborda em somas grandes)
+    """
+    tokens = tokenize_sql(sql)
+    output = []
+    last = 0
+    i = 0
+    while i < len(tokens):
+        kind, value, start, end = tokens[i]
+        lowered = value.lower()
+        if kind == "word" and lowered == "to_date" and i + 1 < len(tokens) and tokens[i + 1][1] == "(":
+            depth = 0
+            format_index = None
+            for j in range(i + 1, len(tokens)):
+                symbol = tokens[j][1]
+                if symbol == "(":
+                    depth += 1
+                elif symbol == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                elif symbol == "," and depth == 1:
+                    format_index = j + 1
+            else:
+                raise UnsupportedSqlError("TO_DATE sem parêntese de fechamento")
+            if format_index is None or tokens[format_index][0] != "string" or format_index + 1 != j:
+                raise UnsupportedSqlError("TO_DATE sem formato literal")
+            argument = sql[tokens[i + 2][2]:tokens[format_index - 1][2]]
+            date_format = _strptime_format(tokens[format_index][1][1:-1])
+            output.append(sql[last:start])
+            output.append(f"CAST(strptime({translate_sql(argument)}, '{date_format}') AS DATE)")
+            last = tokens[j][3]
+            i = j + 1
+            continue
+        if kind == "symbol" and value == "::" and i + 1 < len(tokens) \
+                and tokens[i + 1][1].lower() in ("numeric", "decimal"):
+            following = tokens[i + 1]
+            output.append(sql[last:following[2]])
+            output.append("DOUBLE")
+            last = following[3]
+            # Descarta precisão/escala, ex.: ::numeric(18, 2)
+            if i + 2 < len(tokens) and tokens[i + 2][1] == "(":
+                closing = next(k for k in range(i + 2, len(tokens)) if tokens[k][1] == ")")
+                last = tokens[closing][3]
+                i = closing + 1
+                continue
+            i += 2
+            continue
+        i += 1
+    output.append(sql[last:])
+    return "".join(output)
+
+
+def _snapshot_signature():
+    directory = get_snapshot_dir()
+    signature = []
+    for table in SNAPSHOT_TABLES:
+        path = os.path.join(directory, table, "manifest.json")
+        signature.append(os.path.getmtime(path) if os.path.exists(path) else None)
+    return tuple(signature)
+
+
+def _load_tables(connection):
+    directory = get_snapshot_dir()
+    for table in SNAPSHOT_TABLES:
+        entries = load_manifest(table)["partitions"]
+        files = [os.path.join(directory, table, entry["file"]) for _, entry in sorted(entries.items())]
+        if not files:
+            continue
+        file_list = ", ".join("'" + path.replace("'", "''") + "'" for path in files)
+        source = f"read_parquet([{file_list}], union_by_name = true)"
+        columns = [row[0] for row in connection.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+        extra = "" if "regiao" in columns else f", {region_case_sql()} AS regiao"
+        date_column = DATE_COLUMNS.get(table)
+        if date_column is not None and date_column["column"] not in columns:
+            extra += f", {date_parse_duckdb(date_column['source'])} AS {date_column['column']}"
+        connection.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT *{extra} FROM {source}")
+
+
+def get_local_connection():
+    """
+    Retorna uma conexão DuckDB em memória com as tabelas carregadas do snapshot Parquet.
+    As tabelas são recarregadas quando o snapshot é sincronizado novamente. Depois da
+    carga, o acesso a arquivos e à rede é desligado e a configuração travada, para o SQL
+    gerado pelo LLM não ler arquivos locais nem reativar o acesso.
+    """
+    import duckdb
+
+    signature = _snapshot_signature()
+    with _lock:
+        if _state["connection"] is None or _state["signature"] != signature:
+            connection = duckdb.connect(database=":memory:")
+            _load_tables(connection)
+            connection.execute("SET enable_external_access = false")
+            connection.execute("SET lock_configuration = true")
+            if _state["connection"] is not None:
+                _state["connection"].close()
+            _state["connection"] = connection
+            _state["signature"] = signature
+        # Cada thread usa seu próprio cursor sobre o mesmo banco em memória
+        return _state["connection"].cursor()
+
+
+def execute_local(sql, timeout_ms=None):
+    """
+    Executa a consulta no DuckDB sobre o snapshot local, com as mesmas regras de leitura
+    do Postgres e as restrições próprias do DuckDB (ver sql_guard.validate_read_only).
+    A consulta é interrompida após timeout_ms, como o statement_timeout do Postgres.
+
+    Params:
+        sql: Consulta já processada por guard_query
+        timeout_ms: Tempo máximo da consulta (padrão: SQL_STATEMENT_TIMEOUT_MS; 0 desativa)
+    Returns:
+        DataFrame com o resultado
+    """
+    if timeout_ms is None:
+        timeout_ms = get_statement_timeout_ms()
+    translated = translate_sql(validate_read_only(sql, dialect="duckdb"))
+    cursor = get_local_connection()
+    timer = threading.Timer(timeout_ms / 1000, cursor.interrupt) if timeout_ms else None
+    try:
+        if timer is not None:
+            timer.start()
+        try:
+            return cursor.execute(translated).fetchdf()
+        except Exception:
+            if timer is not None and timer.finished.is_set():
+                raise LocalQueryTimeout(f"Consulta interrompida após {timeout_ms} ms")
+            raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+        cursor.close()
+
+
+def execute_with_backend(sql, engine, data_version):
+    """
+    Executa a consulta no backend configurado em SQL_BACKEND. Com 'local', usa o DuckDB
+    quando o snapshot está na versão corrente dos dados e volta ao Postgres se a consulta
+    não for suportada ou falhar.
+    """
+    if get_sql_backend() == "local" and snapshot_matches(data_version):
+        try:
+            return execute_local(sql)
+        except (UnsafeQueryError, LocalQueryTimeout):
+            # Rejeitada ou lenta demais: repetir no Postgres não ajudaria
+            raise
+        except Exception as e:
+            # print(f"Consulta não suportada no motor local, usando Postgres: {e}")
+            pass
+    return execute_routed(sql, engine, data_version)
+
+
+def benchmark(engine, queries=None, repeat=5):
+    """
+    Compara a latência das consultas no Postgres e no motor local
+
+    Returns:
+        Lista de dicionários com as medianas em milissegundos
+    """
+    results = []
+    for sql in queries or BENCHMARK_QUERIES:
+        guarded = guard_query(sql)
+        timings = {}
+        for label, run in (
+            ("postgres", lambda: execute_guarded(guarded, engine, max_cost=0)),
+            ("local", lambda: execute_local(guarded)),
+        ):
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[label] = statistics.median(samples)
+        results.append({"sql": sql, "postgres_ms": timings["postgres"], "local_ms": timings["local"]})
+    return results
+
+
+if __name__ == "__main__":
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Motor analítico local (DuckDB)")
+    parser.add_argument("command", choices=["benchmark"])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for result in benchmark(get_engine(), repeat=args.repeat):
+        speedup = result["postgres_ms"] / result["local_ms"] if result["local_ms"] else 0
+        print(f"- postgres {result['postgres_ms']:.1f} ms, local {result['local_ms']:.1f} ms ({speedup:.1f}x)")
+        print(f"  {result['sql']}")
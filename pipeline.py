@@ -0,0 +1,330 @@
+from langchain_core.prompts import ChatPromptTemplate
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from data_version import get_data_version
+from query_cache import read_sql_cached, get_generated_sql_cache
+from sql_guard import guard_query
+from schema_catalog import count_tokens, get_schema_catalog, record_prompt_tokens, render_sql_prompt
+from local_engine import execute_with_backend
+from llm_client import for_stage, get_llm_client
+from intent_classifier import (
+    normalize_question, score_intents, classify_intent_locally, get_confidence_threshold,
+    record_local_hit, record_llm_fallback, get_intent_stats
+)
+
+load_dotenv()
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PIPELINE_WORKERS", "16")),
+    thread_name_prefix="pipeline"
+)
+# Streams especulativos ficam ocupados durante toda a geração da resposta; num pool
+# próprio, não atrasam a classificação e o SQL especulativos de novas perguntas
+_stream_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PIPELINE_STREAM_WORKERS", "32")),
+    thread_name_prefix="pipeline-stream"
+)
+
+INTENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """
+    Analise a pergunta do usuário sobre inadimplência e classifique a intenção em uma das seguintes categorias:
+    1. COMPARAÇÃO - Perguntas que comparam diferentes aspectos (ex: "Compare PF e PJ")
+    2. RANKING - Perguntas sobre "maior", "menor", "top", etc. (ex: "Qual estado com maior inadimplência?")
+    3. ESPECÍFICO - Perguntas sobre um atributo específico (ex: "Valor de inadimplência em São Paulo")
+    4. TENDÊNCIA - Perguntas sobre evolução temporal (ex: "Como evoluiu a inadimplência")
+    5. GERAL - Perguntas gerais sobre inadimplência
+    6. PROJEÇÃO - Perguntas sobre projeção (ex: "Qual projeção de inadimplência para os próximos 5 anos?")	
+    
+    Responda apenas com o número da categoria mais adequada (1, 2, 3, 4, 5 ou 6).
+    """),
+    ("human", "{input}")
+])
+
+INTENT_MAPPING = {
+    "1": "COMPARAÇÃO",
+    "2": "RANKING",
+    "3": "ESPECÍFICO",
+    "4": "TENDÊNCIA",
+    "5": "GERAL",
+    "6": "PROJEÇÃO" 
+}
+
+# Resposta das perguntas GERAL, que não consultam o banco
+GENERAL_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """
+    Você é um especialista em análise de inadimplência no Brasil.
+    Responda à pergunta do usuário com base nos dados reais das tabelas 'table_agg_inad_consolidado' e 'projecao_consolidado'.
+    Se os dados não estiverem disponíveis, informe que não há informações suficientes e sugira verificar a fonte.
+    Formate os valores em reais (R$) com duas casas decimais e separadores de milhar.
+    """),
+    ("human", "{input}")
+])
+
+NO_DYNAMIC_RESULTS = "Não foi possível gerar resultados dinâmicos específicos."
+
+def parse_intent(content):
+    intent_number = ''.join(filter(str.isdigit, content[:2]))
+    return INTENT_MAPPING.get(intent_number, "GERAL")
+
+def classify_intent_with_llm(prompt, llm):
+    intent_chain = INTENT_PROMPT | for_stage(llm, "classify")
+    intent_result = intent_chain.invoke({"input": prompt})
+    return parse_intent(intent_result.content)
+
+def classify_user_intent(prompt, llm):
+    local_intent, confidence = classify_intent_locally(prompt)
+    if confidence >= get_confidence_threshold():
+        record_local_hit()
+        return local_intent
+
+    llm_intent = classify_intent_with_llm(prompt, llm)
+    record_llm_fallback(local_intent, llm_intent)
+    # print(f"Classificador local: {get_intent_stats()}")
+
+    return llm_intent
+
+def get_cached_query(intent, prompt, table_name, data_version):
+    """
+    Retorna a chave do cache de SQL gerado e a consulta em cache (ou None)
+    """
+    cache_key = (intent, table_name, normalize_question(prompt))
+    if data_version is None:
+        return cache_key, None
+    return cache_key, get_generated_sql_cache().get(cache_key, data_version)
+
+def build_query_prompt(intent, prompt, table_name, data_version=None, conn=None):
+    # Só as colunas e regras relevantes para a intenção e a pergunta entram no prompt
+    catalog = get_schema_catalog(conn, data_version)
+    system_prompt = render_sql_prompt(intent, prompt, table_name, catalog)
+    record_prompt_tokens(intent, count_tokens(system_prompt) + count_tokens(prompt))
+    return ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", "{input}")
+    ])
+
+def finish_generated_query(content, cache_key, data_version):
+    """
+    Remove a cerca de código da resposta do LLM e guarda o SQL no cache
+    """
+    sql_query = content.strip()
+    if sql_query.startswith("```sql"):
+        sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
+    
+    # print(f"Consulta SQL gerada: {sql_query}")  # Log para depuração
+    if data_version is not None:
+        get_generated_sql_cache().put(cache_key, sql_query, data_version)
+    return sql_query
+
+def generate_dynamic_query(intent, prompt, llm, table_name="table_agg_inad_consolidado", data_version=None, conn=None):
+    cache_key, cached_query = get_cached_query(intent, prompt, table_name, data_version)
+    if cached_query is not None:
+        return cached_query
+
+    query_prompt = build_query_prompt(intent, prompt, table_name, data_version, conn)
+    query_chain = query_prompt | for_stage(llm, "sql")
+    sql_result = query_chain.invoke({"input": prompt})
+    return finish_generated_query(sql_result.content, cache_key, data_version)
+
+def fetch_dynamic_results(dynamic_query, conn, data_version=None):
+    """
+    Executa a consulta gerada (validada pelo sql_guard, com cache e backend configurado)
+
+    Returns:
+        DataFrame com o resultado, ou NO_DYNAMIC_RESULTS se a consulta falhar
+    """
+    if data_version is None:
+        data_version = get_data_version(conn)
+    try:
+        guarded_query = guard_query(dynamic_query)
+        dynamic_results = read_sql_cached(
+            guarded_query,
+            conn,
+            version=data_version,
+            reader=lambda sql, engine: execute_with_backend(sql, engine, data_version)
+        )
+        # print(f"Resultados dinâmicos: {dynamic_results.to_string()}")  # Log para depuração
+    except Exception as e:
+        # print(f"Erro ao executar consulta dinâmica: {e}")
+        dynamic_results = NO_DYNAMIC_RESULTS
+    return dynamic_results
+
+def build_processing_prompt(intent, dynamic_results):
+    return ChatPromptTemplate.from_messages([
+        ("system", f"""
+        Você é um especialista em análise de inadimplência no Brasil.
+        
+        A pergunta do usuário foi classificada como: {intent}
+        
+        Responda à pergunta usando os resultados da consulta abaixo, que refletem os dados completos das tabelas:
+        
+        RESULTADOS DA CONSULTA:
+        {dynamic_results}
+        
+        Formate os valores em reais (R$) com duas casas decimais e separadores de milhar.
+        Destaque os pontos mais relevantes para a pergunta do usuário e acrecente informações adicionais sobre inadimplência.
+        Se os dados não forem suficientes ou estiverem ausentes, informe que os dados não estão disponíveis e sugira verificar a fonte.
+        """),
+        ("human", "{input}")
+    ])
+
+def build_processing_chain(intent, dynamic_query, llm, conn, data_version=None):
+    dynamic_results = fetch_dynamic_results(dynamic_query, conn, data_version)
+    return build_processing_prompt(intent, dynamic_results) | for_stage(llm, "answer")
+
+def process_question(prompt, intent, dynamic_query, llm, conn, data_version=None):
+    processing_chain = build_processing_chain(intent, dynamic_query, llm, conn, data_version)
+    response = processing_chain.invoke({"input": prompt})
+    
+    return response.content
+
+def stream_question(prompt, intent, dynamic_query, llm, conn, data_version=None):
+    """
+    Igual a process_question, mas devolve os tokens da resposta à medida que o LLM os gera
+    """
+    processing_chain = build_processing_chain(intent, dynamic_query, llm, conn, data_version)
+    return (chunk.content for chunk in processing_chain.stream({"input": prompt}))
+
+
+def general_answer(prompt, llm):
+    """
+    Resposta GERAL sem histórico, no formato esperado por answer_question. Não grava
+    nada no histórico da conversa: quem chama registra apenas a resposta devolvida.
+    """
+    def chunks():
+        return (chunk.content for chunk in (GENERAL_PROMPT | for_stage(llm, "answer")).stream({"input": prompt}))
+
+    return chunks
+
+
+_END_OF_STREAM = object()
+
+
+class SpeculativeStream:
+    """
+    Consome em segundo plano um iterável de pedaços de texto (ex.: resposta do LLM em
+    streaming) e guarda os pedaços numa fila até alguém ler. cancel() interrompe o
+    consumo e fecha o stream de origem, descartando o trabalho do ramo perdedor. O
+    consumo roda no pool de streams (PIPELINE_STREAM_WORKERS), separado do pool das
+    etapas curtas (PIPELINE_WORKERS).
+
+    Params:
+        chunks_factory: Função sem argumentos que devolve o iterável de pedaços
+    """
+
+    def __init__(self, chunks_factory):
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._future = _stream_executor.submit(self._consume, chunks_factory)
+
+    def _consume(self, chunks_factory):
+        chunks = None
+        try:
+            chunks = chunks_factory()
+            for chunk in chunks:
+                if self._cancelled.is_set():
+                    break
+                self._queue.put(chunk)
+        except Exception as e:
+            self._queue.put(e)
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            self._queue.put(_END_OF_STREAM)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END_OF_STREAM:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def _speculative_sql_intent(prompt, local_intent):
+    """
+    Escolhe a intenção usada para gerar o SQL antes da classificação terminar:
+    o palpite local, ou a categoria não-GERAL mais pontuada quando o palpite é GERAL
+    """
+    if local_intent != "GERAL":
+        return local_intent
+    scores = score_intents(prompt)
+    scores.pop("GERAL")
+    best_intent = max(scores, key=scores.get)
+    return best_intent if scores[best_intent] > 0 else "ESPECÍFICO"
+
+
+def answer_question(prompt, llm, conn, general_answer, speculative=None):
+    """
+    Executa classificação -> SQL -> consulta -> resposta minimizando as chamadas
+    sequenciais ao LLM:
+    - Se o classificador local for confiável, a intenção sai sem chamar o LLM.
+    - Intenção GERAL não gera SQL.
+    - Se for preciso chamar o LLM para classificar, a geração de SQL (com o palpite
+      local) e a resposta GERAL começam em paralelo, e o ramo perdedor é cancelado.
+
+    Params:
+        prompt: Pergunta do usuário
+        llm: Cliente do LLM
+        conn: Engine do banco de dados
+        general_answer: Função sem argumentos que devolve o stream da resposta GERAL
+            (ver general_answer). Pode rodar especulativamente e ser descartada, por
+            isso não deve ter efeitos colaterais como gravar o histórico da conversa
+        speculative: Ativa a execução especulativa (padrão: PIPELINE_SPECULATIVE)
+    Returns:
+        Tupla (intenção, consulta SQL ou None, iterável com os pedaços da resposta)
+    """
+    if speculative is None:
+        speculative = os.getenv("PIPELINE_SPECULATIVE", "true").lower() in ("1", "true", "yes", "sim")
+
+    data_version = get_data_version(conn)
+    local_intent, confidence = classify_intent_locally(prompt)
+
+    if confidence >= get_confidence_threshold():
+        record_local_hit()
+        intent = local_intent
+    elif not speculative:
+        intent = classify_intent_with_llm(prompt, llm)
+        record_llm_fallback(local_intent, intent)
+    else:
+        intent_future = _executor.submit(classify_intent_with_llm, prompt, llm)
+        sql_intent = _speculative_sql_intent(prompt, local_intent)
+        sql_future = _executor.submit(
+            generate_dynamic_query, sql_intent, prompt, llm, data_version=data_version, conn=conn
+        )
+        general_stream = SpeculativeStream(general_answer)
+
+        try:
+            intent = intent_future.result()
+        except Exception:
+            sql_future.cancel()
+            general_stream.cancel()
+            raise
+        record_llm_fallback(local_intent, intent)
+        # print(f"Intenção classificada como: {intent} (especulada: {sql_intent})")
+
+        if intent == "GERAL":
+            # Uma geração em andamento não pode ser interrompida; o resultado é descartado
+            sql_future.cancel()
+            return intent, None, general_stream
+
+        general_stream.cancel()
+        if intent == sql_intent:
+            dynamic_query = sql_future.result()
+        else:
+            sql_future.cancel()
+            dynamic_query = generate_dynamic_query(intent, prompt, llm, data_version=data_version, conn=conn)
+        return intent, dynamic_query, stream_question(prompt, intent, dynamic_query, llm, conn, data_version)
+
+    if intent == "GERAL":
+        return intent, None, general_answer()
+
+    dynamic_query = generate_dynamic_query(intent, prompt, llm, data_version=data_version, conn=conn)
+    return intent, dynamic_query, stream_question(prompt, intent, dynamic_query, llm, conn, data_version)
@@ -0,0 +1,302 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from data_version import subscribe
+
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+
+def normalize_sql(sql):
+    """
+    Normaliza o texto SQL para uso como chave de cache: espaços colapsados, palavras
+    fora de aspas em minúsculas e sem ';' final. Literais e identificadores entre aspas
+    são preservados.
+    """
+    parts = _QUOTED.split(sql.strip().rstrip(";").strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2 == 1:
+            normalized.append(part)
+        else:
+            normalized.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(normalized).strip()
+
+
+def _frame_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class QueryResultCache:
+    """
+    Cache LRU de resultados de consultas (DataFrames) limitado por bytes e com TTL.
+    Opcionalmente persiste os resultados em disco para sobreviver a reinícios, num
+    subdiretório por versão dos dados.
+
+    Params:
+        max_bytes: Memória máxima ocupada pelos DataFrames em cache
+        ttl: Tempo de vida de cada entrada em segundos
+        cache_dir: Diretório para persistência em disco (None desativa)
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=3600, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, sql, version=None):
+        key = normalize_sql(sql)
+        return f"{version}:{key}" if version else key
+
+    def _version_dir(self, version):
+        name = hashlib.sha256(version.encode("utf-8")).hexdigest()[:16] if version else "sem-versao"
+        return os.path.join(self.cache_dir, name)
+
+    def _disk_path(self, key, version=None):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self._version_dir(version), f"{digest}.pkl")
+
+    def _remove_disk_entries(self, keep=None):
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if path == keep:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.endswith(".pkl"):
+                os.remove(path)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def drop_versions_except(self, version):
+        """
+        Remove da memória e do disco as entradas calculadas sobre outra versão dos dados
+        """
+        prefix = f"{version}:"
+        with self._lock:
+            for key in [key for key in self._entries if not key.startswith(prefix)]:
+                self._remove(key)
+        if self.cache_dir:
+            self._remove_disk_entries(keep=self._version_dir(version))
+
+    def _store(self, key, df, created_at):
+        size = _frame_size(df)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (df, size, created_at)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _load_from_disk(self, key, version, now):
+        """
+        Lê a entrada do disco, fora do lock
+
+        Returns:
+            Tupla (DataFrame, criação) ou None se não existe ou expirou
+        """
+        path = self._disk_path(key, version)
+        try:
+            created_at = os.path.getmtime(path)
+            if now - created_at > self.ttl:
+                os.remove(path)
+                return None
+            return pd.read_pickle(path), created_at
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def get(self, sql, version=None):
+        key = self.make_key(sql, version)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                df, _, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return df
+                self._remove(key)
+            if not self.cache_dir:
+                self.misses += 1
+                return None
+
+        loaded = self._load_from_disk(key, version, now)
+        with self._lock:
+            if loaded is None:
+                self.misses += 1
+                return None
+            df, created_at = loaded
+            self._store(key, df, created_at)
+            self.hits += 1
+            return df
+
+    def put(self, sql, df, version=None):
+        key = self.make_key(sql, version)
+        now = time.time()
+        with self._lock:
+            self._store(key, df, now)
+        if self.cache_dir:
+            path = self._disk_path(key, version)
+            # Escrita atômica: a leitura do disco não segura o lock
+            temporary = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                df.to_pickle(temporary)
+                os.replace(temporary, path)
+            except OSError as e:
+                # print(f"Erro ao persistir resultado em cache: {e}")
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.cache_dir:
+            self._remove_disk_entries()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """
+    Retorna o cache de resultados compartilhado por todas as sessões do processo,
+    configurado pelas variáveis QUERY_CACHE_MAX_MB, QUERY_CACHE_TTL e QUERY_CACHE_DIR
+    """
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryResultCache(
+                    max_bytes=int(os.getenv("QUERY_CACHE_MAX_MB", "256")) * 1024 * 1024,
+                    ttl=int(os.getenv("QUERY_CACHE_TTL", "3600")),
+                    cache_dir=os.getenv("QUERY_CACHE_DIR") or None,
+                )
+                subscribe(lambda old, new: _query_cache.drop_versions_except(new))
+    return _query_cache
+
+
+def read_sql_cached(sql, conn, cache=None, version=None, reader=None):
+    """
+    Executa pd.read_sql reaproveitando o resultado em cache quando disponível.
+    O DataFrame devolvido é compartilhado entre sessões e não deve ser modificado.
+
+    Params:
+        sql: Consulta SQL
+        conn: Engine ou conexão do SQLAlchemy
+        cache: Cache a utilizar (padrão: cache compartilhado)
+        version: Versão dos dados (ver data_version.get_data_version) incluída na chave
+        reader: Função (sql, conn) -> DataFrame usada nos misses (padrão: pd.read_sql)
+    Returns:
+        DataFrame com o resultado da consulta
+    """
+    cache = cache or get_query_cache()
+    df = cache.get(sql, version)
+    if df is None:
+        df = (reader or pd.read_sql)(sql, conn)
+        cache.put(sql, df, version)
+    return df
+
+
+class LRUCache:
+    """
+    Cache LRU simples por número de entradas, com TTL e chaves versionadas.
+    Usado para valores pequenos, como o SQL gerado pelo LLM para cada pergunta.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((version, key))
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._entries.move_to_end((version, key))
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[(version, key)]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            self._entries[(version, key)] = (value, time.time())
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def drop_versions_except(self, version):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] != version]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+_generated_sql_cache = None
+
+
+def get_generated_sql_cache():
+    """
+    Retorna o cache compartilhado de SQL gerado, indexado por (intenção, pergunta normalizada)
+    """
+    global _generated_sql_cache
+    if _generated_sql_cache is None:
+        with _query_cache_lock:
+            if _generated_sql_cache is None:
+                _generated_sql_cache = LRUCache(
+                    max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1024")),
+                    ttl=int(os.getenv("SQL_CACHE_TTL", "86400")),
+                )
+                subscribe(lambda old, new: _generated_sql_cache.drop_versions_except(new))
+    return _generated_sql_cache
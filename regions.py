@@ -0,0 +1,72 @@
+import argparse
+
+from sqlalchemy import text
+
+UF_TO_REGION = {
+    'AC': 'Norte', 'AM': 'Norte', 'AP': 'Norte', 'PA': 'Norte', 'RO': 'Norte', 'RR': 'Norte', 'TO': 'Norte',
+    'AL': 'Nordeste', 'BA': 'Nordeste', 'CE': 'Nordeste', 'MA': 'Nordeste', 'PB': 'Nordeste',
+    'PE': 'Nordeste', 'PI': 'Nordeste', 'RN': 'Nordeste', 'SE': 'Nordeste',
+    'GO': 'Centro-Oeste', 'MT': 'Centro-Oeste', 'MS': 'Centro-Oeste', 'DF': 'Centro-Oeste',
+    'SP': 'Sudeste', 'RJ': 'Sudeste', 'MG': 'Sudeste', 'ES': 'Sudeste',
+    'PR': 'Sul', 'RS': 'Sul', 'SC': 'Sul'
+}
+
+REGIONS = ['Norte', 'Nordeste', 'Centro-Oeste', 'Sudeste', 'Sul']
+
+REGION_TABLE = "dim_regiao"
+REGION_TABLES = {
+    "table_agg_inad_consolidado": ["data_base", "regiao"],
+    "projecao_consolidado": ["regiao"],
+}
+
+
+def region_case_sql(column="uf"):
+    """
+    Expressão CASE que mapeia a UF para a região, usada na coluna gerada
+    """
+    whens = "\n".join(
+        f"        WHEN '{uf}' THEN '{region}'" for uf, region in UF_TO_REGION.items()
+    )
+    return f"CASE {column}\n{whens}\n    END"
+
+
+def apply_region_dimension(engine):
+    """
+    Cria a tabela dim_regiao e a coluna gerada e indexada 'regiao' nas tabelas de
+    inadimplência e projeção. A coluna é STORED, então é calculada uma vez por linha na
+    escrita e não a cada consulta. Pode ser executada mais de uma vez.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {REGION_TABLE} (
+                uf CHAR(2) PRIMARY KEY,
+                regiao TEXT NOT NULL
+            )
+        """))
+        connection.execute(
+            text(f"""
+                INSERT INTO {REGION_TABLE} (uf, regiao) VALUES (:uf, :regiao)
+                ON CONFLICT (uf) DO UPDATE SET regiao = EXCLUDED.regiao
+            """),
+            [{"uf": uf, "regiao": region} for uf, region in UF_TO_REGION.items()],
+        )
+        for table, index_columns in REGION_TABLES.items():
+            connection.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS regiao TEXT "
+                f"GENERATED ALWAYS AS ({region_case_sql()}) STORED"
+            ))
+            index_name = f"{table}_{'_'.join(index_columns)}_idx"
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(index_columns)})"
+            ))
+
+
+if __name__ == "__main__":
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Dimensão de regiões")
+    parser.add_argument("command", choices=["apply"])
+    args = parser.parse_args()
+
+    apply_region_dimension(get_engine())
+    print("Coluna 'regiao' e tabela dim_regiao criadas.")
@@ -0,0 +1,311 @@
+import argparse
+import statistics
+import threading
+import time
+
+from sqlalchemy import text
+
+from data_version import get_data_version, get_probe_interval
+from sql_guard import execute_guarded, guard_query, tokenize_sql
+
+BASE_TABLE = "table_agg_inad_consolidado"
+
+BASE_DIMENSIONS = ["data_base", "regiao", "uf", "cliente", "ocupacao", "cnae_secao", "porte", "modalidade"]
+SUM_MEASURES = [
+    "soma_a_vencer_ate_90_dias",
+    "soma_numero_de_operacoes",
+    "soma_carteira_ativa",
+    "soma_carteira_inadimplida_arrastada",
+    "soma_ativo_problematico",
+]
+MIN_MEASURES = [column.replace("soma_", "min_", 1) for column in SUM_MEASURES]
+MAX_MEASURES = [column.replace("soma_", "max_", 1) for column in SUM_MEASURES]
+# Médias não podem ser reagregadas sem a contagem original; consultas que as usam vão à tabela base
+AVG_MEASURES = [column.replace("soma_", "media_", 1) for column in SUM_MEASURES]
+BASE_COLUMNS = set(BASE_DIMENSIONS + SUM_MEASURES + MIN_MEASURES + MAX_MEASURES + AVG_MEASURES)
+
+MEASURE_AGGREGATES = {
+    **{column: "sum" for column in SUM_MEASURES},
+    **{column: "min" for column in MIN_MEASURES},
+    **{column: "max" for column in MAX_MEASURES},
+}
+
+# Da menor para a maior: o roteador escolhe a primeira que cobre a consulta.
+# A regiao depende só da UF, então acompanha a uf sem aumentar o número de linhas.
+ROLLUPS = [
+    {"name": "rollup_mes_cliente_porte", "dimensions": ["data_base", "cliente", "porte"]},
+    {"name": "rollup_mes_regiao_cliente", "dimensions": ["data_base", "regiao", "cliente"]},
+    {"name": "rollup_mes_uf_cliente", "dimensions": ["data_base", "regiao", "uf", "cliente"]},
+    {"name": "rollup_mes_cliente_modalidade", "dimensions": ["data_base", "cliente", "modalidade"]},
+    {"name": "rollup_mes_cliente_cnae", "dimensions": ["data_base", "cliente", "cnae_secao"]},
+    {"name": "rollup_mes_cliente_ocupacao", "dimensions": ["data_base", "cliente", "ocupacao"]},
+    {"name": "rollup_mes_uf_cliente_porte", "dimensions": ["data_base", "regiao", "uf", "cliente", "porte"]},
+    {"name": "rollup_mes_uf_cliente_modalidade", "dimensions": ["data_base", "regiao", "uf", "cliente", "modalidade"]},
+]
+
+STATUS_TABLE = "rollup_status"
+
+_available_lock = threading.Lock()
+_available = {"version": None, "names": frozenset(), "checked_at": 0.0}
+
+
+def build_rollup_sql(rollup):
+    """
+    Monta o SELECT que materializa uma rollup a partir da tabela base
+    """
+    dimensions = ", ".join(rollup["dimensions"])
+    measures = ",\n    ".join(
+        f"{aggregate.upper()}({column}) AS {column}" for column, aggregate in MEASURE_AGGREGATES.items()
+    )
+    return (
+        f"SELECT {dimensions},\n    {measures},\n    COUNT(*) AS qtd_linhas_base\n"
+        f"FROM {BASE_TABLE}\nGROUP BY {dimensions}"
+    )
+
+
+def create_rollups(engine):
+    """
+    Cria as materialized views de rollup, seus índices e a tabela de controle de versão
+    """
+    with engine.begin() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {STATUS_TABLE} (
+                nome TEXT PRIMARY KEY,
+                data_version TEXT NOT NULL,
+                atualizado_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """))
+        for rollup in ROLLUPS:
+            name = rollup["name"]
+            dimensions = ", ".join(rollup["dimensions"])
+            connection.execute(text(
+                f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS\n{build_rollup_sql(rollup)}\nWITH NO DATA"
+            ))
+            connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_pk ON {name} ({dimensions})"))
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name}_data_base ON {name} (data_base)"))
+
+
+def refresh_rollups(engine, names=None):
+    """
+    Atualiza as rollups e registra a versão dos dados sobre a qual foram calculadas.
+    Views já populadas são atualizadas com CONCURRENTLY para não bloquear leituras.
+
+    Params:
+        engine: Engine do SQLAlchemy
+        names: Rollups a atualizar (padrão: todas)
+    Returns:
+        Dicionário {rollup: segundos gastos}
+    """
+    data_version = get_data_version(engine, force=True)
+    timings = {}
+    for rollup in ROLLUPS:
+        name = rollup["name"]
+        if names and name not in names:
+            continue
+        start = time.perf_counter()
+        with engine.connect() as connection:
+            populated = connection.execute(
+                text("SELECT ispopulated FROM pg_matviews WHERE matviewname = :name"), {"name": name}
+            ).scalar()
+        with engine.begin() as connection:
+            concurrently = "CONCURRENTLY " if populated else ""
+            connection.execute(text(f"REFRESH MATERIALIZED VIEW {concurrently}{name}"))
+            connection.execute(text(f"""
+                INSERT INTO {STATUS_TABLE} (nome, data_version, atualizado_em)
+                VALUES (:name, :version, NOW())
+                ON CONFLICT (nome) DO UPDATE
+                SET data_version = EXCLUDED.data_version, atualizado_em = EXCLUDED.atualizado_em
+            """), {"name": name, "version": data_version})
+        timings[name] = time.perf_counter() - start
+    with _available_lock:
+        _available["version"] = None
+    return timings
+
+
+def get_available_rollups(engine, data_version):
+    """
+    Retorna as rollups atualizadas na versão de dados corrente. O resultado é
+    reaproveitado enquanto a versão dos dados não mudar, por no máximo
+    DATA_VERSION_INTERVAL segundos, para que rollups criadas ou atualizadas por outro
+    processo (python rollups.py refresh) passem a ser usadas sem reiniciar o app.
+    """
+    now = time.monotonic()
+    with _available_lock:
+        if _available["version"] == data_version and now - _available["checked_at"] < get_probe_interval():
+            return _available["names"]
+    try:
+        with engine.connect() as connection:
+            rows = connection.execute(
+                text(f"SELECT nome FROM {STATUS_TABLE} WHERE data_version = :version"),
+                {"version": data_version},
+            ).fetchall()
+        names = frozenset(row[0] for row in rows)
+    except Exception as e:
+        # print(f"Rollups indisponíveis: {e}")
+        names = frozenset()
+    with _available_lock:
+        _available["version"] = data_version
+        _available["names"] = names
+        _available["checked_at"] = now
+    return names
+
+
+def _referenced_columns(tokens):
+    """
+    Retorna as colunas da tabela base usadas na consulta, ou None se alguma medida
+    aparecer fora de uma agregação reagregável (ex.: AVG, expressão, coluna solta)
+    """
+    columns = set()
+    for i, (kind, value, _, _) in enumerate(tokens):
+        if kind == "symbol" and value == "*":
+            previous = tokens[i - 1][1].lower() if i > 0 else ""
+            following = tokens[i + 1][1] if i + 1 < len(tokens) else ""
+            if previous in ("select", ",", ".", "(") or following == ")":
+                return None
+        if kind not in ("word", "ident"):
+            continue
+        column = value.strip('"').lower()
+        if column not in BASE_COLUMNS:
+            continue
+        if i > 0 and tokens[i - 1][1].lower() == "as":
+            # Definição de alias com o mesmo nome da coluna (ex.: SUM(x) AS x)
+            continue
+        # Referências qualificadas (ex.: t.uf) contam como a própria coluna
+        columns.add(column)
+        if column in BASE_DIMENSIONS:
+            continue
+        aggregate = MEASURE_AGGREGATES.get(column)
+        if aggregate is None:
+            return None
+        start = i - 1
+        if start > 0 and tokens[start][1] == ".":
+            start -= 2
+        if (
+            start < 1
+            or tokens[start][1] != "("
+            or tokens[start - 1][1].lower() != aggregate
+            or i + 1 >= len(tokens)
+            or tokens[i + 1][1] != ")"
+        ):
+            return None
+    return columns
+
+
+def route_query(sql, available):
+    """
+    Reescreve a consulta para ler da menor rollup que contenha todas as dimensões
+    usadas, desde que as medidas apareçam apenas como SUM(soma_*), MIN(min_*) ou MAX(max_*).
+    Consultas que não se encaixam são devolvidas sem alteração.
+
+    Params:
+        sql: Consulta SQL sobre a tabela base
+        available: Nomes das rollups atualizadas (ver get_available_rollups)
+    Returns:
+        Tupla (SQL a executar, nome da rollup ou None)
+    """
+    if not available:
+        return sql, None
+
+    tokens = tokenize_sql(sql)
+    table_positions = [
+        (start, end) for kind, value, start, end in tokens
+        if kind == "word" and value.lower() == BASE_TABLE
+    ]
+    if not table_positions:
+        return sql, None
+    if any(value.lower() == "count" for kind, value, _, _ in tokens if kind == "word"):
+        return sql, None
+
+    columns = _referenced_columns(tokens)
+    if columns is None:
+        return sql, None
+    dimensions = columns & set(BASE_DIMENSIONS)
+
+    for rollup in ROLLUPS:
+        if rollup["name"] in available and dimensions <= set(rollup["dimensions"]):
+            routed = []
+            last = 0
+            for start, end in table_positions:
+                routed.append(sql[last:start])
+                routed.append(rollup["name"])
+                last = end
+            routed.append(sql[last:])
+            return "".join(routed), rollup["name"]
+    return sql, None
+
+
+def execute_routed(sql, engine, data_version):
+    """
+    Executa a consulta na rollup escolhida por route_query, voltando à tabela base
+    se a versão roteada falhar
+    """
+    routed_sql, rollup = route_query(sql, get_available_rollups(engine, data_version))
+    if rollup is not None:
+        try:
+            return execute_guarded(routed_sql, engine)
+        except Exception as e:
+            # print(f"Falha na rollup {rollup}, usando tabela base: {e}")
+            pass
+    return execute_guarded(sql, engine)
+
+
+BENCHMARK_QUERIES = [
+    f"SELECT uf, SUM(soma_carteira_inadimplida_arrastada) AS inadimplencia FROM {BASE_TABLE} "
+    "WHERE data_base = '2024-12-31' GROUP BY uf ORDER BY inadimplencia DESC LIMIT 5",
+    f"SELECT cliente, SUM(soma_numero_de_operacoes) AS operacoes FROM {BASE_TABLE} "
+    "WHERE data_base = '2024-12-31' GROUP BY cliente",
+    f"SELECT modalidade, SUM(soma_carteira_inadimplida_arrastada) / NULLIF(SUM(soma_carteira_ativa), 0) * 100 "
+    f"AS taxa FROM {BASE_TABLE} WHERE data_base = '2024-12-31' GROUP BY modalidade ORDER BY taxa DESC",
+    f"SELECT data_base, SUM(soma_carteira_inadimplida_arrastada) AS inadimplencia FROM {BASE_TABLE} "
+    "GROUP BY data_base ORDER BY data_base",
+    f"SELECT porte, SUM(soma_ativo_problematico) AS ativo_problematico FROM {BASE_TABLE} "
+    "WHERE cliente = 'PF' AND data_base = '2024-12-31' GROUP BY porte",
+]
+
+
+def benchmark(engine, queries=BENCHMARK_QUERIES, repeat=5):
+    """
+    Compara a latência de cada consulta na tabela base e na rollup roteada
+
+    Returns:
+        Lista de dicionários com a rollup usada e as medianas em milissegundos
+    """
+    data_version = get_data_version(engine, force=True)
+    available = get_available_rollups(engine, data_version)
+    results = []
+    for sql in queries:
+        guarded = guard_query(sql)
+        routed, rollup = route_query(guarded, available)
+        timings = {}
+        for label, query in (("base", guarded), ("rollup", routed)):
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                execute_guarded(query, engine, max_cost=0)
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[label] = statistics.median(samples)
+        results.append({"sql": sql, "rollup": rollup, "base_ms": timings["base"], "rollup_ms": timings["rollup"]})
+    return results
+
+
+if __name__ == "__main__":
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Rollups de inadimplência")
+    parser.add_argument("command", choices=["create", "refresh", "benchmark"])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == "create":
+        create_rollups(engine)
+        print("Rollups criadas. Execute 'refresh' para populá-las.")
+    elif args.command == "refresh":
+        for name, seconds in refresh_rollups(engine).items():
+            print(f"- {name}: {seconds:.2f}s")
+    else:
+        for result in benchmark(engine, repeat=args.repeat):
+            speedup = result["base_ms"] / result["rollup_ms"] if result["rollup_ms"] else 0
+            print(f"- {result['rollup'] or 'tabela base'}: base {result['base_ms']:.1f} ms, "
+                  f"rollup {result['rollup_ms']:.1f} ms ({speedup:.1f}x)")
+            print(f"  {result['sql']}")
@@ -0,0 +1,317 @@
+import logging
+import re
+import threading
+
+from sqlalchemy import text
+
+from date_columns import DATE_COLUMNS
+from intent_classifier import normalize_question
+from regions import REGION_TABLE, region_case_sql
+
+logger = logging.getLogger(__name__)
+
+BASE_TABLE = "table_agg_inad_consolidado"
+PROJECTION_TABLE = "projecao_consolidado"
+
+# Descrições usadas nos prompts; colunas do banco sem descrição só entram se citadas na pergunta
+COLUMN_DESCRIPTIONS = {
+    BASE_TABLE: {
+        "data_base": "data de referência dos dados, formato 'YYYY-MM-DD'",
+        "uf": "unidade federativa, siglas dos estados brasileiros",
+        "regiao": "região da UF: Norte, Nordeste, Centro-Oeste, Sudeste, Sul",
+        "cliente": "tipo de cliente: PF ou PJ",
+        "ocupacao": "ocupações para PF",
+        "cnae_secao": "setores de atuação para PJ",
+        "porte": "porte do cliente: Pequeno, Médio, Grande",
+        "modalidade": "modalidade da operação de crédito",
+        "soma_a_vencer_ate_90_dias": "soma dos valores a vencer em até 90 dias",
+        "soma_numero_de_operacoes": "soma do número de operações",
+        "soma_carteira_ativa": "soma da carteira ativa total",
+        "soma_carteira_inadimplida_arrastada": "soma da carteira inadimplida arrastada, considerada a dívida",
+        "soma_ativo_problematico": "soma dos ativos problemáticos",
+    },
+    PROJECTION_TABLE: {
+        DATE_COLUMNS[PROJECTION_TABLE]["column"]: "data da projeção, tipo DATE, indexada",
+        "ano_mes": "a mesma data como texto no formato 'DD/MM/YYYY'; use apenas para exibição",
+        "porte": "porte do cliente: Pequeno, Médio, Grande",
+        "uf": "unidade federativa, siglas dos estados brasileiros",
+        "regiao": "região da UF: Norte, Nordeste, Centro-Oeste, Sudeste, Sul",
+        "cliente": "tipo de cliente: PF ou PJ",
+        "modalidade": "modalidade da operação de crédito",
+        "tipo": "tipo de cliente: PF ou PJ, ou 'previsão' para projeções",
+        "soma_ativo_problematico": "soma dos ativos problemáticos",
+        "soma_carteira_inadimplida_arrastada": "soma da carteira inadimplida arrastada",
+    },
+}
+
+# Variantes das medidas (media_*, min_*, max_*) só entram no prompt quando a pergunta as pede
+VARIANT_PATTERNS = {
+    "media_": re.compile(r"\bmedi(a|as|o|os)\b"),
+    "min_": re.compile(r"\bminim[oa]s?\b"),
+    "max_": re.compile(r"\bmaxim[oa]s?\b"),
+}
+VARIANT_DESCRIPTIONS = {"media_": "média", "min_": "mínimo", "max_": "máximo"}
+
+INTENT_RULES = {
+    "RANKING": "Para RANKING, use ORDER BY e LIMIT para identificar o maior/menor.",
+    "COMPARAÇÃO": "Para COMPARAÇÃO, use GROUP BY para os itens comparados.",
+    "ESPECÍFICO": "Para ESPECÍFICO, use filtros WHERE adequados (ex.: uf='SP', cliente='PJ').",
+    "TENDÊNCIA": "Para TENDÊNCIA, agrupe por data_base e ordene cronologicamente.",
+}
+
+# Regras aplicadas apenas quando a pergunta (normalizada) casa com o padrão
+_PERCENT = re.compile(r"percent|%")
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+_REGION = re.compile(r"\bregi(ao|oes)\b")
+_DATE = re.compile(r"\b\d{1,2}/\d{4}\b|\b(19|20)\d{2}\b")
+# Períodos relativos ("últimos 6 meses", "ao longo do tempo"): a data padrão não se aplica
+_RELATIVE_PERIOD = re.compile(
+    r"\b(ultim[oa]s?|passad[oa]s?|anterior(es)?|desde|ao longo|evolu\w*|historic\w*|mes a mes|ano a ano)\b"
+)
+
+PERCENT_RULE = (
+    "Se a pergunta mencionar \"percentual\" ou \"%\", calcule a porcentagem dividindo o valor específico "
+    "(ex.: soma_carteira_inadimplida_arrastada para um filtro específico) pelo total geral "
+    "(ex.: soma_carteira_inadimplida_arrastada sem filtros adicionais além de {date_column}) "
+    "e multiplique por 100, retornando o resultado como uma coluna chamada \"percentual\"."
+)
+REGION_RULE = "Se a pergunta mencionar \"região\" ou \"regiões\", filtre ou agrupe pela coluna regiao."
+# Sem a coluna regiao (regions.py apply não executado): tabela dim_regiao ou expressão CASE
+REGION_JOIN_RULE = (
+    "Se a pergunta mencionar \"região\" ou \"regiões\", faça JOIN com a tabela {region_table} (colunas uf e "
+    "regiao) em {region_table}.uf = {table}.uf e filtre ou agrupe por {region_table}.regiao; a tabela {table} "
+    "não tem a coluna regiao."
+)
+REGION_CASE_RULE = (
+    "Se a pergunta mencionar \"região\" ou \"regiões\", calcule a região com a expressão {expression} e "
+    "filtre ou agrupe por ela; a tabela {table} não tem a coluna regiao."
+)
+
+_catalog_lock = threading.Lock()
+_catalog = {"version": None, "columns": None}
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _static_catalog():
+    return {
+        table: [(column, None) for column in descriptions]
+        for table, descriptions in COLUMN_DESCRIPTIONS.items()
+    }
+
+
+def load_schema_catalog(engine):
+    """
+    Lê do information_schema as colunas e tipos das tabelas usadas nos prompts e da
+    tabela de regiões (vazia se ainda não foi criada)
+
+    Returns:
+        Dicionário {tabela: [(coluna, tipo), ...]} na ordem das colunas da tabela
+    """
+    query = text("""
+        SELECT table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name IN :tables
+        ORDER BY table_name, ordinal_position
+    """).bindparams(tables=tuple(COLUMN_DESCRIPTIONS) + (REGION_TABLE,))
+    catalog = {table: [] for table in (*COLUMN_DESCRIPTIONS, REGION_TABLE)}
+    with engine.connect() as connection:
+        for table, column, data_type in connection.execute(query):
+            catalog[table].append((column, data_type))
+    return catalog
+
+
+def get_schema_catalog(engine=None, data_version=None):
+    """
+    Retorna o catálogo de colunas, lido do banco uma vez por versão dos dados. Sem engine,
+    ou se a leitura falhar, usa as colunas descritas em COLUMN_DESCRIPTIONS.
+    """
+    if engine is None:
+        return _static_catalog()
+    with _catalog_lock:
+        if _catalog["columns"] is not None and _catalog["version"] == data_version:
+            return _catalog["columns"]
+    try:
+        columns = load_schema_catalog(engine)
+        if not any(columns.values()):
+            columns = _static_catalog()
+    except Exception:
+        logger.exception("Falha ao ler o information_schema, usando o catálogo estático")
+        columns = _static_catalog()
+    with _catalog_lock:
+        _catalog["version"] = data_version
+        _catalog["columns"] = columns
+    return columns
+
+
+def _variant_description(column, descriptions):
+    for prefix, label in VARIANT_DESCRIPTIONS.items():
+        if column.startswith(prefix):
+            measure = "soma_" + column[len(prefix):]
+            if measure in descriptions:
+                return f"{label} por linha de {measure}"
+    return None
+
+
+def relevant_columns(table, question, catalog):
+    """
+    Colunas da tabela que entram no prompt: as descritas em COLUMN_DESCRIPTIONS, as
+    variantes media_/min_/max_ pedidas na pergunta e as citadas pelo nome
+
+    Returns:
+        Lista de tuplas (coluna, tipo, descrição ou None)
+    """
+    normalized = normalize_question(question)
+    descriptions = COLUMN_DESCRIPTIONS.get(table, {})
+    prefixes = [prefix for prefix, pattern in VARIANT_PATTERNS.items() if pattern.search(normalized)]
+    columns = []
+    for column, data_type in catalog.get(table, []):
+        if column in descriptions:
+            columns.append((column, data_type, descriptions[column]))
+        elif any(column.startswith(prefix) for prefix in prefixes):
+            columns.append((column, data_type, _variant_description(column, descriptions)))
+        elif re.search(rf"\b{re.escape(column)}\b", normalized):
+            columns.append((column, data_type, None))
+    return columns
+
+
+def region_rule(table, columns, catalog):
+    """
+    Regra de região conforme o esquema: a coluna regiao quando a tabela a tem, senão um
+    JOIN com dim_regiao quando ela existe, senão a expressão CASE sobre uf
+    """
+    if any(column == "regiao" for column, _, _ in columns):
+        return REGION_RULE
+    if catalog.get(REGION_TABLE):
+        return REGION_JOIN_RULE.format(region_table=REGION_TABLE, table=table)
+    expression = " ".join(region_case_sql("uf").split())
+    return REGION_CASE_RULE.format(expression=expression, table=table)
+
+
+def _render_columns(columns):
+    lines = []
+    for column, data_type, description in columns:
+        details = "; ".join(part for part in (data_type, description) if part)
+        lines.append(f"- {column} ({details})" if details else f"- {column}")
+    return "\n".join(lines)
+
+
+def render_sql_prompt(intent, question, table_name=BASE_TABLE, catalog=None):
+    """
+    Monta o prompt de sistema da geração de SQL apenas com as colunas e regras relevantes
+    para a intenção e para as entidades citadas na pergunta
+
+    Params:
+        intent: Intenção classificada
+        question: Pergunta do usuário
+        table_name: Tabela das perguntas que não são de projeção
+        catalog: Catálogo de get_schema_catalog (padrão: estático)
+    Returns:
+        Texto do prompt, com as chaves escapadas para o ChatPromptTemplate
+    """
+    catalog = catalog or _static_catalog()
+    normalized = normalize_question(question)
+    projection = intent == "PROJEÇÃO"
+    table = PROJECTION_TABLE if projection else table_name
+    date_column = DATE_COLUMNS[PROJECTION_TABLE]["column"] if projection else "data_base"
+    columns = relevant_columns(table, question, catalog)
+    # Sem a coluna gerada (date_columns.py apply não executado) as datas vêm de ano_mes
+    typed_dates = not projection or any(column == date_column for column, _, _ in columns)
+    if not typed_dates:
+        columns = [
+            (column, data_type, "data da projeção, formato 'DD/MM/YYYY', tipo texto" if column == "ano_mes" else description)
+            for column, data_type, description in columns
+        ]
+
+    lines = [
+        "Você é um especialista em SQL que transforma perguntas sobre inadimplência em consultas SQL "
+        "precisas para um banco PostgreSQL.",
+        "",
+        f"A tabela principal se chama '{table}' e contém as seguintes colunas:",
+        _render_columns(columns),
+        "",
+    ]
+    rules = []
+    if projection and not typed_dates:
+        date_column = "TO_DATE(ano_mes, 'DD/MM/YYYY')"
+        rules.append(f"Use {date_column} para converter ano_mes em data.")
+    elif projection:
+        rules.append(
+            f"Use a coluna {date_column} em filtros, agrupamentos e ordenações por data (ex.: {date_column} "
+            f"BETWEEN NOW()::date AND (NOW() + INTERVAL '90 days')::date). Nunca aplique TO_DATE ou outras "
+            f"funções sobre ano_mes."
+        )
+    if projection:
+        rules += [
+            "Use NOW() para a data atual e NOW() + INTERVAL 'X days' para projeções futuras (ex.: '90 days').",
+            f"Filtre {date_column} para o período solicitado (ex.: próximos 90 dias a partir de hoje).",
+            "Filtre apenas registros onde tipo = 'previsão'.",
+            "Agregue valores (ex.: SUM) quando necessário para totais.",
+        ]
+    else:
+        lines += [f"A intenção do usuário foi classificada como: {intent}", ""]
+        if intent in INTENT_RULES:
+            rules.append(INTENT_RULES[intent])
+        rules += [
+            "Sempre inclua filtros ou agregações (ex.: SUM) para garantir resultados totais e precisos.",
+            "Use o formato de data 'YYYY-MM-DD' (ex.: '2021-10-31') para o campo data_base.",
+        ]
+        if _DATE.search(normalized):
+            rules.append(
+                "Se a pergunta fornecer uma data no formato 'MM/YYYY' (ex.: '10/2021'), converta para "
+                "'YYYY-MM-DD' assumindo o último dia do mês (ex.: '2021-10-31')."
+            )
+        elif intent != "TENDÊNCIA" and not _RELATIVE_PERIOD.search(normalized):
+            rules.append("Se a pergunta não especificar um período, use apenas dados de '2024-12-31'.")
+    if _PERCENT.search(normalized):
+        rules.append(PERCENT_RULE.format(date_column=date_column))
+    if _REGION.search(normalized):
+        rules.append(region_rule(table, columns, catalog))
+    rules.append("Certifique-se de que a consulta seja sintaticamente correta e compatível com PostgreSQL.")
+
+    lines.append("Com base na pergunta abaixo, gere uma consulta SQL válida que retorne os dados necessários:")
+    lines += [f"- {rule}" for rule in rules]
+    lines += ["", "IMPORTANTE: Retorne APENAS o código SQL, sem explicações ou comentários."]
+    return "\n".join(lines).replace("{", "{{").replace("}", "}}")
+
+
+def count_tokens(prompt):
+    """
+    Estimativa do número de tokens do texto: cada pontuação conta um token e cada palavra
+    um token a cada 4 caracteres, proporção típica dos tokenizadores BPE. O tokenizador do
+    DeepSeek não está disponível localmente; a estimativa serve para comparar prompts.
+    """
+    return sum(
+        (len(piece) + 3) // 4 if piece[0].isalnum() or piece[0] == "_" else 1
+        for piece in _TOKEN_PIECES.findall(prompt)
+    )
+
+
+def record_prompt_tokens(intent, tokens):
+    """
+    Registra o tamanho do prompt de uma chamada de geração de SQL
+    """
+    with _stats_lock:
+        entry = _stats.setdefault(intent, {"calls": 0, "tokens": 0, "last": 0})
+        entry["calls"] += 1
+        entry["tokens"] += tokens
+        entry["last"] = tokens
+    logger.info("Prompt de SQL (%s): %d tokens", intent, tokens)
+
+
+def get_prompt_stats():
+    """
+    Retorna, por intenção, o número de chamadas, o total e a média de tokens dos prompts
+    de geração de SQL e o tamanho do último prompt
+    """
+    with _stats_lock:
+        stats = {intent: dict(entry) for intent, entry in _stats.items()}
+    for entry in stats.values():
+        entry["mean"] = entry["tokens"] / entry["calls"] if entry["calls"] else 0.0
+    return stats
+
+
+def reset_prompt_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,362 @@
+import argparse
+import json
+import os
+import re
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+from data_version import get_data_version
+
+# Tabela -> coluna de particionamento
+SNAPSHOT_TABLES = {
+    "table_agg_inad_consolidado": "data_base",
+    "projecao_consolidado": "ano_mes",
+}
+
+MANIFEST_FILE = "manifest.json"
+
+# Partição das linhas com a coluna de partição nula
+NULL_PARTITION = "__null__"
+
+
+def get_snapshot_dir():
+    return os.getenv("SNAPSHOT_DIR", os.path.join("data", "snapshot"))
+
+
+def _table_dir(table, snapshot_dir=None):
+    return os.path.join(snapshot_dir or get_snapshot_dir(), table)
+
+
+def _partition_file(partition):
+    return re.sub(r"[^0-9A-Za-z_-]", "-", partition) + ".parquet"
+
+
+def load_manifest(table, snapshot_dir=None):
+    path = os.path.join(_table_dir(table, snapshot_dir), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"partitions": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(table, manifest, snapshot_dir=None):
+    directory = _table_dir(table, snapshot_dir)
+    temporary = os.path.join(directory, MANIFEST_FILE + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temporary, os.path.join(directory, MANIFEST_FILE))
+
+
+def get_column_type(connection, table, column):
+    """
+    Tipo da coluna no banco (ex.: 'date', 'character varying(7)'), usado para comparar a
+    coluna com o valor em texto da partição sem converter a coluna e perder o índice
+    """
+    return connection.execute(
+        text("SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+             "WHERE attrelid = CAST(:tabela AS regclass) AND attname = :coluna"),
+        {"tabela": table, "coluna": column},
+    ).scalar_one()
+
+
+def _write_partition(directory, partition, df):
+    file_name = _partition_file(partition)
+    temporary = os.path.join(directory, file_name + ".tmp")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temporary)
+    os.replace(temporary, os.path.join(directory, file_name))
+    return file_name
+
+
+def fetch_partition_fingerprints(conn, table, partition_column):
+    """
+    Calcula no servidor uma impressão digital de cada partição, transferindo apenas uma
+    linha por partição. A impressão é a contagem de linhas e o maior xmin (transação que
+    gravou a versão da linha): uma inclusão ou alteração grava linhas com um xmin novo e
+    uma exclusão muda a contagem. Não serializa nem calcula hash das linhas, então custa
+    bem menos que recalcular os agregados. As linhas com a coluna de partição nula ficam
+    em NULL_PARTITION.
+
+    Returns:
+        Dicionário {partição: impressão digital}
+    """
+    query = text(f"""
+        SELECT {partition_column}::text AS particao,
+               COUNT(*) AS linhas,
+               MAX(xmin::text::bigint) AS ultima_transacao
+        FROM {table}
+        GROUP BY {partition_column}
+    """)
+    with conn.connect() as connection:
+        rows = connection.execute(query).fetchall()
+    return {NULL_PARTITION if row[0] is None else row[0]: f"{row[1]}|{row[2]}" for row in rows}
+
+
+def sync_table(conn, table, snapshot_dir=None):
+    """
+    Sincroniza o snapshot local de uma tabela: baixa apenas as partições novas ou
+    alteradas e remove as que deixaram de existir no banco
+
+    Params:
+        conn: Engine do SQLAlchemy
+        table: Nome da tabela (ver SNAPSHOT_TABLES)
+        snapshot_dir: Diretório do snapshot (padrão: SNAPSHOT_DIR)
+    Returns:
+        Dicionário com as partições baixadas, removidas e inalteradas
+    """
+    partition_column = SNAPSHOT_TABLES[table]
+    directory = _table_dir(table, snapshot_dir)
+    os.makedirs(directory, exist_ok=True)
+
+    manifest = load_manifest(table, snapshot_dir)
+    local = manifest["partitions"]
+    # Versão lida antes dos dados: se o banco mudar durante a sincronização, o snapshot
+    # fica marcado com a versão antiga e não é usado como se estivesse atualizado
+    data_version = get_data_version(conn, force=True)
+    remote = fetch_partition_fingerprints(conn, table, partition_column)
+    with conn.connect() as connection:
+        column_type = get_column_type(connection, table, partition_column)
+
+    downloaded = []
+    for partition, fingerprint in sorted(remote.items()):
+        entry = local.get(partition)
+        if entry is not None and entry["fingerprint"] == fingerprint \
+                and os.path.exists(os.path.join(directory, entry["file"])):
+            continue
+        if partition == NULL_PARTITION:
+            df = pd.read_sql(text(f"SELECT * FROM {table} WHERE {partition_column} IS NULL"), conn)
+        else:
+            # O valor é convertido para o tipo da coluna, e não o contrário, para usar o índice
+            df = pd.read_sql(
+                text(f"SELECT * FROM {table} WHERE {partition_column} = CAST(:particao AS {column_type})"),
+                conn,
+                params={"particao": partition},
+            )
+        file_name = _write_partition(directory, partition, df)
+        local[partition] = {"fingerprint": fingerprint, "file": file_name, "rows": len(df)}
+        downloaded.append(partition)
+
+    removed = [partition for partition in local if partition not in remote]
+    for partition in removed:
+        path = os.path.join(directory, local.pop(partition)["file"])
+        if os.path.exists(path):
+            os.remove(path)
+
+    manifest["synced_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    manifest["data_version"] = data_version
+    _save_manifest(table, manifest, snapshot_dir)
+    return {
+        "downloaded": downloaded,
+        "removed": removed,
+        "unchanged": len(remote) - len(downloaded),
+    }
+
+
+def write_snapshot(table, df, data_version, snapshot_dir=None):
+    """
+    Grava um DataFrame como snapshot completo da tabela, no mesmo formato de sync_table,
+    sem consultar o banco (ex.: bases sintéticas de benchmark). Substitui o snapshot
+    existente da tabela.
+
+    Params:
+        table: Nome da tabela (ver SNAPSHOT_TABLES)
+        df: Dados da tabela
+        data_version: Versão dos dados registrada no manifesto
+        snapshot_dir: Diretório do snapshot (padrão: SNAPSHOT_DIR)
+    """
+    partition_column = SNAPSHOT_TABLES[table]
+    directory = _table_dir(table, snapshot_dir)
+    os.makedirs(directory, exist_ok=True)
+
+    partitions = {}
+    keys = df[partition_column].astype(str).where(df[partition_column].notna(), NULL_PARTITION)
+    for partition, rows in df.groupby(keys, sort=True):
+        file_name = _write_partition(directory, partition, rows)
+        # Não é comparável à impressão calculada no banco: sync_table baixa a partição de novo
+        fingerprint = f"{len(rows)}|{int(pd.util.hash_pandas_object(rows, index=False).sum())}"
+        partitions[partition] = {"fingerprint": fingerprint, "file": file_name, "rows": len(rows)}
+
+    files = {entry["file"] for entry in partitions.values()}
+    for name in os.listdir(directory):
+        if name.endswith(".parquet") and name not in files:
+            os.remove(os.path.join(directory, name))
+
+    _save_manifest(table, {
+        "partitions": partitions,
+        "synced_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data_version": data_version,
+    }, snapshot_dir)
+
+
+def sync_snapshot(conn, tables=None, snapshot_dir=None):
+    """
+    Sincroniza todas as tabelas do snapshot
+    """
+    return {
+        table: sync_table(conn, table, snapshot_dir)
+        for table in (tables or SNAPSHOT_TABLES)
+    }
+
+
+def has_snapshot(table, snapshot_dir=None):
+    return bool(load_manifest(table, snapshot_dir)["partitions"])
+
+
+def snapshot_matches(data_version, tables=None):
+    """
+    Indica se o snapshot local das tabelas (padrão: todas) foi sincronizado na versão de
+    dados corrente
+    """
+    return all(
+        load_manifest(table).get("data_version") == data_version for table in (tables or SNAPSHOT_TABLES)
+    )
+
+
+def use_snapshot(conn, table, data_version=None):
+    """
+    Indica se a tabela deve ser lida do snapshot local: ele existe e foi sincronizado na
+    versão corrente dos dados. Um snapshot antigo é ignorado e a leitura vai ao banco.
+
+    Params:
+        conn: Engine usada para consultar a versão dos dados
+        table: Nome da tabela
+        data_version: Versão corrente (padrão: data_version.get_data_version)
+    """
+    if not has_snapshot(table):
+        return False
+    if data_version is None:
+        data_version = get_data_version(conn)
+    return snapshot_matches(data_version, [table])
+
+
+def list_partitions(table, snapshot_dir=None):
+    return sorted(load_manifest(table, snapshot_dir)["partitions"])
+
+
+def read_snapshot(table, columns=None, partitions=None, snapshot_dir=None):
+    """
+    Lê o snapshot local de uma tabela, carregando só as colunas e partições pedidas
+
+    Params:
+        table: Nome da tabela
+        columns: Colunas a carregar (padrão: todas)
+        partitions: Valores da coluna de partição a carregar (padrão: todas)
+        snapshot_dir: Diretório do snapshot (padrão: SNAPSHOT_DIR)
+    Returns:
+        DataFrame com os dados
+    """
+    directory = _table_dir(table, snapshot_dir)
+    entries = load_manifest(table, snapshot_dir)["partitions"]
+    selected = entries if partitions is None else {
+        partition: entries[partition] for partition in partitions if partition in entries
+    }
+    files = [os.path.join(directory, entry["file"]) for _, entry in sorted(selected.items())]
+    if not files:
+        return pd.DataFrame(columns=columns) if columns else pd.DataFrame()
+    dataset = ds.dataset(files, format="parquet")
+    return dataset.to_table(columns=columns).to_pandas()
+
+
+def load_table(conn, table, columns=None, partitions=None, data_version=None):
+    """
+    Carrega a tabela do snapshot local quando ele está na versão corrente dos dados, ou
+    do banco caso contrário
+
+    Params:
+        conn: Engine usada quando não há snapshot atualizado
+        table: Nome da tabela
+        columns: Colunas a carregar (padrão: todas)
+        partitions: Partições a carregar, usadas apenas com o snapshot
+        data_version: Versão corrente dos dados (padrão: consultada em conn)
+    Returns:
+        DataFrame com os dados
+    """
+    if use_snapshot(conn, table, data_version):
+        return read_snapshot(table, columns=columns, partitions=partitions)
+    select = ", ".join(columns) if columns else "*"
+    return pd.read_sql_query(f"SELECT {select} FROM {table}", conn)
+
+
+def list_table_partitions(conn, table, data_version=None):
+    """
+    Valores da coluna de partição da tabela: do manifesto quando o snapshot está na versão
+    corrente, ou do banco (a coluna de partição é indexada) caso contrário
+    """
+    if use_snapshot(conn, table, data_version):
+        return [partition for partition in list_partitions(table) if partition != NULL_PARTITION]
+    partition_column = SNAPSHOT_TABLES[table]
+    with conn.connect() as connection:
+        rows = connection.execute(text(
+            f"SELECT DISTINCT {partition_column}::text FROM {table} WHERE {partition_column} IS NOT NULL"
+        )).fetchall()
+    return sorted(row[0] for row in rows)
+
+
+def iter_table_chunks(conn, table, columns=None, partitions=None, chunksize=100_000, data_version=None):
+    """
+    Lê a tabela em blocos de até chunksize linhas, do snapshot local quando ele está na
+    versão corrente dos dados ou do banco por um cursor no servidor, sem carregar a tabela
+    inteira na memória
+
+    Params:
+        conn: Engine do SQLAlchemy usada quando não há snapshot atualizado
+        table: Nome da tabela (ver SNAPSHOT_TABLES)
+        columns: Colunas a carregar (padrão: todas)
+        partitions: Valores da coluna de partição a carregar (padrão: todas)
+        chunksize: Número máximo de linhas por bloco
+        data_version: Versão corrente dos dados (padrão: consultada em conn)
+    Returns:
+        Gerador de DataFrames
+    """
+    if use_snapshot(conn, table, data_version):
+        directory = _table_dir(table)
+        entries = load_manifest(table)["partitions"]
+        selected = sorted(entries if partitions is None else (p for p in partitions if p in entries))
+        files = [os.path.join(directory, entries[partition]["file"]) for partition in selected]
+        if not files:
+            return
+        for batch in ds.dataset(files, format="parquet").to_batches(columns=columns, batch_size=chunksize):
+            if batch.num_rows:
+                yield batch.to_pandas()
+        return
+
+    if partitions is not None and not partitions:
+        return
+    select = ", ".join(columns) if columns else "*"
+    query = text(f"SELECT {select} FROM {table}")
+    params = {}
+    with conn.connect() as connection:
+        if partitions is not None:
+            partition_column = SNAPSHOT_TABLES[table]
+            column_type = get_column_type(connection, table, partition_column)
+            query = text(
+                f"SELECT {select} FROM {table} "
+                f"WHERE {partition_column} = ANY(CAST(:partitions AS {column_type}[]))"
+            )
+            params = {"partitions": list(partitions)}
+        # stream_results usa um cursor nomeado no Postgres: as linhas chegam aos poucos
+        connection = connection.execution_options(stream_results=True, max_row_buffer=chunksize)
+        yield from pd.read_sql(query, connection, params=params, chunksize=chunksize)
+
+
+if __name__ == "__main__":
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Snapshot Parquet das tabelas de inadimplência")
+    parser.add_argument("command", choices=["sync", "status"])
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        for table, result in sync_snapshot(get_engine()).items():
+            print(f"- {table}: {len(result['downloaded'])} partições baixadas, "
+                  f"{len(result['removed'])} removidas, {result['unchanged']} inalteradas")
+    else:
+        for table in SNAPSHOT_TABLES:
+            manifest = load_manifest(table)
+            rows = sum(entry["rows"] for entry in manifest["partitions"].values())
+            print(f"- {table}: {len(manifest['partitions'])} partições, {rows} linhas, "
+                  f"sincronizado em {manifest.get('synced_at', 'nunca')}")
@@ -0,0 +1,223 @@
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FORBIDDEN_KEYWORDS = {
+    "insert", "update", "delete", "merge", "upsert", "drop", "alter", "create", "truncate",
+    "grant", "revoke", "copy", "vacuum", "analyze", "cluster", "reindex", "call", "do",
+    "set", "reset", "lock", "listen", "notify", "prepare", "execute", "refresh", "comment",
+    "security", "into",
+}
+FORBIDDEN_FUNCTIONS = {
+    "pg_sleep", "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "pg_terminate_backend",
+    "pg_cancel_backend", "lo_import", "lo_export", "dblink", "dblink_exec", "set_config",
+}
+# Funções do DuckDB que leem arquivos, o ambiente ou a configuração do processo
+DUCKDB_FORBIDDEN_FUNCTIONS = {
+    "read_csv", "read_csv_auto", "read_parquet", "parquet_scan", "parquet_metadata", "parquet_schema",
+    "read_json", "read_json_auto", "read_json_objects", "read_ndjson", "read_ndjson_auto", "read_text",
+    "read_blob", "glob", "sniff_csv", "getenv", "current_setting", "duckdb_settings", "duckdb_secrets",
+    "duckdb_extensions", "iceberg_scan", "delta_scan", "sqlite_scan", "postgres_scan",
+}
+
+_TOKEN = re.compile(
+    r"""(?P<string>'(?:[^']|'')*')|(?P<ident>"(?:[^"]|"")*")|(?P<word>[A-Za-z_][A-Za-z0-9_$]*)"""
+    r"""|(?P<number>\d+(?:\.\d+)?)|(?P<symbol>::|<=|>=|<>|!=|\S)""",
+    re.S,
+)
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+
+_stats_lock = threading.Lock()
+_rejections = Counter()
+
+
+class UnsafeQueryError(ValueError):
+    """
+    Consulta gerada pelo LLM rejeitada pelas regras de execução segura
+    """
+
+    def __init__(self, reason, sql):
+        super().__init__(f"Consulta rejeitada: {reason}")
+        self.reason = reason
+        self.sql = sql
+
+
+def get_max_rows():
+    return int(os.getenv("SQL_MAX_ROWS", "1000"))
+
+
+def get_statement_timeout_ms():
+    return int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "15000"))
+
+
+def get_max_cost():
+    return float(os.getenv("SQL_MAX_COST", "10000000"))
+
+
+def _reject(reason, sql):
+    with _stats_lock:
+        _rejections[reason.split(":")[0]] += 1
+    logger.warning("Consulta rejeitada (%s): %s", reason, sql)
+    raise UnsafeQueryError(reason, sql)
+
+
+def tokenize_sql(sql):
+    tokens = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind), match.start(), match.end()))
+    return tokens
+
+
+def validate_read_only(sql, dialect="postgresql"):
+    """
+    Verifica que o SQL é uma única consulta de leitura (SELECT/WITH) sem comandos
+    ou funções que alterem dados ou o estado da sessão. No DuckDB também rejeita
+    funções de tabela e literais no FROM/JOIN, que leriam arquivos locais
+    (ex.: read_csv_auto('/etc/passwd'), FROM '.env').
+
+    Params:
+        sql: Consulta SQL gerada
+        dialect: 'postgresql' ou 'duckdb'
+    Returns:
+        SQL sem comentários e sem ';' final
+    """
+    cleaned = _COMMENTS.sub(" ", sql).strip()
+    while cleaned.endswith(";"):
+        cleaned = cleaned[:-1].rstrip()
+    if not cleaned:
+        _reject("consulta vazia", sql)
+
+    tokens = tokenize_sql(cleaned)
+    words = [(value.lower(), i) for i, (kind, value, _, _) in enumerate(tokens) if kind == "word"]
+    if not words or words[0][0] not in ("select", "with"):
+        _reject("apenas SELECT ou WITH são permitidos", sql)
+
+    for kind, value, _, _ in tokens:
+        if kind == "symbol" and value == ";":
+            _reject("mais de um comando na consulta", sql)
+
+    forbidden_functions = FORBIDDEN_FUNCTIONS
+    if dialect == "duckdb":
+        forbidden_functions = FORBIDDEN_FUNCTIONS | DUCKDB_FORBIDDEN_FUNCTIONS
+    for word, i in words:
+        next_token = tokens[i + 1] if i + 1 < len(tokens) else None
+        if word in FORBIDDEN_KEYWORDS:
+            _reject(f"palavra-chave proibida: {word.upper()}", sql)
+        if word in forbidden_functions and next_token is not None and next_token[1] == "(":
+            _reject(f"função proibida: {word}", sql)
+        if dialect == "duckdb" and word in ("from", "join") and next_token is not None:
+            if next_token[0] == "string":
+                _reject("arquivo no FROM/JOIN", sql)
+            following = tokens[i + 2] if i + 2 < len(tokens) else None
+            if next_token[0] == "word" and following is not None and following[1] == "(":
+                _reject(f"função de tabela: {next_token[1].lower()}", sql)
+    return cleaned
+
+
+def apply_row_cap(sql, max_rows):
+    """
+    Garante que a consulta devolva no máximo max_rows linhas: reduz um LIMIT de nível
+    superior maior que o teto, ou acrescenta um LIMIT quando não houver
+
+    Params:
+        sql: Consulta SQL já validada
+        max_rows: Número máximo de linhas
+    Returns:
+        SQL com o teto de linhas aplicado
+    """
+    tokens = tokenize_sql(sql)
+    depth = 0
+    limit_position = None
+    has_fetch = False
+    for i, (kind, value, start, end) in enumerate(tokens):
+        if kind == "symbol" and value == "(":
+            depth += 1
+        elif kind == "symbol" and value == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word":
+            if value.lower() == "limit":
+                limit_position = i
+            elif value.lower() == "fetch":
+                has_fetch = True
+
+    if has_fetch:
+        return f"SELECT * FROM ({sql}) AS consulta_limitada LIMIT {max_rows}"
+
+    if limit_position is not None:
+        next_token = tokens[limit_position + 1] if limit_position + 1 < len(tokens) else None
+        if next_token is not None and next_token[0] == "number" and float(next_token[1]) <= max_rows:
+            return sql
+        if next_token is not None and (next_token[0] == "number" or next_token[1].lower() == "all"):
+            _, _, start, end = next_token
+            return f"{sql[:start]}{max_rows}{sql[end:]}"
+        return f"SELECT * FROM ({sql}) AS consulta_limitada LIMIT {max_rows}"
+
+    return f"{sql}\nLIMIT {max_rows}"
+
+
+def guard_query(sql, max_rows=None):
+    """
+    Valida o SQL gerado pelo LLM e aplica o teto de linhas.
+    Levanta UnsafeQueryError se a consulta não for somente leitura.
+    """
+    if max_rows is None:
+        max_rows = get_max_rows()
+    return apply_row_cap(validate_read_only(sql), max_rows)
+
+
+def explain_cost(connection, sql):
+    """
+    Retorna o custo total estimado pelo planejador do Postgres para a consulta
+    """
+    result = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+    plan = json.loads(result) if isinstance(result, str) else result
+    return float(plan[0]["Plan"]["Total Cost"])
+
+
+def execute_guarded(sql, engine, timeout_ms=None, max_cost=None):
+    """
+    Executa a consulta numa transação somente leitura com statement_timeout e
+    rejeita planos cujo custo estimado ultrapasse max_cost (0 desativa a verificação).
+    Fora do Postgres a consulta é executada diretamente.
+
+    Params:
+        sql: Consulta já processada por guard_query
+        engine: Engine do SQLAlchemy
+        timeout_ms: Tempo máximo da consulta (padrão: SQL_STATEMENT_TIMEOUT_MS)
+        max_cost: Custo máximo do plano (padrão: SQL_MAX_COST)
+    Returns:
+        DataFrame com o resultado
+    """
+    if timeout_ms is None:
+        timeout_ms = get_statement_timeout_ms()
+    if max_cost is None:
+        max_cost = get_max_cost()
+
+    with engine.connect() as connection:
+        if connection.dialect.name != "postgresql":
+            return pd.read_sql(sql, connection)
+
+        with connection.begin():
+            connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+            if max_cost:
+                cost = explain_cost(connection, sql)
+                if cost > max_cost:
+                    _reject(f"custo estimado: {cost:,.0f} acima do limite {max_cost:,.0f}", sql)
+            return pd.read_sql(sql, connection)
+
+
+def get_guard_stats():
+    """
+    Retorna o número de consultas rejeitadas por motivo
+    """
+    with _stats_lock:
+        return dict(_rejections)
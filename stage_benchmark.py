@@ -0,0 +1,355 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from insights import generate_advanced_insights
+from insights_benchmark import make_synthetic_data, make_synthetic_projection
+from insights_projecao import (
+    ProjectionCube, generate_projection_insights, projection_by_client, projection_by_port, projection_by_state,
+    projections_by_state,
+)
+from pipeline import (
+    INTENT_MAPPING, NO_DYNAMIC_RESULTS, classify_intent_with_llm, classify_user_intent, fetch_dynamic_results,
+    generate_dynamic_query, process_question,
+)
+from rollups import BASE_TABLE, SUM_MEASURES
+from snapshot import write_snapshot
+
+PROJECTION_TABLE = "projecao_consolidado"
+
+# Perguntas fixas com a intenção e o SQL que o LLM falso devolve para cada uma
+BENCHMARK_QUESTIONS = [
+    {
+        "question": "Quais os top 5 estados com maior inadimplência e quais os valores devidos?",
+        "intent": "RANKING",
+        "sql": f"SELECT uf, SUM(soma_carteira_inadimplida_arrastada) AS inadimplencia FROM {BASE_TABLE} "
+               "GROUP BY uf ORDER BY inadimplencia DESC LIMIT 5",
+    },
+    {
+        "question": "Compare a inadimplência entre PF e PJ",
+        "intent": "COMPARAÇÃO",
+        "sql": f"SELECT cliente, SUM(soma_carteira_inadimplida_arrastada) AS inadimplencia, "
+               f"SUM(soma_carteira_ativa) AS carteira FROM {BASE_TABLE} GROUP BY cliente",
+    },
+    {
+        "question": "Qual o valor da inadimplência em SP?",
+        "intent": "ESPECÍFICO",
+        "sql": f"SELECT SUM(soma_carteira_inadimplida_arrastada) AS inadimplencia FROM {BASE_TABLE} WHERE uf = 'SP'",
+    },
+    {
+        "question": "Como evoluiu a inadimplência ao longo dos meses?",
+        "intent": "TENDÊNCIA",
+        "sql": f"SELECT data_base, SUM(soma_carteira_inadimplida_arrastada) AS inadimplencia FROM {BASE_TABLE} "
+               "GROUP BY data_base ORDER BY data_base",
+    },
+    {
+        "question": "Qual a projeção de inadimplência para os próximos 18 meses?",
+        "intent": "PROJEÇÃO",
+        "sql": f"SELECT data_projecao, SUM(soma_carteira_inadimplida_arrastada) AS inadimplencia "
+               f"FROM {PROJECTION_TABLE} WHERE tipo = 'PREVISAO' GROUP BY data_projecao ORDER BY data_projecao LIMIT 18",
+    },
+    {
+        "question": "O que significa carteira inadimplida arrastada?",
+        "intent": "GERAL",
+        "sql": None,
+    },
+]
+
+STUB_ANSWER = "Resposta de benchmark: a inadimplência total é de R$ 1.234.567,89."
+
+PERCENTILES = (50, 95, 99)
+# Métricas comparadas com a linha de base; o p99 com poucas amostras é ruidoso demais
+REGRESSION_METRICS = ("p50_ms", "p95_ms")
+
+
+class StubChatModel(BaseChatModel):
+    """
+    LLM falso e determinístico: responde à classificação e à geração de SQL com os valores
+    de BENCHMARK_QUESTIONS e às demais chamadas com STUB_ANSWER, após latency_ms de espera
+
+    Params:
+        latency_ms: Espera simulada por chamada
+        questions: Perguntas com intenção e SQL (padrão: BENCHMARK_QUESTIONS)
+    """
+
+    latency_ms: float = 0.0
+    questions: list = BENCHMARK_QUESTIONS
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _respond(self, messages):
+        system = next((m.content for m in messages if isinstance(m, SystemMessage)), "")
+        human = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        entry = next((q for q in self.questions if q["question"] == human), None)
+        if "classifique a intenção" in system:
+            digits = {intent: digit for digit, intent in INTENT_MAPPING.items()}
+            text = digits[entry["intent"]] if entry else "5"
+        elif "especialista em SQL" in system:
+            text = f"```sql\n{entry['sql']}\n```" if entry and entry["sql"] else "SELECT 1"
+        else:
+            text = STUB_ANSWER
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+
+def make_fixture_tables(rows, seed=0):
+    """
+    Tabelas sintéticas com o esquema de table_agg_inad_consolidado (inclusive as colunas
+    min_/max_/media_) e de projecao_consolidado, com rows e rows // 4 linhas
+
+    Returns:
+        Tupla (DataFrame base, DataFrame de projeção)
+    """
+    df = make_synthetic_data(rows, seed)
+    for column in SUM_MEASURES:
+        df[column.replace("soma_", "min_", 1)] = np.round(df[column] * 0.01, 2)
+        df[column.replace("soma_", "max_", 1)] = np.round(df[column] * 0.5, 2)
+        df[column.replace("soma_", "media_", 1)] = np.round(df[column] * 0.1, 2)
+    return df, make_synthetic_projection(max(rows // 4, 1), seed)
+
+
+@contextmanager
+def local_fixture(rows, seed=0, directory=None):
+    """
+    Banco local para o benchmark: grava as tabelas sintéticas como snapshot Parquet e
+    aponta o motor local (DuckDB, ver local_engine) para ele, sem acessar o Postgres. O
+    cache de resultados é desativado para cada execução medir a consulta de fato.
+
+    Returns:
+        Dicionário com os DataFrames das tabelas e a versão dos dados do snapshot
+    """
+    overrides = {"SQL_BACKEND": "local", "QUERY_CACHE_MAX_MB": "0", "QUERY_CACHE_DIR": ""}
+    with tempfile.TemporaryDirectory(dir=directory) as snapshot_dir:
+        overrides["SNAPSHOT_DIR"] = snapshot_dir
+        previous = {name: os.environ.get(name) for name in overrides}
+        df_base, df_projecao = make_fixture_tables(rows, seed)
+        data_version = f"benchmark-{rows}-{seed}"
+        write_snapshot(BASE_TABLE, df_base, data_version, snapshot_dir)
+        write_snapshot(PROJECTION_TABLE, df_projecao, data_version, snapshot_dir)
+        os.environ.update(overrides)
+        try:
+            yield {"base": df_base, "projecao": df_projecao, "data_version": data_version}
+        finally:
+            for name, value in previous.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def measure(run, repeat, warmup=1, setup=None):
+    """
+    Executa run repeat vezes (mais warmup execuções descartadas) e resume os tempos
+
+    Params:
+        run: Função chamada com os argumentos devolvidos por setup
+        setup: Função (índice da execução) -> tupla de argumentos, fora da medição
+    Returns:
+        Dicionário com n, média e percentis em milissegundos
+    """
+    samples = []
+    for i in range(warmup + repeat):
+        args = setup(i) if setup is not None else ()
+        start = time.perf_counter()
+        run(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            samples.append(elapsed)
+    values = np.percentile(samples, PERCENTILES)
+    summary = {"n": len(samples), "mean_ms": round(float(np.mean(samples)), 3)}
+    summary.update({f"p{p}_ms": round(float(v), 3) for p, v in zip(PERCENTILES, values)})
+    return summary
+
+
+def _check_results(results):
+    if isinstance(results, str) and results == NO_DYNAMIC_RESULTS:
+        raise RuntimeError("A consulta do benchmark falhou no banco local")
+    return results
+
+
+def benchmark_llm_stages(llm, repeat):
+    """
+    Etapas que dependem só do LLM: classificação e geração de SQL, sem cache. As perguntas
+    fixas passam do limiar do classificador local, então classify_user_intent mede o caminho
+    local e classify_intent_with_llm mede a chamada ao LLM que as perguntas ambíguas fazem
+
+    Returns:
+        Dicionário {etapa: tempos}
+    """
+    questions = [q["question"] for q in BENCHMARK_QUESTIONS]
+    with_sql = [q for q in BENCHMARK_QUESTIONS if q["sql"]]
+    return {
+        "classify_user_intent": measure(
+            classify_user_intent, repeat,
+            setup=lambda i: (questions[i % len(questions)], llm),
+        ),
+        "classify_intent_with_llm": measure(
+            classify_intent_with_llm, repeat,
+            setup=lambda i: (questions[i % len(questions)], llm),
+        ),
+        "generate_dynamic_query": measure(
+            generate_dynamic_query, repeat,
+            setup=lambda i: (with_sql[i % len(with_sql)]["intent"], with_sql[i % len(with_sql)]["question"], llm),
+        ),
+    }
+
+
+def benchmark_data_stages(llm, fixture, repeat):
+    """
+    Etapas que dependem do tamanho dos dados: execução da consulta e resposta no banco
+    local, insights e projeções
+
+    Returns:
+        Dicionário {etapa: tempos}
+    """
+    data_version = fixture["data_version"]
+    with_sql = [q for q in BENCHMARK_QUESTIONS if q["sql"]]
+
+    def question(i):
+        return with_sql[i % len(with_sql)]
+
+    df_base, df_projecao = fixture["base"], fixture["projecao"]
+    cube = ProjectionCube(df_projecao)
+    return {
+        "fetch_dynamic_results": measure(
+            lambda sql: _check_results(fetch_dynamic_results(sql, None, data_version)), repeat,
+            setup=lambda i: (question(i)["sql"],),
+        ),
+        "process_question": measure(
+            process_question, repeat,
+            setup=lambda i: (question(i)["question"], question(i)["intent"], question(i)["sql"], llm, None,
+                             data_version),
+        ),
+        # Cópia fora da medição: a função não pode depender de receber um DataFrame intacto
+        "generate_advanced_insights": measure(generate_advanced_insights, repeat, setup=lambda i: (df_base.copy(),)),
+        "ProjectionCube": measure(ProjectionCube, repeat, setup=lambda i: (df_projecao,)),
+        "generate_projection_insights": measure(generate_projection_insights, repeat, setup=lambda i: (cube,)),
+        "projection_by_client": measure(projection_by_client, repeat, setup=lambda i: (cube, "PF", 3)),
+        "projection_by_state": measure(projection_by_state, repeat, setup=lambda i: (cube, "SP")),
+        "projection_by_port": measure(projection_by_port, repeat, setup=lambda i: (cube, "PJ - Micro")),
+        "projections_by_state": measure(projections_by_state, repeat, setup=lambda i: (cube,)),
+    }
+
+
+def run_benchmark(sizes, repeat=20, llm_latency_ms=0.0, seed=0):
+    """
+    Executa todas as etapas offline: as que dependem do LLM uma vez e as que dependem dos
+    dados para cada tamanho
+
+    Returns:
+        Dicionário com os parâmetros da execução e os tempos por etapa ('etapa' ou
+        'etapa@linhas')
+    """
+    llm = StubChatModel(latency_ms=llm_latency_ms)
+    stages = benchmark_llm_stages(llm, repeat)
+    for rows in sizes:
+        with local_fixture(rows, seed) as fixture:
+            for stage, timings in benchmark_data_stages(llm, fixture, repeat).items():
+                stages[f"{stage}@{rows}"] = timings
+    return {
+        "meta": {
+            "sizes": list(sizes),
+            "repeat": repeat,
+            "llm_latency_ms": llm_latency_ms,
+            "seed": seed,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+        },
+        "stages": stages,
+    }
+
+
+def compare(current, baseline, threshold=0.2):
+    """
+    Compara os tempos com uma linha de base salva
+
+    Params:
+        threshold: Aumento relativo a partir do qual a etapa é considerada regressão
+    Returns:
+        Lista de dicionários (etapa, métrica, antes, depois, variação, regressão)
+    """
+    rows = []
+    for stage, timings in current["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before is None:
+            continue
+        for metric in (f"p{p}_ms" for p in PERCENTILES):
+            change = (timings[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            rows.append({
+                "stage": stage,
+                "metric": metric,
+                "baseline": before[metric],
+                "current": timings[metric],
+                "change": change,
+                "regression": metric in REGRESSION_METRICS and change > threshold,
+            })
+    return rows
+
+
+def save_results(results, path):
+    """
+    Salva os resultados em JSON ordenado, para as mudanças aparecerem como diff
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline das etapas do pipeline")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latência simulada do LLM falso")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Grava os resultados (ex.: linha de base) neste arquivo JSON")
+    parser.add_argument("--compare", help="Linha de base JSON para comparar")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Aumento relativo de p50/p95 considerado regressão (padrão: 0.2)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.rows, args.repeat, args.llm_latency_ms, args.seed)
+    for stage, timings in results["stages"].items():
+        print(f"- {stage}: p50 {timings['p50_ms']:.2f} ms, p95 {timings['p95_ms']:.2f} ms, "
+              f"p99 {timings['p99_ms']:.2f} ms")
+    if args.save:
+        save_results(results, args.save)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparison = compare(results, baseline, args.threshold)
+        regressions = [row for row in comparison if row["regression"]]
+        print(f"\nComparação com {args.compare}:")
+        for key in ("repeat", "llm_latency_ms", "seed", "python", "pandas", "machine"):
+            if baseline["meta"].get(key) != results["meta"][key]:
+                print(f"  atenção: {key} difere da linha de base ({baseline['meta'].get(key)} -> {results['meta'][key]})")
+        for row in comparison:
+            flag = " REGRESSÃO" if row["regression"] else ""
+            print(f"- {row['stage']} {row['metric']}: {row['baseline']:.2f} -> {row['current']:.2f} ms "
+                  f"({row['change']:+.0%}){flag}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,32 @@
+import time
+
+
+def render_stream(chunks, placeholder, min_interval=0.05, min_chars=20):
+    """
+    Renderiza os tokens no placeholder agrupando as atualizações por tempo ou tamanho,
+    para não redesenhar o markdown a cada token.
+
+    Params:
+        chunks: Iterável de pedaços de texto
+        placeholder: Elemento st.empty() onde a resposta é exibida
+        min_interval: Intervalo mínimo em segundos entre renderizações
+        min_chars: Quantidade de caracteres novos que força uma renderização
+    Returns:
+        Texto completo da resposta
+    """
+    parts = []
+    pending = 0
+    last_render = time.monotonic()
+    for chunk in chunks:
+        if not chunk:
+            continue
+        parts.append(chunk)
+        pending += len(chunk)
+        now = time.monotonic()
+        if pending >= min_chars or now - last_render >= min_interval:
+            placeholder.markdown("".join(parts) + "▌")
+            pending = 0
+            last_render = now
+    full_response = "".join(parts)
+    placeholder.markdown(full_response)
+    return full_response
@@ -0,0 +1,97 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from date_columns import with_date_columns
+from rollups import AVG_MEASURES, BASE_DIMENSIONS, BASE_TABLE, MAX_MEASURES, MIN_MEASURES, SUM_MEASURES
+from snapshot import load_table
+
+logger = logging.getLogger(__name__)
+
+# Dimensões viram categóricas; medidas inteiras são reduzidas ao menor tipo inteiro.
+# Medidas com centavos continuam float64: em float32 as somas perdem precisão.
+TABLE_SCHEMAS = {
+    BASE_TABLE: {
+        "dimensions": BASE_DIMENSIONS,
+        "measures": SUM_MEASURES + MIN_MEASURES + MAX_MEASURES + AVG_MEASURES,
+    },
+    "projecao_consolidado": {
+        "dimensions": ["ano_mes", "regiao", "uf", "cliente", "porte", "modalidade", "tipo"],
+        "measures": ["soma_ativo_problematico", "soma_carteira_inadimplida_arrastada"],
+    },
+}
+
+# Colunas de texto fora do esquema viram categóricas quando têm poucos valores distintos
+CATEGORY_MAX_RATIO = 0.5
+
+
+def frame_memory(df):
+    """
+    Memória ocupada pelo DataFrame em bytes, incluindo o conteúdo das strings
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _is_integral(values):
+    finite = np.isfinite(values)
+    return finite.all() and (values == np.floor(values)).all() \
+        and values.min(initial=0) >= np.iinfo(np.int64).min and values.max(initial=0) <= np.iinfo(np.int64).max
+
+
+def _compact_numeric(series):
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series.dtype) and _is_integral(series.to_numpy()):
+        return pd.to_numeric(series.astype(np.int64), downcast="integer")
+    return series
+
+
+def compact_frame(df, table=None):
+    """
+    Retorna uma cópia do DataFrame com tipos compactos: dimensões como categóricas, com
+    as categorias em ordem crescente, e medidas inteiras no menor tipo inteiro que as comporta
+
+    Params:
+        df: DataFrame carregado de uma das tabelas consolidadas
+        table: Nome da tabela, usado para consultar TABLE_SCHEMAS
+    Returns:
+        DataFrame com os tipos compactos
+    """
+    schema = TABLE_SCHEMAS.get(table, {"dimensions": [], "measures": []})
+    compacted = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            compacted[column] = series
+        elif column in schema["dimensions"]:
+            compacted[column] = series.astype("category")
+        elif pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            compacted[column] = _compact_numeric(series)
+        elif series.dtype == object and len(series) > 0 \
+                and series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(series):
+            compacted[column] = series.astype("category")
+        else:
+            compacted[column] = series
+    return pd.DataFrame(compacted, index=df.index)
+
+
+def load_compact_table(conn, table, columns=None, partitions=None, data_version=None):
+    """
+    Carrega a tabela (snapshot local ou banco, ver snapshot.load_table) com tipos compactos
+    e as colunas de data tipadas de date_columns. A memória antes e depois da conversão fica
+    em df.attrs["memory"].
+
+    Returns:
+        DataFrame com os tipos compactos
+    """
+    df = with_date_columns(load_table(conn, table, columns=columns, partitions=partitions, data_version=data_version), table)
+    before = frame_memory(df)
+    df = compact_frame(df, table)
+    after = frame_memory(df)
+    df.attrs["memory"] = {"before": before, "after": after}
+    logger.info(
+        "%s: %d linhas, memória %.1f MB -> %.1f MB",
+        table, len(df), before / 1024 ** 2, after / 1024 ** 2,
+    )
+    return df
@@ -0,0 +1,23 @@
+from intent_classifier import classify_intent_locally, get_confidence_threshold, score_intents
+
+
+def test_preposicao_para_nao_conta_como_estado():
+    assert score_intents("Dicas para reduzir a inadimplência")["ESPECÍFICO"] == 0
+    assert score_intents("Qual a projeção para os próximos 18 meses?")["ESPECÍFICO"] == 0
+
+
+def test_estado_do_para_conta_como_especifico():
+    assert score_intents("Qual o valor da inadimplência no Pará?")["ESPECÍFICO"] > 0
+    assert score_intents("Qual o valor da inadimplência no Para?")["ESPECÍFICO"] > 0
+    assert score_intents("Inadimplência do estado do Pará")["ESPECÍFICO"] > 0
+
+
+def test_diferenca_conceitual_vai_para_o_llm():
+    _, confidence = classify_intent_locally("Qual a diferença entre ativo problematico e carteira inadimplida?")
+    assert confidence < get_confidence_threshold()
+
+
+def test_diferenca_com_valores_continua_comparacao():
+    intent, confidence = classify_intent_locally("Qual a diferença de valor entre PF e PJ em 2024?")
+    assert intent == "COMPARAÇÃO"
+    assert confidence >= get_confidence_threshold()